@@ -0,0 +1,3 @@
+"""
+Microbenchmarks for the post body builders and response parsers; run with python -m benchmarks.
+"""
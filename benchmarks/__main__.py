@@ -0,0 +1,5 @@
+import sys
+
+from benchmarks.micro import main
+
+sys.exit(main())
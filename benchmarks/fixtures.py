@@ -0,0 +1,126 @@
+"""
+Fixed inputs for the microbenchmarks: a 1-line quote, a 50-line hazmat BOL and tracking XML with
+200 events, plus quote and BOL responses of a representative size.
+
+Everything is built from constants so every run, on every machine, measures the same work.
+"""
+from datetime import date
+
+from bol.bill_of_lading import PayTerms, ReferenceNumbers, Requestor, ShipmentSpecifics as BolShipmentSpecifics
+from bol.commodity import Commodity as BolCommodity, HazMatCompatibilities
+from bol.shipping_party import ShippingParty as BolShippingParty
+from quote.quote import Commodity as QuoteCommodity, ShipmentSpecifics as QuoteShipmentSpecifics, \
+    ShippingParty as QuoteShippingParty
+from shared_enums import PackageType, ShipmentClasses
+
+BOL_LINES = 50
+TRACKING_EVENTS = 200
+
+# (class, UN number, proper shipping name, packing group) cycled over the BOL lines
+HAZMAT_MATERIALS = (
+    (3, 1263, 'Paint', 'II'),
+    (8, 1760, 'Corrosive liquid, n.o.s.', 'III'),
+    (2, 1075, 'Petroleum gases, liquefied', None),
+    (6, 2810, 'Toxic liquid, organic, n.o.s.', 'III'),
+    (1, 432, 'Articles, pyrotechnic', None),
+)
+CITIES = (('Fort Smith', 'AR', '72901'), ('Dallas', 'TX', '75201'), ('Memphis', 'TN', '38103'),
+          ('Kansas City', 'MO', '64105'), ('Tulsa', 'OK', '74103'))
+
+
+def quote_arguments() -> dict:
+    return {
+        'shipper'           : QuoteShippingParty('3801 Old Greenwood Rd', 'Fort Smith', 'AR', '72903', 'US',
+                                                 name='Acme Paint Supply', acct_number='123456', paying_party=True),
+        'consignee'         : QuoteShippingParty('1 Main St', 'Dallas', 'TX', '75201', 'US', name='Main Street Hardware'),
+        'commodity'         : QuoteCommodity(weight=1250, line_number=1, shipment_class=ShipmentClasses.CLASS_55,
+                                             length=48, width=40, height=52, unit_number=2,
+                                             packing_type=PackageType.Pallet, nmfc=150150),
+        'shipment_specifics': QuoteShipmentSpecifics(ship_month=6, ship_day=3, ship_year=2024),
+    }
+
+
+def hazmat_line(line_number: int) -> BolCommodity:
+    hazmat_class, un_number, shipping_name, packing_group = HAZMAT_MATERIALS[line_number % len(HAZMAT_MATERIALS)]
+    return BolCommodity(
+        line_number=line_number,
+        number_of_handling_units=1 + line_number % 3,
+        handling_unit_type=PackageType.Pallet,
+        length=48, width=40, height=36 + line_number % 12,
+        number_of_packages=10 + line_number,
+        package_type=PackageType.Drum,
+        total_weight=350.5 + 10 * line_number,
+        shipment_class=ShipmentClasses.CLASS_85,
+        nmfc_number=48580,
+        nmfc_sub_number=2,
+        description=f'{shipping_name}, line {line_number}',
+        hazmat=True,
+        hazmat_class=hazmat_class,
+        un_ua_number=un_number,
+        hazmat_contact_name='CHEMTREC',
+        hazmat_contact_phone='8004249300',
+        hazmat_proper_shipping_name=shipping_name,
+        hazmat_technical_name='Mixture' if packing_group == 'III' else None,
+        hazmat_packaging_group=packing_group,
+        hazmat_reportable_quantity=line_number % 7 == 0,
+        hazmat_limited_quantity=line_number % 2 == 0,
+        hazmat_compatibility=HazMatCompatibilities.CLASS_1_4 if hazmat_class == 1 else None,
+        hazmat_flash_point_temp=23.5 if hazmat_class == 3 else None,
+    )
+
+
+def bol_arguments(lines: int = BOL_LINES) -> dict:
+    return {
+        'requestor'         : Requestor(PayTerms.PREPAID, name='Shipping Desk', email='shipping@example.com',
+                                        phone='4795551234'),
+        'shipping_party'    : BolShippingParty('Acme Paint Supply', street_address='3801 Old Greenwood Rd',
+                                               city='Fort Smith', state='AR', zip_code='72903', country='US',
+                                               phone='4795551234'),
+        'consignee'         : BolShippingParty('Main Street Hardware', street_address='1 Main St', city='Dallas',
+                                               state='TX', zip_code='75201', country='US', phone='2145550100'),
+        'commodity_lines'   : [hazmat_line(number) for number in range(1, lines + 1)],
+        'shipment_specifics': BolShipmentSpecifics(ship_date=date(2024, 6, 3), auto_assign_pro_number=True,
+                                                   instructions='Placards required'),
+        'reference_numbers' : [ReferenceNumbers(bol_number='BOL-000123', po_index=index,
+                                                actual_po_number=f'PO-{index:05d}', po_pieces=5, po_weight=900.0)
+                               for index in range(1, 6)],
+        'arcbest_api_key'   : 'BENCHMARK-KEY',
+    }
+
+
+def quote_response_xml() -> bytes:
+    charges = ''.join(f'<ITEM><CODE>{code}</CODE><DESCRIPTION>{description}</DESCRIPTION>'
+                      f'<AMOUNT>{amount}</AMOUNT></ITEM>'
+                      for code, description, amount in (('LINEHAUL', 'Linehaul', '612.40'),
+                                                        ('DISC', 'Discount', '-428.68'),
+                                                        ('FSC', 'Fuel surcharge', '58.21'),
+                                                        ('HAZ', 'Hazardous materials', '29.00')))
+    return (f'<?xml version="1.0" encoding="UTF-8"?><ABF><QUOTEID>Q123456789</QUOTEID>'
+            f'<SHIPDATE>06/03/2024</SHIPDATE><ORIGTERMINAL>FORT SMITH, AR</ORIGTERMINAL>'
+            f'<DESTTERMINAL>DALLAS, TX</DESTTERMINAL><ADVERTISEDTRANSIT>2 Days</ADVERTISEDTRANSIT>'
+            f'<ITEMIZEDCHARGES>{charges}</ITEMIZEDCHARGES><CHARGE>270.93</CHARGE></ABF>').encode('utf-8')
+
+
+def bol_response_xml(lines: int = BOL_LINES) -> bytes:
+    commodities = ''.join(f'<COMMODITY><LINE>{number}</LINE><WEIGHT>{350.5 + 10 * number}</WEIGHT>'
+                          f'<HAZMAT>Y</HAZMAT></COMMODITY>' for number in range(1, lines + 1))
+    return (f'<?xml version="1.0" encoding="UTF-8"?><ABF><NUMERRORS>0</NUMERRORS><PRO>123456789</PRO>'
+            f'<BOLNUMBER>BOL-000123</BOLNUMBER><PICKUPCONFIRMATION>FSM1234567</PICKUPCONFIRMATION>'
+            f'<DOCUMENTS><BOL>https://example.com/bol.pdf</BOL><LABELS>https://example.com/labels.pdf</LABELS>'
+            f'</DOCUMENTS><COMMODITIES>{commodities}</COMMODITIES></ABF>').encode('utf-8')
+
+
+def tracking_response_xml(events: int = TRACKING_EVENTS) -> bytes:
+    history = []
+    for number in range(events):
+        city, state, _ = CITIES[number % len(CITIES)]
+        history.append(f'<EVENT><STATUSCODE>{("PU", "IT", "AR", "DP")[number % 4]}</STATUSCODE>'
+                       f'<STATUS>In transit</STATUS><EVENTDATE>{6 + number // 60:02d}/{1 + number % 28:02d}/2024</EVENTDATE>'
+                       f'<EVENTTIME>{number % 24:02d}:{number % 60:02d}</EVENTTIME><TERMINAL>{city.upper()}</TERMINAL>'
+                       f'<CITY>{city}</CITY><STATE>{state}</STATE><COUNTRY>US</COUNTRY></EVENT>')
+    return (f'<?xml version="1.0" encoding="UTF-8"?><ABF><SHIPMENTS><SHIPMENT><PRO>123456789</PRO>'
+            f'<BOL>BOL-000123</BOL><SHIPMENTSTATUS>Delivered</SHIPMENTSTATUS><STATUSCODE>DL</STATUSCODE>'
+            f'<STATUSDATE>06/05/2024</STATUSDATE><STATUSTIME>14:32</STATUSTIME>'
+            f'<EXPECTEDDELIVERYDATE>06/05/2024</EXPECTEDDELIVERYDATE><TERMINAL>DALLAS</TERMINAL>'
+            f'<CITY>Dallas</CITY><STATE>TX</STATE><COUNTRY>US</COUNTRY><WEIGHT>18275</WEIGHT>'
+            f'<PIECES>100</PIECES><EVENTS>{"".join(history)}</EVENTS></SHIPMENT></SHIPMENTS></ABF>').encode('utf-8')
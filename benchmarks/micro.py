@@ -0,0 +1,167 @@
+"""
+Microbenchmarks for building post bodies and parsing responses.
+
+    python -m benchmarks                      run everything and compare with benchmarks/baseline.json
+    python -m benchmarks -k parse             only the benchmarks whose name contains 'parse'
+    python -m benchmarks --update-baseline    store this run as the new baseline
+
+Each benchmark reports ops/sec (the best of several timeit repeats), the memory blocks and bytes
+allocated by one call that are still alive when it returns (mostly the result), and the traced
+peak during the call, all measured with tracemalloc.  The exit status is 1 when ops/sec drops by
+more than --tolerance, or allocations or peak grow by more than --memory-tolerance, against the
+baseline.  Timings only compare on the machine and Python that recorded the baseline; the
+allocation figures are stable across machines with the same Python.
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+
+import codec
+import transport
+from benchmarks import fixtures
+from bol.bill_of_lading import build_bol_post_body
+from quote.quote import build_quote_post_body
+from tracking.normalize import normalize, project
+from tracking.tracking import TrackingRefereceTypes
+from transport import TransportResponse
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+# bytes of peak growth always tolerated, so tiny benchmarks do not fail on allocator noise
+PEAK_SLACK = 4096
+
+
+def _parse(xml: bytes):
+    return lambda: transport.parse_xml(TransportResponse(200, io.BytesIO(xml), len(xml)))
+
+
+def benchmarks() -> dict:
+    """
+    name -> zero-argument callable.  Fixtures are built here, outside the timed calls.
+    """
+    quote_arguments = fixtures.quote_arguments()
+    bol_arguments = fixtures.bol_arguments()
+    commodity_lines = bol_arguments['commodity_lines']
+    quote_xml = fixtures.quote_response_xml()
+    bol_xml = fixtures.bol_response_xml()
+    tracking_xml = fixtures.tracking_response_xml()
+    tracking_dict = _parse(tracking_xml)()
+    bol_message = codec.encode(bol_arguments)
+    return {
+        'quote_build'          : lambda: build_quote_post_body(**quote_arguments),
+        'bol_commodity_as_dict': lambda: [line.as_dict() for line in commodity_lines],
+        'bol_build'            : lambda: build_bol_post_body(**bol_arguments),
+        'quote_parse'          : _parse(quote_xml),
+        'bol_parse'            : _parse(bol_xml),
+        'tracking_parse'       : _parse(tracking_xml),
+        'tracking_normalize'   : lambda: normalize(tracking_dict, '123456789', TrackingRefereceTypes.ArcBestPro),
+        'tracking_project'     : lambda: project(io.BytesIO(tracking_xml), ['status', 'expected_delivery']),
+        'codec_encode_bol'     : lambda: codec.encode(bol_arguments),
+        'codec_decode_bol'     : lambda: codec.decode(bol_message),
+    }
+
+
+def _blocks(snapshot) -> int:
+    return sum(stat.count for stat in snapshot.statistics('filename'))
+
+
+def measure(function, repeat: int = 5) -> dict:
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat, number)) / number
+
+    function()    # warm caches (regexes, enum lookups) before tracing
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        result = function()
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        del result
+    finally:
+        tracemalloc.stop()
+    return {
+        'ops_per_sec'     : round(1 / best, 1),
+        'allocated_blocks': _blocks(after) - _blocks(before),
+        'allocated_bytes' : current - start,
+        'peak_bytes'      : peak - start,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float, memory_tolerance: float) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('benchmarks', {}).get(name)
+        if base is None:
+            continue
+        if result['ops_per_sec'] < base['ops_per_sec'] * (1 - tolerance):
+            regressions.append(f'{name}: {result["ops_per_sec"]:,.0f} ops/sec, baseline {base["ops_per_sec"]:,.0f}')
+        if result['allocated_blocks'] > base['allocated_blocks'] * (1 + memory_tolerance):
+            regressions.append(f'{name}: {result["allocated_blocks"]:,} blocks allocated, '
+                               f'baseline {base["allocated_blocks"]:,}')
+        if result['peak_bytes'] > base['peak_bytes'] * (1 + memory_tolerance) + PEAK_SLACK:
+            regressions.append(f'{name}: {result["peak_bytes"]:,} peak bytes, baseline {base["peak_bytes"]:,}')
+    return regressions
+
+
+def environment() -> dict:
+    return {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+            'machine': platform.machine(), 'system': platform.system()}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='ArcBest SDK microbenchmarks')
+    parser.add_argument('-k', dest='pattern', help='only run benchmarks whose name contains this')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline JSON file')
+    parser.add_argument('--update-baseline', action='store_true', help='write this run to the baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed drop in ops/sec as a fraction (default: 0.25)')
+    parser.add_argument('--memory-tolerance', type=float, default=0.10,
+                        help='allowed growth in allocations and peak memory as a fraction (default: 0.10)')
+    parser.add_argument('--repeat', type=int, default=5, help='timeit repeats; the best is kept (default: 5)')
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f'{"benchmark":<24}{"ops/sec":>14}{"blocks":>10}{"bytes":>12}{"peak":>12}')
+    for name, function in benchmarks().items():
+        if args.pattern and args.pattern not in name:
+            continue
+        result = results[name] = measure(function, args.repeat)
+        print(f'{name:<24}{result["ops_per_sec"]:>14,.1f}{result["allocated_blocks"]:>10,}'
+              f'{result["allocated_bytes"]:>12,}{result["peak_bytes"]:>12,}')
+
+    if args.update_baseline:
+        baseline = {'environment': environment(), 'benchmarks': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline['benchmarks'] = json.load(f).get('benchmarks', {})
+        baseline['benchmarks'].update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline written to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}; run with --update-baseline to create one', file=sys.stderr)
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('environment') != environment():
+        print(f'Baseline was recorded on {baseline.get("environment")}; timings may not compare', file=sys.stderr)
+    regressions = compare(results, baseline, args.tolerance, args.memory_tolerance)
+    if regressions:
+        print(f'\nPERFORMANCE REGRESSION ({len(regressions)}):', file=sys.stderr)
+        for regression in regressions:
+            print(f'  {regression}', file=sys.stderr)
+        return 1
+    print('No regressions against the baseline')
+    return 0
@@ -1,18 +1,20 @@
-import os
 import pprint
-import re
 from datetime import date
 from enum import Enum
 from typing import List
 
-import requests
-import xmltodict
 from email_validator import validate_email, EmailNotValidError
 
 from bol.shipping_party import ShippingParty
-from commodity import Commodity
+from bol.commodity import Commodity
+import transport
+from key_pool import get_key_pool, resolve_api_key
+from preflight import check as preflight_check
+from profiling import profile_call
 from shared_enums import UnitsOfMeasurement, LimitedAccessOptions, PackageType, ShipmentClasses
-from utils import bool_to_str, get_current_date_as_tuple
+from tracking.reference_index import get_reference_index
+from transport import ResponsePolicy
+from utils import bool_to_str
 
 pp = pprint.PrettyPrinter(indent=4)
 
@@ -75,17 +77,6 @@ class DeliveryTimeTypes(Enum):
     BETWEEN = 'between'
 
 
-def is_valid_time(time_str: str) -> bool:
-    # Define the regex pattern to match the format HH:MM
-    pattern = r"^(09|1[0-7]):(00|15|30|45)$"
-
-    # Check if the input string matches the pattern
-    if re.match(pattern, time_str):
-        return True
-    else:
-        return False
-
-
 class TimeCriticalShipmentSpecifics:
     def __init__(self,
                  is_time_critical: bool | None = True,
@@ -169,8 +160,6 @@ class CopyConfirmation:
                  shipping_labels_to_third_party: bool | None = None,
                  shipping_labels_to_emails: list[str] | None = None):
 
-        self.validate_emails()
-
         self.bol_to_shipper = bol_to_shipper
         self.bol_to_consignee = bol_to_consignee
         self.bol_to_third_party = bol_to_third_party
@@ -180,6 +169,8 @@ class CopyConfirmation:
         self.shipping_labels_to_third_party = shipping_labels_to_third_party
         self.shipping_labels_to_emails = shipping_labels_to_emails
 
+        self.validate_emails()
+
     def validate_emails(self):
         invalid_emails = []
 
@@ -415,6 +406,77 @@ class Requestor:
         }.items() if value is not None}
 
 
+def _block(value) -> dict:
+    return value.as_dict() if value is not None else {}
+
+
+def _line_blocks(lines) -> dict:
+    fields = {}
+    for line in lines or ():
+        fields.update(line.as_dict())
+    return fields
+
+
+# the post body is the merge of these blocks in this order; request templates rely on the order
+BOL_BODY_BLOCKS = (
+    ('testing', lambda testing: {'testing': bool_to_str(testing)}),
+    ('requestor', lambda requestor: requestor.as_dict()),
+    ('shipping_party', lambda shipping_party: shipping_party.as_shipper_dict()),
+    ('consignee', lambda consignee: consignee.as_consignees_dict()),
+    ('arcbest_api_key', lambda arcbest_api_key: {'ID': arcbest_api_key}),
+    ('app_id', lambda app_id: {'AppID': app_id} if app_id is not None else {}),
+    ('commodity_lines', _line_blocks),
+    ('shipment_specifics', _block),
+    ('time_critical_specifics', _block),
+    ('reference_numbers', _line_blocks),
+    ('copy_confirmation', _block),
+    ('pickup_options', _block),
+    ('delivery_options', _block),
+    ('additional_services', _block),
+    ('doc_label_info', _block),
+)
+
+
+def build_bol_post_body(
+        requestor: Requestor,
+        shipping_party: ShippingParty,
+        consignee: ShippingParty,
+        commodity_lines: List[Commodity],
+        shipment_specifics: ShipmentSpecifics,
+        app_id: str | None = None,
+        testing: bool = True,
+        time_critical_specifics: TimeCriticalShipmentSpecifics | None = None,
+        reference_numbers: List[ReferenceNumbers] | None = None,
+        copy_confirmation: CopyConfirmation | None = None,
+        pickup_options: PickupOptions | None = None,
+        delivery_options: DeliveryOptions | None = None,
+        additional_services: AdditionalServices | None = None,
+        doc_label_info: DocLabelInfo | None = None,
+        arcbest_api_key: str | None = None,
+) -> dict:
+    arguments = {
+            'testing'                : testing,
+            'requestor'              : requestor,
+            'shipping_party'         : shipping_party,
+            'consignee'              : consignee,
+            'arcbest_api_key'        : arcbest_api_key,
+            'app_id'                 : app_id,
+            'commodity_lines'        : commodity_lines,
+            'shipment_specifics'     : shipment_specifics,
+            'time_critical_specifics': time_critical_specifics,
+            'reference_numbers'      : reference_numbers,
+            'copy_confirmation'      : copy_confirmation,
+            'pickup_options'         : pickup_options,
+            'delivery_options'       : delivery_options,
+            'additional_services'    : additional_services,
+            'doc_label_info'         : doc_label_info,
+    }
+    post_body = {}
+    for name, block in BOL_BODY_BLOCKS:
+        post_body.update(block(arguments[name]))
+    return post_body
+
+
 def get_bol(
         requestor: Requestor,
         shipping_party: ShippingParty,
@@ -431,58 +493,62 @@ def get_bol(
         additional_services: AdditionalServices | None = None,
         doc_label_info: DocLabelInfo | None = None,
         arcbest_bol_endpoint: str = 'https://www.abfs.com/xml/bolxml.asp',
-        arcbest_api_key: str = os.environ.get('ARCBEST_API_KEY'),
+        arcbest_api_key: str | None = None,
+        response_policy: ResponsePolicy | None = None,
+        preflight: bool = True,
+        timeout: float | None = None,
+        template=None,
 ) -> dict | None:
 
     response_dict = None
 
-    if arcbest_api_key is None:
+    arcbest_api_key = resolve_api_key(arcbest_api_key)
+    if arcbest_api_key is None and get_key_pool() is None:
         raise Exception('Missing ARCBEST_API_KEY')
 
-    post_body = {
-            'testing': bool_to_str(testing),
-            **requestor.as_dict(),
-            **shipping_party.as_shipper_dict(),
-            **consignee.as_consignees_dict(),
-            'ID': arcbest_api_key,
-    }
-
-    if app_id is not None:
-        post_body.update({'AppID': app_id})
-
-    for commodity_line in commodity_lines:
-        post_body.update(commodity_line.as_dict())
-
-    if shipment_specifics is not None:
-        post_body.update(shipment_specifics.as_dict())
-    if time_critical_specifics is not None:
-        post_body.update(time_critical_specifics.as_dict())
-
-    if reference_numbers is not None:
-        for ref_num_line in reference_numbers:
-            post_body.update(ref_num_line.as_dict())
-
-    if copy_confirmation is not None:
-        post_body.update(copy_confirmation.as_dict())
-    if pickup_options is not None:
-        post_body.update(pickup_options.as_dict())
-    if delivery_options is not None:
-        post_body.update(delivery_options.as_dict())
-    if additional_services is not None:
-        post_body.update(additional_services.as_dict())
-    if doc_label_info is not None:
-        post_body.update(doc_label_info.as_dict())
-
-    print(f"ArcBest BOL post data: {post_body}")
-    # NB: the response.text is XML!
-    response = requests.post(url=arcbest_bol_endpoint, params={'api_key': arcbest_api_key}, data=post_body)
-
-    if response.status_code == 200:
-        print(f"ArcBest BOL response: {response.text}")
-        response_dict = xmltodict.parse(response.text)
-        print(f"ArcBest BOL response dict: {pp.pprint(response_dict)}")
-    else:
-        print(f"ArcBest BOL request failed with status code: {response.status_code}")
+    with profile_call('bol') as profile:
+        with profile.phase('build'):
+            body_arguments = dict(requestor=requestor,
+                                  shipping_party=shipping_party,
+                                  consignee=consignee,
+                                  commodity_lines=commodity_lines,
+                                  shipment_specifics=shipment_specifics,
+                                  app_id=app_id,
+                                  testing=testing,
+                                  time_critical_specifics=time_critical_specifics,
+                                  reference_numbers=reference_numbers,
+                                  copy_confirmation=copy_confirmation,
+                                  pickup_options=pickup_options,
+                                  delivery_options=delivery_options,
+                                  additional_services=additional_services,
+                                  doc_label_info=doc_label_info,
+                                  arcbest_api_key=arcbest_api_key)
+            if template is not None:
+                # a request_templates.BolTemplate with the static blocks already encoded
+                encoded = template.encode(**body_arguments)
+                post_body, wire_body = encoded.fields, encoded.body
+            else:
+                post_body = wire_body = build_bol_post_body(**body_arguments)
+            if preflight:
+                preflight_check('bol', post_body)
+
+        print(f"ArcBest BOL post data: {post_body}")
+        # NB: the response.text is XML!
+        with profile.phase('network'):
+            response = transport.post('bol', arcbest_bol_endpoint, arcbest_api_key, wire_body, response_policy,
+                                      timeout=timeout)
+        with response:
+            profile.annotate(status_code=response.status_code, response_bytes=response.size)
+
+            if response.status_code == 200:
+                with profile.phase('parse'):
+                    response_dict = transport.parse_xml(response)
+                print(f"ArcBest BOL response dict: {pp.pformat(response_dict)}")
+                index = get_reference_index()
+                if index is not None:
+                    index.learn_bol(response_dict, reference_numbers)
+            else:
+                print(f"ArcBest BOL request failed with status code: {response.status_code}")
 
     return response_dict
 
@@ -0,0 +1,289 @@
+"""
+Hazmat segregation checks across the commodity lines of a BOL.
+
+The segregation table is compiled at import into one bit per table column: the non-explosive
+classes, plus one bit per (division, compatibility group) pair for class 1.  Every line is reduced
+to a HazmatProfile holding three integers:
+    classes  - the table columns the line may belong to
+    forbid   - columns that may not be loaded with it ('X')
+    separate - columns that must be kept apart from it ('O')
+so checking two lines, or two whole groups of lines, is a couple of AND operations.
+
+The table follows the 49 CFR 177.848(d) segregation table and the class 1 compatibility rules in a
+simplified form.  It is a pre-flight screen, not a compliance determination.
+
+Where a line does not pin down its class, zone or compatibility group (for example an integer class
+of 2, or a HazMatZones member listing several zones), its profile holds every possibility.  A pair
+of lines is FORBIDDEN only when every possibility of one is forbidden with every possibility of the
+other; when only some are, the pair is POSSIBLY_FORBIDDEN, which callers report as a warning.
+"""
+from enum import Enum
+
+from bol.commodity import Commodity, HazMatCompatibilities, HazMatZones
+
+
+class Segregation(Enum):
+    FORBIDDEN = 'X'
+    SEPARATE = 'O'
+    # forbidden for some of the classes an ambiguous line may belong to, but not all of them
+    POSSIBLY_FORBIDDEN = '?'
+
+
+EXPLOSIVE_DIVISIONS = ('1.1', '1.2', '1.3', '1.4', '1.5', '1.6')
+COMPATIBILITY_GROUPS = ('A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'J', 'K', 'L', 'N', 'S')
+TABLE_CLASSES = EXPLOSIVE_DIVISIONS + ('2.1', '2.2', '2.3A', '2.3B', '3', '4.1', '4.2', '4.3',
+                                       '5.1', '5.2', '6.1A', '7', '8')
+
+# '*' = explosives, decided by compatibility group; '-' = no restriction.  Columns follow TABLE_CLASSES.
+SEGREGATION_TABLE = {
+    #         1.1 1.2 1.3 1.4 1.5 1.6 2.1 2.2 2.3A 2.3B 3 4.1 4.2 4.3 5.1 5.2 6.1A 7 8
+    '1.1' : '*   *   *   *   *   -   X   X   X    X    X X   X   X   X   X   X    X X',
+    '1.2' : '*   *   *   *   *   -   X   X   X    X    X X   X   X   X   X   X    X X',
+    '1.3' : '*   *   *   *   *   -   X   -   X    X    X -   X   X   X   X   X    - X',
+    '1.4' : '*   *   *   *   *   -   O   -   O    O    O -   O   -   -   -   O    - O',
+    '1.5' : '*   *   *   *   *   -   X   X   X    X    X X   X   X   X   X   X    X X',
+    '1.6' : '-   -   -   -   -   *   -   -   -    -    - -   -   -   -   -   -    - -',
+    '2.1' : 'X   X   X   O   X   -   -   -   X    O    - -   -   -   -   -   O    O -',
+    '2.2' : 'X   X   -   -   X   -   -   -   -    -    - -   -   -   -   -   -    - -',
+    '2.3A': 'X   X   X   O   X   -   X   -   -    -    X X   X   X   X   X   -    - X',
+    '2.3B': 'X   X   X   O   X   -   O   -   -    -    O O   O   O   O   O   -    - O',
+    '3'   : 'X   X   X   O   X   -   -   -   X    O    - -   -   -   -   -   O    - -',
+    '4.1' : 'X   X   -   -   X   -   -   -   X    O    - -   -   -   -   -   O    - -',
+    '4.2' : 'X   X   X   O   X   -   -   -   X    O    - -   -   -   -   -   O    - O',
+    '4.3' : 'X   X   X   -   X   -   -   -   X    O    - -   -   -   -   -   O    - O',
+    '5.1' : 'X   X   X   -   X   -   -   -   X    O    - -   -   -   -   -   O    - O',
+    '5.2' : 'X   X   X   -   X   -   -   -   X    O    - -   -   -   -   -   O    - O',
+    '6.1A': 'X   X   X   O   X   -   O   -   -    -    O O   O   O   O   O   -    - X',
+    '7'   : 'X   X   -   -   X   -   O   -   -    -    - -   -   -   -   -   -    - -',
+    '8'   : 'X   X   X   O   X   -   -   -   X    O    - -   O   O   O   O   X    - -',
+}
+
+# explosives in different compatibility groups may not share a load, except these pairs
+COMPATIBLE_GROUP_PAIRS = {frozenset(pair) for pair in (('C', 'D'), ('C', 'E'), ('D', 'E'),
+                                                       ('C', 'N'), ('D', 'N'), ('E', 'N'))}
+
+SUBCLASSES = {
+    '1': EXPLOSIVE_DIVISIONS,
+    '2': ('2.1', '2.2', '2.3'),
+    '4': ('4.1', '4.2', '4.3'),
+    '5': ('5.1', '5.2'),
+    '6': ('6.1',),
+}
+
+
+def _compile():
+    non_explosive = TABLE_CLASSES[len(EXPLOSIVE_DIVISIONS):]
+    bits = {}
+    for division in EXPLOSIVE_DIVISIONS:
+        for group in COMPATIBILITY_GROUPS:
+            bits[(division, group)] = 1 << len(bits)
+    for table_class in non_explosive:
+        bits[(table_class, None)] = 1 << len(bits)
+
+    cells = {row: dict(zip(TABLE_CLASSES, entries.split(), strict=True)) for row, entries in SEGREGATION_TABLE.items()}
+
+    def cell(a, b):
+        # use the stricter of the two table cells so the relation is symmetric
+        pair = {cells[a][b], cells[b][a]}
+        for mark in ('X', '*', 'O'):
+            if mark in pair:
+                return mark
+        return '-'
+
+    forbid = {}
+    separate = {}
+    for (row_class, row_group), row_bit in bits.items():
+        forbid_mask = 0
+        separate_mask = 0
+        for (col_class, col_group), col_bit in bits.items():
+            mark = cell(row_class, col_class)
+            if mark == '*':
+                compatible = (row_group == col_group or 'S' in (row_group, col_group)
+                              or frozenset((row_group, col_group)) in COMPATIBLE_GROUP_PAIRS)
+                mark = '-' if compatible else 'X'
+            if mark == 'X':
+                forbid_mask |= col_bit
+            elif mark == 'O':
+                separate_mask |= col_bit
+        forbid[row_bit] = forbid_mask
+        separate[row_bit] = separate_mask
+    return bits, forbid, separate
+
+
+CLASS_BITS, FORBID_ROWS, SEPARATE_ROWS = _compile()
+BIT_NAMES = {bit: f'{table_class}{group or ""}' for (table_class, group), bit in CLASS_BITS.items()}
+ALL_GROUPS = tuple(COMPATIBILITY_GROUPS)
+
+
+class HazmatProfile:
+    __slots__ = ('line_number', 'classes', 'forbid', 'separate')
+
+    def __init__(self, line_number: int | None, classes: int):
+        self.line_number = line_number
+        self.classes = classes
+        self.forbid = 0
+        self.separate = 0
+        remaining = classes
+        while remaining:
+            bit = remaining & -remaining
+            self.forbid |= FORBID_ROWS[bit]
+            self.separate |= SEPARATE_ROWS[bit]
+            remaining ^= bit
+
+    def conflict_with(self, other: 'HazmatProfile') -> Segregation | None:
+        if self.forbid & other.classes or other.forbid & self.classes:
+            return Segregation.FORBIDDEN if self.always_forbidden_with(other) else Segregation.POSSIBLY_FORBIDDEN
+        if self.separate & other.classes or other.separate & self.classes:
+            return Segregation.SEPARATE
+        return None
+
+    def always_forbidden_with(self, other: 'HazmatProfile') -> bool:
+        # every class this line may be is forbidden with every class the other may be (the table is
+        # symmetric, so one direction is enough); for merged profiles this is only a lower bound
+        remaining = self.classes
+        while remaining:
+            bit = remaining & -remaining
+            if FORBID_ROWS[bit] & other.classes != other.classes:
+                return False
+            remaining ^= bit
+        return bool(self.classes and other.classes)
+
+    def merge(self, other: 'HazmatProfile') -> 'HazmatProfile':
+        merged = HazmatProfile.__new__(HazmatProfile)
+        merged.line_number = None
+        merged.classes = self.classes | other.classes
+        merged.forbid = self.forbid | other.forbid
+        merged.separate = self.separate | other.separate
+        return merged
+
+
+EMPTY_PROFILE = HazmatProfile(None, 0)
+
+
+def _letters(value) -> tuple:
+    if value is None:
+        return ()
+    if isinstance(value, (HazMatCompatibilities, HazMatZones)):
+        value = value.value
+    if isinstance(value, str):
+        value = [value]
+    return tuple(str(letter).strip().upper() for letter in value)
+
+
+def _divisions(hazmat_class) -> tuple:
+    name = str(hazmat_class).strip()
+    if name.endswith('.0'):
+        name = name[:-2]
+    return SUBCLASSES.get(name, (name,))
+
+
+def classes_mask(hazmat_class,
+                 compatibility=None,
+                 zone=None,
+                 packaging_group: str | None = None) -> int:
+    mask = 0
+    groups = _letters(compatibility) or ALL_GROUPS
+    zones = _letters(zone) or ('A', 'B')
+    for division in _divisions(hazmat_class):
+        if division in EXPLOSIVE_DIVISIONS:
+            for group in groups:
+                mask |= CLASS_BITS.get((division, group), 0)
+        elif division == '2.3':
+            if 'A' in zones:
+                mask |= CLASS_BITS[('2.3A', None)]
+            if 'B' in zones:
+                mask |= CLASS_BITS[('2.3B', None)]
+        elif division == '6.1':
+            # only packing group I, zone A poisons are segregated
+            if 'A' in zones and packaging_group in (None, '', 'I'):
+                mask |= CLASS_BITS[('6.1A', None)]
+        else:
+            mask |= CLASS_BITS.get((division, None), 0)
+    return mask
+
+
+def profile_commodity(commodity: Commodity) -> HazmatProfile:
+    if not commodity.hazmat or commodity.hazmat_class is None:
+        return HazmatProfile(commodity.line_number, 0)
+    return HazmatProfile(commodity.line_number, classes_mask(commodity.hazmat_class,
+                                                            commodity.hazmat_compatibility,
+                                                            commodity.hazmat_material_zone,
+                                                            commodity.hazmat_packaging_group))
+
+
+def profile_post_body_line(post_body: dict, n: int) -> HazmatProfile:
+    hazmat_class = post_body.get(f'HZCL{n}')
+    if post_body.get(f'HZ{n}') != 'Y' or hazmat_class is None:
+        return HazmatProfile(n, 0)
+    return HazmatProfile(n, classes_mask(hazmat_class,
+                                         post_body.get(f'Compat{n}'),
+                                         post_body.get(f'HZZone{n}'),
+                                         post_body.get(f'HZPackGrp{n}')))
+
+
+class Conflict:
+    def __init__(self, line_a: int | None, line_b: int | None, segregation: Segregation, classes: list[str]):
+        self.line_a = line_a
+        self.line_b = line_b
+        self.segregation = segregation
+        self.classes = classes
+
+    def __str__(self):
+        verb = {Segregation.FORBIDDEN         : 'may not be loaded with',
+                Segregation.POSSIBLY_FORBIDDEN: 'may, depending on its exact class, not be loaded with',
+                Segregation.SEPARATE          : 'must be separated from'}[self.segregation]
+        return f'line {self.line_a} {verb} line {self.line_b} ({", ".join(self.classes)})'
+
+    def __repr__(self):
+        return f'Conflict({self.line_a}, {self.line_b}, {self.segregation.value})'
+
+
+def _conflicting_classes(a: HazmatProfile, b: HazmatProfile, segregation: Segregation) -> list[str]:
+    rows = SEPARATE_ROWS if segregation is Segregation.SEPARATE else FORBID_ROWS
+    names = set()
+    remaining = a.classes
+    while remaining:
+        bit = remaining & -remaining
+        hits = rows[bit] & b.classes
+        while hits:
+            hit = hits & -hits
+            names.add(f'{BIT_NAMES[bit]}/{BIT_NAMES[hit]}')
+            hits ^= hit
+        remaining ^= bit
+    return sorted(names)
+
+
+def find_conflicts(profiles: list[HazmatProfile], include_separation: bool = True) -> list[Conflict]:
+    """
+    Every conflicting pair among the given lines.  Pairs are only compared once a line actually clashes
+    with the running union of the earlier lines, so clean BOLs cost one AND per line.
+    """
+    conflicts = []
+    seen = EMPTY_PROFILE
+    hazmat_profiles = [profile for profile in profiles if profile.classes]
+    for position, profile in enumerate(hazmat_profiles):
+        if seen.conflict_with(profile) is not None:
+            for earlier in hazmat_profiles[:position]:
+                segregation = earlier.conflict_with(profile)
+                if segregation is Segregation.SEPARATE and not include_separation:
+                    continue
+                if segregation is not None:
+                    conflicts.append(Conflict(earlier.line_number, profile.line_number, segregation,
+                                              _conflicting_classes(earlier, profile, segregation)))
+        seen = seen.merge(profile)
+    return conflicts
+
+
+def check_commodity_lines(commodity_lines: list[Commodity], include_separation: bool = True) -> list[Conflict]:
+    return find_conflicts([profile_commodity(line) for line in commodity_lines], include_separation)
+
+
+def load_profile(commodity_lines: list[Commodity]) -> HazmatProfile:
+    """
+    Collapse a candidate load to one profile; two loads can be consolidated when
+    load_profile(a).conflict_with(load_profile(b)) is None.
+    """
+    profile = EMPTY_PROFILE
+    for line in commodity_lines:
+        profile = profile.merge(profile_commodity(line))
+    return profile
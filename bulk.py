@@ -0,0 +1,106 @@
+"""
+Run an SDK call over many inputs concurrently, yielding each result as soon as it completes.
+
+Inputs are pulled lazily and at most `parallel` calls are in flight, so an input of any size is
+processed in bounded memory.  `parallel` can also be an AdaptiveLimiter, which then sets the number
+of calls in flight from the latency and failures it sees.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator
+
+from rate_limit import AdaptiveLimiter
+
+
+class BulkResult:
+    __slots__ = ('index', 'item', 'result', 'error', 'elapsed', 'started')
+
+    def __init__(self,
+                 index: int,
+                 item,
+                 result=None,
+                 error: BaseException | None = None,
+                 elapsed: float = 0.0,
+                 started: float = 0.0):
+        self.index = index
+        self.item = item
+        self.result = result
+        self.error = error
+        self.elapsed = elapsed
+        self.started = started
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class BulkSummary:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.count = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, result: BulkResult, failed: bool | None = None):
+        # failed overrides result.ok, for callers that also count a None result as an error
+        with self._lock:
+            self.count += 1
+            self.busy_seconds += result.elapsed
+            if (not result.ok) if failed is None else failed:
+                self.errors += 1
+
+    def as_dict(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            'count'     : self.count,
+            'ok'        : self.count - self.errors,
+            'errors'    : self.errors,
+            'elapsed'   : round(elapsed, 3),
+            'per_second': round(self.count / elapsed, 2) if elapsed > 0 else 0.0,
+            'mean_call' : round(self.busy_seconds / self.count, 4) if self.count else None,
+        }
+
+
+def _timed(function: Callable, index: int, item) -> BulkResult:
+    started = time.monotonic()
+    try:
+        return BulkResult(index, item, result=function(item), elapsed=time.monotonic() - started, started=started)
+    except Exception as e:
+        return BulkResult(index, item, error=e, elapsed=time.monotonic() - started, started=started)
+
+
+def run_bulk(function: Callable, items: Iterable, parallel: int | AdaptiveLimiter = 8) -> Iterator[BulkResult]:
+    """
+    Call function(item) for every item with up to `parallel` calls in flight; results come back in
+    completion order.  Exceptions are captured on the BulkResult rather than raised.  With an
+    AdaptiveLimiter, an exception or a None result (an SDK call that got a non-200 answer) counts
+    as a failure.
+    """
+    limiter = parallel if isinstance(parallel, AdaptiveLimiter) else None
+    if limiter is None and parallel < 1:
+        raise ValueError('parallel must be at least 1')
+    max_workers = limiter.max_limit if limiter is not None else parallel
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='arcbest-bulk') as executor:
+        in_flight = set()
+        index = 0
+        exhausted = False
+        while True:
+            while not exhausted and len(in_flight) < (limiter.limit if limiter is not None else parallel):
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                in_flight.add(executor.submit(_timed, function, index, item))
+                index += 1
+            if not in_flight:
+                return
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if limiter is not None:
+                    limiter.record(result.started, result.elapsed, failed=not result.ok or result.result is None)
+                yield result
@@ -0,0 +1,131 @@
+"""
+Thread-safe TTL cache with LRU eviction, and a single-flight helper, shared by the quote and
+tracking helpers.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, ttl: float, max_entries: int = 10000):
+        if ttl <= 0:
+            raise ValueError('ttl must be greater than 0')
+        if max_entries < 1:
+            raise ValueError('max_entries must be at least 1')
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, MISSING)
+            if entry is MISSING or entry[0] <= now:
+                if entry is not MISSING:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl: float | None = None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def export_entries(self) -> list[tuple]:
+        """
+        (key, value, expires_at) for the live entries, least recently used first.  expires_at is
+        wall-clock time, so it still means something to another process.
+        """
+        now, wall = time.monotonic(), time.time()
+        with self._lock:
+            return [(key, value, wall + expires - now) for key, (expires, value) in self._entries.items()
+                    if expires > now]
+
+    def import_entries(self, entries) -> int:
+        """
+        Add exported entries that have not expired, never for longer than this cache's ttl;
+        returns how many were added.
+        """
+        wall = time.time()
+        added = 0
+        for key, value, expires_at in entries:
+            if expires_at > wall:
+                self.set(key, value, ttl=min(expires_at - wall, self.ttl))
+                added += 1
+        return added
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries' : len(self._entries),
+            'hits'    : self.hits,
+            'misses'  : self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one: the first caller runs the function, the
+    others wait for and share its result (or exception).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, function, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
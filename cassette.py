@@ -0,0 +1,237 @@
+"""
+Record/replay transport for offline, deterministic runs of quote, BOL and tracking traffic.
+
+A cassette is a JSONL file with one request/response pair per line, plus a sidecar index
+(<cassette>.idx) mapping each request fingerprint to the byte offsets of its entries, so replay
+only reads the entries it serves.  The API key is scrubbed from the stored request and response.
+
+    with use_cassette('monday.jsonl', mode='record'):
+        get_quote(...)
+
+    with use_cassette('monday.jsonl', mode='replay', speed=10.0):
+        get_quote(...)   # answered from the cassette, at 10x the recorded latency
+
+Requests are matched on a fingerprint of the endpoint kind and the canonical post body (sorted
+fields, API key removed).  Identical requests are served in the order they were recorded.
+"""
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import transport
+from transport import Deadline, ResponsePolicy, TransportResponse, form_fields, spool_chunks
+
+SCRUBBED_FIELDS = ('ID', 'api_key')
+SCRUBBED_VALUE = '***'
+
+
+class CassetteMiss(Exception):
+    pass
+
+
+def canonical_body(post_body: dict | bytes) -> list:
+    canonical = []
+    for key, value in form_fields(post_body).items():
+        if key in SCRUBBED_FIELDS or value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            # as encoded: None items are dropped and a key sent once reads back as a single value
+            values = [str(v) for v in value if v is not None]
+            if not values:
+                continue
+            value = values if len(values) > 1 else values[0]
+        else:
+            value = str(value)
+        canonical.append([key, value])
+    canonical.sort(key=lambda item: item[0])
+    return canonical
+
+
+def fingerprint(kind: str, post_body: dict | bytes) -> str:
+    payload = json.dumps([kind, canonical_body(post_body)], separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def scrub(text: str, api_key: str | None) -> str:
+    if api_key:
+        return text.replace(api_key, SCRUBBED_VALUE)
+    return text
+
+
+class Cassette:
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = f'{path}.idx'
+        self._lock = threading.Lock()
+        self._index = None
+        self._cursors = {}
+        self._file = None
+        self._recording_started = None
+
+    # -- recording --
+
+    def record(self, kind: str, url: str, post_body: dict | bytes, api_key: str | None,
+               status_code: int, body: bytes, started: float, elapsed: float):
+        try:
+            stored_body = {'body': scrub(body.decode('utf-8'), api_key)}
+        except UnicodeDecodeError:
+            stored_body = {'body_b64': base64.b64encode(body).decode('ascii')}
+        with self._lock:
+            if self._recording_started is None:
+                self._recording_started = started
+            entry = {
+                'fp'     : fingerprint(kind, post_body),
+                'kind'   : kind,
+                'url'    : url,
+                'request': {key: value for key, value in canonical_body(post_body)},
+                'status' : status_code,
+                'offset' : round(started - self._recording_started, 6),
+                'elapsed': round(elapsed, 6),
+                **stored_body,
+            }
+            if self._file is None:
+                self._file = open(self.path, 'ab')
+                self._load_index()
+            position = self._file.tell()
+            self._file.write(json.dumps(entry, separators=(',', ':')).encode('utf-8') + b'\n')
+            self._index.setdefault(entry['fp'], []).append(position)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                with open(self.index_path, 'w', encoding='utf-8') as f:
+                    json.dump({'size': os.path.getsize(self.path), 'entries': self._index}, f)
+
+    # -- replay --
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding='utf-8') as f:
+                stored = json.load(f)
+            if stored.get('size') == size:
+                self._index = stored['entries']
+                return
+        # missing or stale index: rebuild it with one pass over the cassette
+        self._index = {}
+        if size:
+            with open(self.path, 'rb') as f:
+                position = f.tell()
+                for line in f:
+                    if line.strip():
+                        self._index.setdefault(json.loads(line)['fp'], []).append(position)
+                    position = f.tell()
+
+    def _read_at(self, position: int) -> dict:
+        with open(self.path, 'rb') as f:
+            f.seek(position)
+            return json.loads(f.readline())
+
+    def lookup(self, kind: str, post_body: dict | bytes) -> dict:
+        fp = fingerprint(kind, post_body)
+        with self._lock:
+            self._load_index()
+            positions = self._index.get(fp)
+            if not positions:
+                raise CassetteMiss(f'No recorded {kind} response for request fingerprint {fp}')
+            # serve repeated identical requests in recorded order, then start over
+            cursor = self._cursors.get(fp, 0)
+            self._cursors[fp] = cursor + 1
+            position = positions[cursor % len(positions)]
+        return self._read_at(position)
+
+    def entries(self):
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def schedule(self, speed: float | None = 1.0):
+        """
+        Yield recorded entries at their original start offsets divided by speed; None yields immediately.
+        Useful for driving a load replay with the same arrival pattern as the recorded day.
+        """
+        start = time.monotonic()
+        for entry in sorted(self.entries(), key=lambda e: e['offset']):
+            if speed:
+                delay = entry['offset'] / speed - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            yield entry
+
+
+def entry_body(entry: dict) -> bytes:
+    if 'body_b64' in entry:
+        return base64.b64decode(entry['body_b64'])
+    return entry['body'].encode('utf-8')
+
+
+class RecordingTransport:
+    def __init__(self, cassette: Cassette, inner=None):
+        self.cassette = cassette
+        self.inner = inner if inner is not None else transport.HttpTransport()
+
+    def post(self,
+             kind: str,
+             url: str,
+             params: dict,
+             data: dict,
+             policy: ResponsePolicy,
+             deadline: Deadline | None = None) -> TransportResponse:
+        started = time.time()
+        start = time.perf_counter()
+        response = self.inner.post(kind, url, params, data, policy, deadline=deadline)
+        elapsed = time.perf_counter() - start
+        self.cassette.record(kind, url, data, params.get('api_key') or form_fields(data).get('ID'),
+                             response.status_code, response.read(), started, elapsed)
+        response.body.seek(0)
+        return response
+
+
+class ReplayTransport:
+    def __init__(self, cassette: Cassette, speed: float | None = 1.0):
+        if speed is not None and speed <= 0:
+            raise ValueError('speed must be greater than 0, or None to replay without delays')
+        self.cassette = cassette
+        self.speed = speed
+
+    def post(self,
+             kind: str,
+             url: str,
+             params: dict,
+             data: dict,
+             policy: ResponsePolicy,
+             deadline: Deadline | None = None) -> TransportResponse:
+        entry = self.cassette.lookup(kind, data)
+        if self.speed is not None:
+            if deadline is not None:
+                deadline.sleep(entry['elapsed'] / self.speed, url)
+            else:
+                time.sleep(entry['elapsed'] / self.speed)
+        body, size = spool_chunks(url, [entry_body(entry)], policy)
+        return TransportResponse(entry['status'], body, size)
+
+
+@contextmanager
+def use_cassette(path: str, mode: str = 'replay', speed: float | None = 1.0):
+    if mode not in ('record', 'replay'):
+        raise ValueError("mode must be 'record' or 'replay'")
+    cassette = Cassette(path)
+    previous = transport.get_transport()
+    if mode == 'record':
+        transport.set_transport(RecordingTransport(cassette, inner=previous))
+    else:
+        transport.set_transport(ReplayTransport(cassette, speed=speed))
+    try:
+        yield cassette
+    finally:
+        transport.set_transport(previous)
+        cassette.close()
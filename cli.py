@@ -0,0 +1,206 @@
+"""
+arcbest - batch command line for tracking, quotes and BOLs.
+
+    arcbest track  [-i refs.txt]    one reference per line: REF, REF,TYPE or {"ref": ..., "type": ...}
+    arcbest quote  [-i quotes.jsonl]  one JSON object per line with the get_quote arguments
+    arcbest bol    [-i bols.jsonl]    one JSON object per line with the get_bol arguments
+
+Model arguments are nested objects holding the model's constructor arguments; enums are given by
+name or value and dates as YYYY-MM-DD, e.g.
+
+    {"shipper": {"street_address": "1 Main", "city": "Dallas", "state": "TX", "zip_code": "75201",
+                 "country": "US"},
+     "consignee": {...}, "commodity": {"weight": 400, "line_number": 1, "shipment_class": "CLASS_50"},
+     "shipment_specifics": {"ship_month": 5, "ship_day": 30, "ship_year": 2024}}
+
+A quote's commodity may also be a list of lines, numbered in order and sent as one request:
+"commodity": [{"weight": 400, "shipment_class": "CLASS_50"}, {"weight": 120, "shipment_class": "CLASS_85"}].
+
+Input is read from a file or stdin and results are written as JSONL, one line per input line, as
+soon as each call completes.  A throughput and error summary goes to stderr at the end.
+"""
+import argparse
+import contextlib
+import inspect
+import json
+import os
+import sys
+import types
+import typing
+from datetime import date
+from enum import Enum
+
+from bulk import BulkSummary, run_bulk
+from rate_limit import AdaptiveLimiter
+
+
+def coerce(annotation, value):
+    if value is None or annotation is inspect.Parameter.empty:
+        return value
+    origin = typing.get_origin(annotation)
+    if origin in (typing.Union, types.UnionType):
+        candidates = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(candidates) > 1:
+            # e.g. Commodity | list[Commodity]: a list of lines or a single one
+            is_list = isinstance(value, list)
+            candidates = [arg for arg in candidates if (typing.get_origin(arg) in (list, tuple)) == is_list]
+        return coerce(candidates[0], value) if len(candidates) == 1 else value
+    if origin in (list, tuple):
+        args = typing.get_args(annotation)
+        return [coerce(args[0] if args else inspect.Parameter.empty, item) for item in value]
+    if isinstance(annotation, type):
+        if issubclass(annotation, Enum):
+            if isinstance(value, str) and value in annotation.__members__:
+                return annotation[value]
+            for member in annotation:
+                if member.value == value or str(member.value) == str(value):
+                    return member
+            return annotation(value)
+        if annotation is date and isinstance(value, str):
+            return date.fromisoformat(value)
+        if isinstance(value, dict) and annotation not in (dict, str):
+            return build(annotation, value)
+    return value
+
+
+def build(target, data: dict):
+    """
+    Call a model class or SDK function with JSON arguments, coercing them to the annotated types.
+    """
+    signature = inspect.signature(target)
+    unknown = set(data) - set(signature.parameters)
+    if unknown:
+        raise TypeError(f'{target.__name__} got unexpected arguments: {", ".join(sorted(unknown))}')
+    return target(**{name: coerce(signature.parameters[name].annotation, value) for name, value in data.items()})
+
+
+def parse_tracking_line(line: str, default_type) -> tuple[str, object]:
+    from tracking.tracking import TrackingRefereceTypes
+    line = line.strip()
+    if line.startswith('{'):
+        data = json.loads(line)
+        reference, reference_type = data['ref'], data.get('type')
+    else:
+        reference, _, reference_type = line.replace('\t', ',').partition(',')
+        reference_type = reference_type.strip() or None
+    if reference_type is None:
+        return reference.strip(), default_type
+    return reference.strip(), coerce(TrackingRefereceTypes, reference_type)
+
+
+def read_lines(stream):
+    for number, line in enumerate(stream, start=1):
+        if line.strip():
+            yield number, line
+
+
+def make_call(command: str, args):
+    if command == 'track':
+        from tracking.tracking import TrackingRefereceTypes, get_tracking_data
+        default_type = coerce(TrackingRefereceTypes, args.type)
+        fields = [name.strip() for name in args.fields.split(',') if name.strip()] if args.fields else None
+
+        def call(numbered_line):
+            reference, reference_type = parse_tracking_line(numbered_line[1], default_type)
+            kwargs = {'arcbest_tracking_api_endpoint': args.endpoint} if args.endpoint else {}
+            return get_tracking_data(tracking_number=reference, reference_type=reference_type,
+                                     timeout=args.timeout, hedge=args.hedge, fields=fields, **kwargs)
+    elif command == 'quote':
+        from quote.quote import get_quote
+
+        def call(numbered_line):
+            return build(get_quote, json.loads(numbered_line[1]))
+    else:
+        from bol.bill_of_lading import get_bol
+
+        def call(numbered_line):
+            return build(get_bol, json.loads(numbered_line[1]))
+    return call
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='arcbest', description='Batch ArcBest tracking, quotes and BOLs')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    for command in ('track', 'quote', 'bol'):
+        subparser = subcommands.add_parser(command)
+        subparser.add_argument('-i', '--input', help='input file (default: stdin)')
+        subparser.add_argument('-o', '--output', help='output JSONL file (default: stdout)')
+        subparser.add_argument('-p', '--parallel', type=int, default=8,
+                               help='calls in flight, or the ceiling with --adaptive (default: 8)')
+        subparser.add_argument('--adaptive', action='store_true',
+                               help='adjust the calls in flight to ArcBest latency and errors')
+        subparser.add_argument('--gateway', help='send calls through an arcbest gateway at this URL')
+        subparser.add_argument('--key-pool', action='store_true',
+                               help='spread calls over the keys in ARCBEST_API_KEYS ("acct=key,key2,...")')
+        if command in ('track', 'bol'):
+            subparser.add_argument('--reference-index', metavar='PATH',
+                                   help='learn reference to PRO mappings in this SQLite file and track by PRO')
+        subparser.add_argument('--verbose', action='store_true', help='show the SDK request/response logging')
+        if command == 'track':
+            subparser.add_argument('--type', default='ArcBestPro',
+                                   help='reference type when a line does not give one (default: ArcBestPro)')
+            subparser.add_argument('--endpoint', help='tracking API URL (default: the SDK default)')
+            subparser.add_argument('--timeout', type=float, help='total seconds per lookup, retries included')
+            subparser.add_argument('--hedge', action='store_true', help='send a second request for slow lookups')
+            subparser.add_argument('--fields', help='only read these comma separated fields of the shipment, '
+                                                    'e.g. status,expected_delivery')
+    args = parser.parse_args(argv)
+
+    if args.gateway:
+        import transport
+        from gateway import GatewayTransport
+        transport.set_transport(GatewayTransport(args.gateway))
+
+    if args.key_pool:
+        import key_pool
+        key_pool.set_key_pool(key_pool.KeyPool.from_env())
+
+    index = None
+    if getattr(args, 'reference_index', None):
+        from tracking.reference_index import ReferenceIndex, set_reference_index
+        index = ReferenceIndex(args.reference_index)
+        set_reference_index(index)
+
+    call = make_call(args.command, args)
+    source = open(args.input, encoding='utf-8') if args.input else sys.stdin
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    summary = BulkSummary()
+    parallel = AdaptiveLimiter(initial=min(4, args.parallel), max_limit=args.parallel) if args.adaptive else args.parallel
+    # the SDK calls print their requests and responses; keep stdout clean for the JSONL results
+    chatter = sys.stderr if args.verbose else open(os.devnull, 'w')
+    try:
+        with contextlib.redirect_stdout(chatter):
+            for result in run_bulk(call, read_lines(source), parallel=parallel):
+                # the SDK calls return None when ArcBest answers with a non-200 status
+                ok = result.ok and result.result is not None
+                summary.add(result, failed=not ok)
+                record = {'line': result.item[0], 'ok': ok, 'elapsed': round(result.elapsed, 4)}
+                if ok:
+                    record['result'] = result.result
+                elif result.error is not None:
+                    record['error'] = f'{type(result.error).__name__}: {result.error}'
+                else:
+                    record['error'] = 'non-200 response'
+                output.write(json.dumps(record, default=str) + '\n')
+                output.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+        if chatter is not sys.stderr:
+            chatter.close()
+        report = {'summary': summary.as_dict()}
+        if args.adaptive:
+            report['concurrency'] = parallel.snapshot()
+        if index is not None:
+            report['reference_index'] = index.stats()
+            index.close()
+        print(json.dumps(report), file=sys.stderr)
+    return 1 if summary.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,381 @@
+"""
+Compact, versioned binary encoding of SDK models, enums and result trees for queues and pipes.
+
+    payload = codec.encode({'lines': commodity_lines, 'quote': response_dict})
+    message = codec.decode(payload)
+
+Every value is a type byte followed by its payload: integers are zigzag varints, strings and bytes
+are length-prefixed, lists and dicts are counted.  A model is its model id followed by
+(field tag, value) pairs for the fields that are not None, and an enum member is its enum id and
+member index, so a message carries no class paths and no attribute names.
+
+The ids and tags come from the MODELS and ENUMS tables and are the wire format: models, enums,
+fields and enum members are only ever appended to them.  A decoder skips field tags it does not
+know and leaves fields a message does not carry as None, so producers and consumers a few SDK
+versions apart can exchange messages; models and enum members it has never heard of decode to
+UnknownValue, which encodes back to the same bytes when a message is passed along.
+
+Decoded models are rebuilt without calling their constructors, so decoding runs no validation.
+Attributes that are not in the schema are not sent, and tuples and OrderedDicts (the xmltodict
+trees) come back as lists and dicts.
+"""
+import struct
+from datetime import date, datetime
+from enum import Enum
+
+from bol.bill_of_lading import AdditionalServices as BolAdditionalServices, CopyConfirmation, DeliveryDateTypes, \
+    DeliveryOptions, DeliveryTimeTypes, DocLabelInfo, FileFormats, LabelFormats, PayTerms, PickupOptions, \
+    ReferenceNumbers, Requestor, RequestorTypes, ShipmentSpecifics as BolShipmentSpecifics, \
+    TimeCriticalShipmentSpecifics
+from bol.commodity import Commodity as BolCommodity, HazMatCompatibilities, HazMatZones
+from bol.shipping_party import ShippingParty as BolShippingParty
+from quote.estimator import RateEstimate
+from quote.quote import AdditionalServices as QuoteAdditionalServices, Commodity as QuoteCommodity, DeclaredTypes, \
+    DeliveryServices, PickupServices, ShipmentSpecifics as QuoteShipmentSpecifics, \
+    ShippingParty as QuoteShippingParty, TradeshowDeliveryTypes
+from shared_enums import LimitedAccessOptions, PackageType, ShipmentClasses, UnitsOfMeasurement
+from tracking.tracking import TrackingRefereceTypes
+
+MAGIC = b'AB'
+FORMAT_VERSION = 1
+
+NONE, FALSE, TRUE, INT, FLOAT, STR, BYTES, LIST, DICT, ENUM, MODEL, DATE, DATETIME, STRING_REF = range(14)
+
+ENUMS = {
+    1: PackageType,
+    2: UnitsOfMeasurement,
+    3: LimitedAccessOptions,
+    4: ShipmentClasses,
+    5: TradeshowDeliveryTypes,
+    6: DeclaredTypes,
+    7: RequestorTypes,
+    8: PayTerms,
+    9: DeliveryDateTypes,
+    10: DeliveryTimeTypes,
+    11: FileFormats,
+    12: LabelFormats,
+    13: HazMatCompatibilities,
+    14: HazMatZones,
+    15: TrackingRefereceTypes,
+}
+
+# model id -> (class, attribute names in tag order)
+MODELS = {
+    1: (QuoteShippingParty,
+        ('street_address', 'city', 'state', 'zip', 'country', 'name', 'name_plus', 'acct_number',
+         'submitting_party', 'paying_party')),
+    2: (QuoteCommodity,
+        ('weight', 'line_number', 'shipment_class', 'length', 'width', 'height', 'unit_number',
+         'packaging_type', 'nmfc')),
+    3: (QuoteShipmentSpecifics,
+        ('shipMonth', 'shipDay', 'shipYear', 'cubicFeet', 'overall_length', 'overall_width',
+         'overall_height', 'measurement_unit')),
+    4: (PickupServices,
+        ('lift_gate', 'inside', 'limited_access', 'type_of_limited_access', 'residential', 'trade_show')),
+    5: (DeliveryServices,
+        ('construction_site', 'lift_gate', 'inside', 'limited_access', 'type_of_limited_access',
+         'residential', 'flat_bed', 'trade_show', 'trade_show_type')),
+    6: (QuoteAdditionalServices,
+        ('do_not_stack', 'arrival_notification', 'capacity_load', 'bond', 'excess_liability',
+         'declared_value', 'declared_type', 'over_dimension', 'longest_side', 'single_shipment',
+         'sort_and_segregate', 'num_to_sort_and_segregate', 'truck_pack', 'truck_pack_count',
+         'freeze_protection', 'shipper_loading', 'consignee_unloading', 'hazmat', 'pallet',
+         'terminal_delivery', 'terminal_pickup')),
+    7: (BolShippingParty,
+        ('name', 'name_plus', 'street_address', 'city', 'state', 'zip', 'country', 'phone', 'phone_ext',
+         'fax', 'email')),
+    8: (BolCommodity,
+        ('line_number', 'number_of_handling_units', 'handling_unit_type', 'length', 'width', 'height',
+         'number_of_packages', 'package_type', 'total_weight', 'shipment_class', 'nmfc_number',
+         'nmfc_sub_number', 'cube', 'description', 'hazmat', 'hazmat_class', 'un_ua_number',
+         'hazmat_contact_name', 'hazmat_contact_phone', 'hazmat_contact_phone_ext',
+         'hazmat_proper_shipping_name', 'hazmat_technical_name', 'hazmat_product_name', 'hazmat_sub_hazard1',
+         'hazmat_sub_hazard2', 'hazmat_packaging_group', 'hazmat_additional_info', 'hazmat_dot_exemption',
+         'hazmat_special_permit', 'hazmat_reportable_quantity', 'hazmat_limited_quantity',
+         'hazmat_poison_inhalation_hazard', 'hazmat_bulk_package', 'hazmat_marine_pollutant',
+         'hazmat_residue_last_contained', 'hazmat_compatibility', 'hazmat_material_zone',
+         'hazmat_flash_point_temp', 'hazmat_net_explosive_mass')),
+    9: (BolShipmentSpecifics,
+        ('shipDate', 'formatted_ship_date', 'other_carrier', 'pro_number', 'pro_number_check_digit',
+         'auto_assign_pro_number', 'quote_id', 'instructions', 'total_cube', 'cube_unit_of_measurement')),
+    10: (TimeCriticalShipmentSpecifics,
+        ('isTimeCritical', 'delivery_date_type', 'delivery_date_min', 'delivery_date_max',
+         'delivery_time_type', 'delivery_time', 'delivery_time_min', 'delivery_time_max')),
+    11: (ReferenceNumbers,
+        ('bol_number', 'po_number', 'actual_po_number', 'po_pieces', 'po_weight', 'po_department',
+         'customer_reference_number')),
+    12: (CopyConfirmation,
+        ('bol_to_shipper', 'bol_to_consignee', 'bol_to_third_party', 'bol_to_emails',
+         'shipping_lables_to_shipper', 'shipping_labels_to_consignee', 'shipping_labels_to_third_party',
+         'shipping_labels_to_emails')),
+    13: (PickupOptions,
+        ('liftgate', 'inside', 'limited_access', 'limited_access_type', 'residential_pickup')),
+    14: (DeliveryOptions,
+        ('construction_site', 'on_date', 'liftgate', 'inside', 'limited_access', 'limited_access_type',
+         'residential_delivery', 'flatbed')),
+    15: (BolAdditionalServices,
+        ('arrival_notification', 'capacity_load', 'customs_or_in_bond_freight', 'excess_liability_coverage',
+         'declared_value', 'over_dimension', 'longest_dimension', 'single_shipment', 'sort_and_segregate',
+         'number_of_pieces_to_sort_and_segregate', 'truck_pack_shipment', 'number_truck_pack_boxes',
+         'secure_shipment_divider', 'freeze_protection')),
+    16: (DocLabelInfo,
+        ('file_format', 'using_inject_printer', 'label_format', 'number_shipping_labels_to_create',
+         'start_position_avery_5264', 'number_pro_labels', 'starting_page_avery_5160')),
+    17: (Requestor,
+        ('payment_terms', 'requestor_type', 'name', 'email', 'phone', 'phone_ext', 'fax')),
+    18: (RateEstimate,
+        ('charge', 'confidence', 'basis', 'samples', 'source')),
+}
+
+_FLOAT = struct.Struct('<d')
+_ENUM_MEMBERS = {enum_id: list(enum) for enum_id, enum in ENUMS.items()}
+_ENUM_CODES = {member: (enum_id, index) for enum_id, members in _ENUM_MEMBERS.items()
+               for index, member in enumerate(members)}
+_MODEL_CODES = {model: (model_id, fields) for model_id, (model, fields) in MODELS.items()}
+
+
+class CodecError(ValueError):
+    pass
+
+
+class UnknownValue:
+    """
+    A model or enum member from a newer SDK: kind is 'model' or 'enum', value the {tag: value}
+    fields or the member index.
+    """
+    def __init__(self, kind: str, type_id: int, value):
+        self.kind = kind
+        self.type_id = type_id
+        self.value = value
+
+    def __repr__(self):
+        return f'UnknownValue({self.kind!r}, {self.type_id}, {self.value!r})'
+
+
+def _write_uint(out: bytearray, number: int):
+    while number > 0x7f:
+        out.append(number & 0x7f | 0x80)
+        number >>= 7
+    out.append(number)
+
+
+class _Writer:
+    def __init__(self):
+        self.out = bytearray(MAGIC)
+        self.out.append(FORMAT_VERSION)
+        # string -> index in the message's string table, for STRING_REF
+        self.strings = {}
+
+    def write(self, value):
+        out = self.out
+        kind = type(value)
+        if kind is str:
+            index = self.strings.get(value)
+            if index is not None:
+                out.append(STRING_REF)
+                _write_uint(out, index)
+            else:
+                self.strings[value] = len(self.strings)
+                data = value.encode('utf-8')
+                out.append(STR)
+                _write_uint(out, len(data))
+                out += data
+        elif value is None:
+            out.append(NONE)
+        elif kind is bool:
+            out.append(TRUE if value else FALSE)
+        elif kind is int:
+            out.append(INT)
+            _write_uint(out, value << 1 if value >= 0 else (-value << 1) - 1)
+        elif kind is float:
+            out.append(FLOAT)
+            out += _FLOAT.pack(value)
+        elif kind in _MODEL_CODES:
+            model_id, fields = _MODEL_CODES[kind]
+            attributes = value.__dict__
+            out.append(MODEL)
+            _write_uint(out, model_id)
+            write = self.write
+            for tag, name in enumerate(fields, start=1):
+                field_value = attributes.get(name)
+                if field_value is not None:
+                    _write_uint(out, tag)
+                    write(field_value)
+            out.append(0)
+        elif isinstance(value, Enum):
+            if value not in _ENUM_CODES:
+                raise CodecError(f'{kind.__name__} is not in the codec ENUMS table')
+            enum_id, index = _ENUM_CODES[value]
+            out.append(ENUM)
+            _write_uint(out, enum_id)
+            _write_uint(out, index)
+        elif isinstance(value, dict):
+            out.append(DICT)
+            _write_uint(out, len(value))
+            write = self.write
+            for key, item in value.items():
+                write(key)
+                write(item)
+        elif isinstance(value, (list, tuple)):
+            out.append(LIST)
+            _write_uint(out, len(value))
+            write = self.write
+            for item in value:
+                write(item)
+        elif isinstance(value, (bytes, bytearray)):
+            out.append(BYTES)
+            _write_uint(out, len(value))
+            out += value
+        elif kind is datetime:
+            data = value.isoformat().encode('ascii')
+            out.append(DATETIME)
+            _write_uint(out, len(data))
+            out += data
+        elif kind is date:
+            out.append(DATE)
+            _write_uint(out, value.toordinal())
+        elif kind is UnknownValue:
+            if value.kind == 'enum':
+                out.append(ENUM)
+                _write_uint(out, value.type_id)
+                _write_uint(out, value.value)
+            else:
+                out.append(MODEL)
+                _write_uint(out, value.type_id)
+                for tag, field_value in value.value.items():
+                    _write_uint(out, tag)
+                    self.write(field_value)
+                out.append(0)
+        else:
+            raise CodecError(f'Cannot encode {kind.__name__} values')
+
+
+def encode(value) -> bytes:
+    writer = _Writer()
+    writer.write(value)
+    return bytes(writer.out)
+
+
+class _Reader:
+    def __init__(self, data: bytes, position: int):
+        self.data = data
+        self.position = position
+        self.strings = []
+
+    def uint(self) -> int:
+        data = self.data
+        position = self.position
+        result = data[position]
+        position += 1
+        if result > 0x7f:
+            result &= 0x7f
+            shift = 7
+            while True:
+                byte = data[position]
+                position += 1
+                result |= (byte & 0x7f) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+        self.position = position
+        return result
+
+    def raw(self) -> bytes:
+        length = self.uint()
+        start = self.position
+        self.position = start + length
+        if self.position > len(self.data):
+            raise IndexError
+        return self.data[start:self.position]
+
+    def value(self):
+        data = self.data
+        kind = data[self.position]
+        self.position += 1
+        if kind == STRING_REF:
+            return self.strings[self.uint()]
+        if kind == STR:
+            string = self.raw().decode('utf-8')
+            self.strings.append(string)
+            return string
+        if kind == NONE:
+            return None
+        if kind == INT:
+            number = data[self.position]
+            if number < 0x80:
+                self.position += 1
+            else:
+                number = self.uint()
+            return -((number + 1) >> 1) if number & 1 else number >> 1
+        if kind == TRUE:
+            return True
+        if kind == FALSE:
+            return False
+        if kind == MODEL:
+            return self.model()
+        if kind == ENUM:
+            enum_id, index = self.uint(), self.uint()
+            members = _ENUM_MEMBERS.get(enum_id)
+            if members is None or index >= len(members):
+                return UnknownValue('enum', enum_id, index)
+            return members[index]
+        if kind == DICT:
+            value = self.value
+            return {value(): value() for _ in range(self.uint())}
+        if kind == LIST:
+            value = self.value
+            return [value() for _ in range(self.uint())]
+        if kind == FLOAT:
+            start = self.position
+            self.position += 8
+            return _FLOAT.unpack_from(data, start)[0]
+        if kind == BYTES:
+            return self.raw()
+        if kind == DATE:
+            return date.fromordinal(self.uint())
+        if kind == DATETIME:
+            return datetime.fromisoformat(self.raw().decode('ascii'))
+        raise CodecError(f'Unknown value type {kind} at byte {self.position - 1}')
+
+    def model(self):
+        model_id = self.uint()
+        schema = MODELS.get(model_id)
+        names = schema[1] if schema is not None else ()
+        attributes = dict.fromkeys(names)
+        unknown = {}
+        data = self.data
+        value = self.value
+        while True:
+            tag = data[self.position]
+            if tag < 0x80:
+                self.position += 1
+            else:
+                tag = self.uint()
+            if tag == 0:
+                break
+            if tag <= len(names):
+                attributes[names[tag - 1]] = value()
+            else:
+                # a field added by a newer SDK, or a model this SDK does not know
+                unknown[tag] = value()
+        if schema is None:
+            return UnknownValue('model', model_id, unknown)
+        instance = schema[0].__new__(schema[0])
+        instance.__dict__.update(attributes)
+        return instance
+
+
+def decode(data: bytes):
+    if data[:len(MAGIC)] != MAGIC or len(data) <= len(MAGIC):
+        raise CodecError('Not an encoded SDK message')
+    version = data[len(MAGIC)]
+    if version > FORMAT_VERSION:
+        raise CodecError(f'Message format version {version} is newer than this SDK supports ({FORMAT_VERSION})')
+    reader = _Reader(data, len(MAGIC) + 1)
+    try:
+        value = reader.value()
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise CodecError('Truncated or corrupt message') from e
+    if reader.position != len(data):
+        raise CodecError(f'{len(data) - reader.position} unexpected bytes after the message')
+    return value
@@ -0,0 +1,416 @@
+"""
+Local gateway process shared by the services that embed this SDK.
+
+Clients send their quote, BOL and tracking calls to the gateway instead of to ArcBest, so they
+share one connection pool, response cache, rate limiter and single-flight layer, and one API key.
+Tracking lookups arriving within a few milliseconds of each other are micro-batched: duplicates
+inside the batch are collapsed and the rest are dispatched together on the shared pool.
+
+Run it:
+    python -m gateway --port 8765
+    python -m gateway --unix-socket /run/arcbest.sock
+    python -m gateway --snapshot /var/lib/arcbest/gateway.snapshot    # start with warm caches
+
+Point an SDK process at it:
+    transport.set_transport(GatewayTransport('http://127.0.0.1:8765'))
+    transport.set_transport(GatewayTransport(unix_socket='/run/arcbest.sock'))
+
+Endpoints:
+    POST /post   {"kind": "quote" | "bol" | "tracking", "body": {...}}
+                 answers with the upstream XML and the upstream status in X-Upstream-Status;
+                 an X-Deadline header (seconds) bounds the upstream call.  The gateway posts to its
+                 own ArcBest endpoint for the kind; a "url" sent by the client is ignored, so a
+                 caller can neither redirect the gateway's API key nor poison the shared cache
+    GET  /stats  throughput, latency, cache and batching statistics
+    GET  /health
+"""
+import argparse
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import transport
+from cache import SingleFlight, TTLCache
+from cassette import fingerprint
+from metrics import LatencyStats
+from rate_limit import TokenBucket
+from transport import (Deadline, DeadlineExceeded, ResponsePolicy, ResponseTooLarge, TransportResponse, form_fields,
+                       spool_chunks)
+from utils import logger
+
+KINDS = ('quote', 'bol', 'tracking')
+# the only upstream URLs the gateway posts to; clients choose the kind, never the URL
+ENDPOINTS = {
+    'quote'   : 'https://www.abfs.com/xml/aquotexml.asp',
+    'bol'     : 'https://www.abfs.com/xml/bolxml.asp',
+    'tracking': 'https://www.abfs.com/xml/tracexml.asp',
+}
+# BOL submissions create shipments, so they are never cached or collapsed
+CACHEABLE_KINDS = ('quote', 'tracking')
+UPSTREAM_STATUS_HEADER = 'X-Upstream-Status'
+# seconds left in the client's call budget, so the gateway's upstream call gives up with it
+DEADLINE_HEADER = 'X-Deadline'
+
+
+class GatewayBusy(Exception):
+    pass
+
+
+class GatewayError(Exception):
+    def __init__(self, status: int, message: str):
+        self.status = status
+        super().__init__(f'ArcBest gateway error {status}: {message}')
+
+
+class MicroBatcher:
+    def __init__(self, executor: ThreadPoolExecutor, window: float = 0.005, max_batch: int = 64):
+        self.executor = executor
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.batched_requests = 0
+        self.collapsed = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='arcbest-gateway-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, key, call) -> Future:
+        future = Future()
+        self._queue.put((key, call, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            grouped = {}
+            for key, call, future in batch:
+                grouped.setdefault(key, (call, []))[1].append(future)
+            self.batches += 1
+            self.batched_requests += len(batch)
+            self.collapsed += len(batch) - len(grouped)
+            for call, futures in grouped.values():
+                self.executor.submit(self._dispatch, call, futures)
+
+    @staticmethod
+    def _dispatch(call, futures: list[Future]):
+        try:
+            result = call()
+        except BaseException as e:
+            for future in futures:
+                future.set_exception(e)
+        else:
+            for future in futures:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            'batches'           : self.batches,
+            'requests'          : self.batched_requests,
+            'collapsed'         : self.collapsed,
+            'average_batch_size': self.batched_requests / self.batches if self.batches else 0.0,
+        }
+
+
+class Gateway:
+    def __init__(self,
+                 api_key: str | None = None,
+                 cache_ttl: dict | None = None,
+                 rate: float = 20.0,
+                 burst: float | None = None,
+                 rate_limit_timeout: float = 30.0,
+                 workers: int = 16,
+                 batch_window: float = 0.005,
+                 max_batch: int = 64,
+                 response_policy: ResponsePolicy | None = None,
+                 upstream=None,
+                 endpoints: dict | None = None):
+        self.api_key = api_key if api_key is not None else os.environ.get('ARCBEST_API_KEY')
+        # kind -> upstream URL, configurable here (a test environment) but not by clients
+        self.endpoints = {**ENDPOINTS, **(endpoints or {})}
+        if upstream is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=workers)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            upstream = transport.HttpTransport(session)
+        self.upstream = upstream
+        cache_ttl = cache_ttl if cache_ttl is not None else {'quote': 300, 'tracking': 60}
+        self.caches = {kind: TTLCache(ttl) for kind, ttl in cache_ttl.items() if kind in CACHEABLE_KINDS and ttl}
+        self.single_flight = SingleFlight()
+        self.limiter = TokenBucket(rate, burst)
+        self.rate_limit_timeout = rate_limit_timeout
+        self.response_policy = response_policy
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='arcbest-gateway')
+        self.batcher = MicroBatcher(self.executor, batch_window, max_batch)
+        self.latency = {kind: LatencyStats() for kind in KINDS}
+        self.upstream_latency = {kind: LatencyStats() for kind in KINDS}
+        self.started = time.monotonic()
+
+    def handle(self, kind: str, body: dict, deadline: Deadline | None = None) -> tuple[int, bytes]:
+        if kind not in KINDS:
+            raise ValueError(f'Unknown kind {kind!r}, expected one of {KINDS}')
+        start = time.perf_counter()
+        try:
+            body = {key: value for key, value in body.items() if key != 'ID'}
+            body['ID'] = self.api_key
+            key = fingerprint(kind, body)
+
+            cache = self.caches.get(kind)
+            if cache is not None:
+                cached = cache.get(key)
+                if cached is not None:
+                    self.latency[kind].record(time.perf_counter() - start)
+                    return cached
+
+            if kind == 'tracking':
+                future = self.batcher.submit(key, lambda: self.single_flight.do(key, self._upstream, kind, body, key, deadline))
+                result = future.result()
+            elif kind in CACHEABLE_KINDS:
+                result = self.single_flight.do(key, self._upstream, kind, body, key, deadline)
+            else:
+                result = self._upstream(kind, body, key, deadline)
+        except BaseException:
+            self.latency[kind].record_error()
+            raise
+        self.latency[kind].record(time.perf_counter() - start)
+        return result
+
+    def _upstream(self, kind: str, body: dict, key: str, deadline: Deadline | None = None) -> tuple[int, bytes]:
+        rate_limit_timeout = self.rate_limit_timeout if deadline is None else min(self.rate_limit_timeout, deadline.remaining())
+        if not self.limiter.acquire(timeout=rate_limit_timeout):
+            raise GatewayBusy('Timed out waiting for the upstream rate limit')
+        start = time.perf_counter()
+        try:
+            response = self.upstream.post(kind, self.endpoints[kind], {'api_key': self.api_key}, body,
+                                          self.response_policy or transport.DEFAULT_RESPONSE_POLICY, deadline=deadline)
+            with response:
+                result = (response.status_code, response.read())
+        except BaseException:
+            self.upstream_latency[kind].record_error()
+            raise
+        self.upstream_latency[kind].record(time.perf_counter() - start, error=result[0] != 200)
+        cache = self.caches.get(kind)
+        if cache is not None and result[0] == 200:
+            cache.set(key, result)
+        return result
+
+    def snapshot_components(self) -> dict:
+        """
+        The gateway's caches and latency stats, named for snapshot.save/load.
+        """
+        components = {f'gateway.cache.{kind}': cache for kind, cache in self.caches.items()}
+        components.update((f'gateway.latency.{kind}', stats) for kind, stats in self.latency.items())
+        components.update((f'gateway.upstream_latency.{kind}', stats) for kind, stats in self.upstream_latency.items())
+        return components
+
+    def stats(self) -> dict:
+        return {
+            'uptime'          : time.monotonic() - self.started,
+            'latency'         : {kind: stats.snapshot() for kind, stats in self.latency.items()},
+            'upstream_latency': {kind: stats.snapshot() for kind, stats in self.upstream_latency.items()},
+            'cache'           : {kind: cache.stats() for kind, cache in self.caches.items()},
+            'coalesced'       : self.single_flight.coalesced,
+            'tracking_batches': self.batcher.stats(),
+        }
+
+
+class GatewayRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ArcBestGateway/0.1'
+
+    def _send(self, status: int, data: bytes, content_type: str, headers: dict | None = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status: int, payload: dict):
+        self._send(status, json.dumps(payload, default=str).encode('utf-8'), 'application/json')
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send_json(200, self.server.gateway.stats())
+        elif self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        if self.path != '/post':
+            self._send_json(404, {'error': f'Unknown path {self.path}'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length))
+            budget = self.headers.get(DEADLINE_HEADER)
+            deadline = Deadline(max(float(budget), 0.001)) if budget else None
+            status, data = self.server.gateway.handle(request['kind'], request['body'], deadline)
+        except (KeyError, TypeError, ValueError) as e:
+            self._send_json(400, {'error': str(e)})
+        except GatewayBusy as e:
+            self._send_json(503, {'error': str(e)})
+        except DeadlineExceeded as e:
+            self._send_json(504, {'error': str(e)})
+        except (ResponseTooLarge, requests.RequestException) as e:
+            self._send_json(502, {'error': str(e)})
+        except Exception as e:
+            logger.exception('ArcBest gateway request failed')
+            self._send_json(500, {'error': str(e)})
+        else:
+            self._send(200, data, 'text/xml', {UPSTREAM_STATUS_HEADER: str(status)})
+
+    def address_string(self):
+        return str(self.client_address[0]) if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        logger.debug(f'{self.address_string()} {format % args}')
+
+
+class GatewayHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, gateway: Gateway):
+        self.gateway = gateway
+        super().__init__(address, GatewayRequestHandler)
+
+
+class GatewayUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, gateway: Gateway):
+        self.gateway = gateway
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, GatewayRequestHandler)
+
+
+def make_server(gateway: Gateway, host: str = '127.0.0.1', port: int = 8765, unix_socket: str | None = None):
+    if unix_socket is not None:
+        return GatewayUnixServer(unix_socket, gateway)
+    return GatewayHTTPServer((host, port), gateway)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_socket = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_socket)
+
+
+class GatewayTransport:
+    """
+    Transport that sends SDK calls to a gateway instead of straight to ArcBest.  Neither the client's
+    API key nor the url is forwarded; the gateway uses its own key and its own endpoint for the kind.
+    """
+    def __init__(self, base_url: str = 'http://127.0.0.1:8765', unix_socket: str | None = None, timeout: float = 120):
+        self.base_url = base_url
+        self.unix_socket = unix_socket
+        self.timeout = timeout
+
+    def _connection(self, timeout: float) -> http.client.HTTPConnection:
+        if self.unix_socket is not None:
+            return _UnixHTTPConnection(self.unix_socket, timeout)
+        parsed = requests.utils.urlparse(self.base_url)
+        connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+        return connection_class(parsed.hostname, parsed.port, timeout=timeout)
+
+    def post(self,
+             kind: str,
+             url: str,
+             params: dict,
+             data: dict,
+             policy: ResponsePolicy,
+             deadline: Deadline | None = None) -> TransportResponse:
+        payload = json.dumps({'kind': kind,
+                              'body': {key: value for key, value in form_fields(data).items() if key != 'ID'}})
+        headers = {'Content-Type': 'application/json'}
+        timeout = self.timeout
+        if deadline is not None:
+            deadline.check(url)
+            timeout = min(timeout, deadline.remaining())
+            headers[DEADLINE_HEADER] = f'{timeout:.3f}'
+        connection = self._connection(timeout)
+        try:
+            connection.request('POST', '/post', body=payload.encode('utf-8'), headers=headers)
+            response = connection.getresponse()
+            upstream_status = response.getheader(UPSTREAM_STATUS_HEADER)
+            if upstream_status is None:
+                raise GatewayError(response.status, response.read().decode('utf-8', 'replace'))
+            body, size = spool_chunks(url, iter(lambda: response.read(policy.chunk_size), b''), policy, deadline)
+            return TransportResponse(int(upstream_status), body, size)
+        except TimeoutError as e:
+            if deadline is not None and deadline.expired and not isinstance(e, DeadlineExceeded):
+                raise DeadlineExceeded(url, deadline.budget) from e
+            raise
+        finally:
+            connection.close()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description='Local ArcBest gateway shared by SDK clients')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix-socket', help='listen on a Unix socket instead of TCP')
+    parser.add_argument('--rate', type=float, default=20.0, help='upstream requests per second')
+    parser.add_argument('--burst', type=float, help='upstream burst size (default: rate)')
+    parser.add_argument('--workers', type=int, default=16, help='upstream connections and worker threads')
+    parser.add_argument('--batch-window-ms', type=float, default=5.0, help='tracking micro-batch window')
+    parser.add_argument('--quote-ttl', type=float, default=300.0, help='quote cache TTL in seconds, 0 disables')
+    parser.add_argument('--tracking-ttl', type=float, default=60.0, help='tracking cache TTL in seconds, 0 disables')
+    parser.add_argument('--snapshot', metavar='PATH', help='warm-start from this snapshot file and keep it updated')
+    parser.add_argument('--snapshot-interval', type=float, default=300.0, help='seconds between snapshots')
+    args = parser.parse_args(argv)
+
+    gateway = Gateway(cache_ttl={'quote': args.quote_ttl, 'tracking': args.tracking_ttl},
+                      rate=args.rate,
+                      burst=args.burst,
+                      workers=args.workers,
+                      batch_window=args.batch_window_ms / 1000)
+    if gateway.api_key is None:
+        parser.error('ARCBEST_API_KEY must be set in the gateway environment')
+    writer = None
+    if args.snapshot:
+        import snapshot
+        components = gateway.snapshot_components()
+        snapshot.load(args.snapshot, components)
+        writer = snapshot.SnapshotWriter(args.snapshot, args.snapshot_interval, components).start()
+    server = make_server(gateway, args.host, args.port, args.unix_socket)
+    print(f'ArcBest gateway listening on {args.unix_socket or f"{args.host}:{args.port}"}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if writer is not None:
+            writer.stop()
+
+
+if __name__ == '__main__':
+    main()
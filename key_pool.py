@@ -0,0 +1,220 @@
+"""
+Pool of ArcBest API keys for deployments with several accounts.
+
+Each request is routed to a key: a quote whose paying party carries an account number goes to the
+key registered for that account, everything else is spread round-robin or to the least loaded
+key.  Keys have their own rate and in-flight budgets, and a key that is throttled (HTTP 429) or
+keeps failing is taken out of rotation for a cooldown that doubles while the trouble continues.
+
+    key_pool.set_key_pool(KeyPool.from_env())    # ARCBEST_API_KEYS="acct1=key1,acct2=key2,key3"
+
+With a pool installed, SDK calls made without an explicit arcbest_api_key leave the key to the
+pool; the transport leases one per request and retries a throttled request on another key.
+"""
+import itertools
+import os
+import threading
+import time
+
+from rate_limit import TokenBucket
+
+THROTTLED_STATUSES = (429,)
+# (pay flag, account field) of the parties that can pay for a shipment
+PAYING_FIELDS = (('ShipPay', 'ShipAcct'), ('ConsPay', 'ConsAcct'), ('TPBPay', 'TPBAcct'))
+
+
+class KeyPoolExhausted(Exception):
+    pass
+
+
+class ApiKey:
+    def __init__(self,
+                 key: str,
+                 account: str | None = None,
+                 rate: float | None = None,
+                 burst: float | None = None,
+                 max_in_flight: int | None = None):
+        if not key:
+            raise ValueError('key must not be empty')
+        self.key = key
+        self.account = account
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.cooling_until = 0.0
+
+    @property
+    def label(self) -> str:
+        return self.account or f'...{self.key[-4:]}'
+
+    def available(self, now: float) -> bool:
+        if now < self.cooling_until:
+            return False
+        return self.max_in_flight is None or self.in_flight < self.max_in_flight
+
+    def as_dict(self, now: float) -> dict:
+        return {
+            'account'  : self.account,
+            'key'      : f'...{self.key[-4:]}',
+            'in_flight': self.in_flight,
+            'requests' : self.requests,
+            'throttled': self.throttled,
+            'errors'   : self.errors,
+            'cooling'  : max(0.0, self.cooling_until - now),
+        }
+
+
+class KeyLease:
+    def __init__(self, pool: 'KeyPool', api_key: ApiKey):
+        self.pool = pool
+        self.api_key = api_key
+        self.released = False
+
+    @property
+    def key(self) -> str:
+        return self.api_key.key
+
+    def release(self, status_code: int | None = None, error: bool = False):
+        if not self.released:
+            self.released = True
+            self.pool.release(self.api_key, status_code, error)
+
+
+def paying_account(kind: str, post_body: dict) -> str | None:
+    for pay_field, account_field in PAYING_FIELDS:
+        if post_body.get(pay_field) == 'Y' and post_body.get(account_field):
+            return str(post_body[account_field])
+    return None
+
+
+class KeyPool:
+    def __init__(self,
+                 keys: list[ApiKey],
+                 policy: str = 'least_loaded',
+                 cooldown: float = 30.0,
+                 max_cooldown: float = 600.0,
+                 failures_before_cooldown: int = 5,
+                 router=paying_account):
+        if not keys:
+            raise ValueError('A key pool needs at least one key')
+        if policy not in ('round_robin', 'least_loaded'):
+            raise ValueError("policy must be 'round_robin' or 'least_loaded'")
+        self.keys = list(keys)
+        self.policy = policy
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures_before_cooldown = failures_before_cooldown
+        self.router = router
+        self.accounts = {api_key.account: api_key for api_key in self.keys if api_key.account}
+        self._cycle = itertools.cycle(range(len(self.keys)))
+        self._condition = threading.Condition()
+
+    @classmethod
+    def from_env(cls, variable: str = 'ARCBEST_API_KEYS', **kwargs) -> 'KeyPool':
+        """
+        Keys from a comma separated list of `key` or `account=key` entries, falling back to the
+        single ARCBEST_API_KEY.
+        """
+        entries = [entry.strip() for entry in os.environ.get(variable, '').split(',') if entry.strip()]
+        if not entries and os.environ.get('ARCBEST_API_KEY'):
+            entries = [os.environ['ARCBEST_API_KEY']]
+        keys = []
+        for entry in entries:
+            account, _, key = entry.rpartition('=')
+            keys.append(ApiKey(key, account or None))
+        return cls(keys, **kwargs)
+
+    def _eligible(self, kind: str, post_body: dict, exclude: set) -> tuple[list[ApiKey], bool]:
+        routed = self.accounts.get(self.router(kind, post_body) if self.router is not None else None)
+        keys = [routed] if routed is not None else self.keys
+        return [api_key for api_key in keys if api_key.key not in exclude], routed is not None
+
+    def _pick(self, kind: str, post_body: dict, exclude: set) -> ApiKey | None:
+        now = time.monotonic()
+        eligible, routed = self._eligible(kind, post_body, exclude)
+        candidates = [api_key for api_key in eligible if api_key.available(now)]
+        if self.policy == 'round_robin' and not routed:
+            start = next(self._cycle)
+            candidates.sort(key=lambda api_key: (self.keys.index(api_key) - start) % len(self.keys))
+        else:
+            candidates.sort(key=lambda api_key: api_key.in_flight)
+        for api_key in candidates:
+            if api_key.bucket is None or api_key.bucket.try_acquire():
+                return api_key
+        return None
+
+    def acquire(self, kind: str, post_body: dict, timeout: float | None = None,
+                exclude: set | None = None) -> KeyLease:
+        """
+        Lease a key for one request, waiting up to timeout for one with budget left.
+        """
+        exclude = exclude or set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                api_key = self._pick(kind, post_body, exclude)
+                if api_key is not None:
+                    api_key.in_flight += 1
+                    api_key.requests += 1
+                    return KeyLease(self, api_key)
+                remaining = None if deadline is None else deadline - time.monotonic()
+                eligible, _ = self._eligible(kind, post_body, exclude)
+                if not eligible or remaining is not None and (
+                        remaining <= 0 or min(api_key.cooling_until for api_key in eligible) >= deadline):
+                    raise KeyPoolExhausted(f'No ArcBest API key available for {kind}')
+                # wake up for releases, refilled rate budgets and ending cooldowns
+                self._condition.wait(0.05 if remaining is None else min(0.05, remaining))
+
+    def release(self, api_key: ApiKey, status_code: int | None = None, error: bool = False):
+        with self._condition:
+            api_key.in_flight -= 1
+            if status_code in THROTTLED_STATUSES:
+                api_key.throttled += 1
+                api_key.consecutive_failures += 1
+                self._cool(api_key, api_key.consecutive_failures)
+            elif error or (status_code is not None and status_code >= 500):
+                api_key.errors += 1
+                api_key.consecutive_failures += 1
+                if api_key.consecutive_failures >= self.failures_before_cooldown:
+                    self._cool(api_key, api_key.consecutive_failures - self.failures_before_cooldown + 1)
+            else:
+                api_key.consecutive_failures = 0
+            self._condition.notify_all()
+
+    def has_alternative(self, kind: str, post_body: dict, exclude: set) -> bool:
+        return bool(self._eligible(kind, post_body, exclude)[0])
+
+    def _cool(self, api_key: ApiKey, strikes: int):
+        period = min(self.max_cooldown, self.cooldown * 2 ** (min(strikes, 32) - 1))
+        api_key.cooling_until = time.monotonic() + period
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._condition:
+            return {api_key.label: api_key.as_dict(now) for api_key in self.keys}
+
+
+_key_pool = None
+
+
+def get_key_pool() -> KeyPool | None:
+    return _key_pool
+
+
+def set_key_pool(pool: KeyPool | None) -> None:
+    global _key_pool
+    _key_pool = pool
+
+
+def resolve_api_key(api_key: str | None = None) -> str | None:
+    """
+    The key to put in a request body: the explicit one, None when a pool will choose at send time,
+    otherwise ARCBEST_API_KEY as read now (not at import).
+    """
+    if api_key is not None or _key_pool is not None:
+        return api_key
+    return os.environ.get('ARCBEST_API_KEY')
@@ -0,0 +1,259 @@
+"""
+Load planning for quote and BOL shipments.
+
+Takes the commodity lines of a shipment, stacks each line's handling units up to the trailer height
+(unless the line is marked non-stackable), and floor-loads the stacks onto the trailer footprint with
+a first-fit-decreasing shelf heuristic: rows run across the trailer width and the row depths add up
+to the linear feet used.  From that it derives the cube, linear feet and the accessorial flags the
+quote and BOL models expect.
+
+    plan = plan_load([LoadLine.from_commodity(line) for line in commodity_lines])
+    ShipmentSpecifics(ship_month=..., ship_day=..., ship_year=..., **plan.quote_specifics_kwargs())
+    AdditionalServices(**plan.quote_additional_services_kwargs())
+
+All internal arithmetic is in inches.
+"""
+import math
+
+from shared_enums import UnitsOfMeasurement
+
+INCHES_PER_UNIT = {
+    UnitsOfMeasurement.IN: 1.0,
+    UnitsOfMeasurement.FT: 12.0,
+    UnitsOfMeasurement.M: 39.3701,
+}
+CUBIC_INCHES_PER_CUBIC_FOOT = 1728.0
+
+
+class Trailer:
+    def __init__(self, length: float, width: float, height: float,
+                 unit_of_measurement: UnitsOfMeasurement = UnitsOfMeasurement.IN):
+        scale = INCHES_PER_UNIT[unit_of_measurement]
+        self.length = length * scale
+        self.width = width * scale
+        self.height = height * scale
+
+
+# inside dimensions of a 53' dry van
+TRAILER_53 = Trailer(length=630, width=98, height=108)
+TRAILER_28 = Trailer(length=330, width=98, height=108)
+
+
+class PlanningRules:
+    # Thresholds for the accessorial flags; set them from the applicable ArcBest tariff.
+    def __init__(self,
+                 over_dimension_length: float = 96,
+                 capacity_cubic_feet: float | None = 750,
+                 capacity_linear_feet: float | None = None,
+                 capacity_max_density: float | None = 6):
+        self.over_dimension_length = over_dimension_length
+        self.capacity_cubic_feet = capacity_cubic_feet
+        self.capacity_linear_feet = capacity_linear_feet
+        self.capacity_max_density = capacity_max_density
+
+
+DEFAULT_RULES = PlanningRules()
+
+
+class LoadLine:
+    def __init__(self,
+                 length: float,
+                 width: float,
+                 height: float,
+                 handling_units: int = 1,
+                 weight: float | None = None,
+                 unit_of_measurement: UnitsOfMeasurement = UnitsOfMeasurement.IN,
+                 stackable: bool = True,
+                 line_number: int | None = None):
+        if min(length, width, height) <= 0:
+            raise ValueError('Line dimensions must be greater than 0')
+        if handling_units < 1:
+            raise ValueError('handling_units must be at least 1')
+        scale = INCHES_PER_UNIT[unit_of_measurement]
+        self.length = length * scale
+        self.width = width * scale
+        self.height = height * scale
+        self.handling_units = handling_units
+        self.weight = weight
+        self.stackable = stackable
+        self.line_number = line_number
+
+    @classmethod
+    def from_commodity(cls, commodity,
+                       unit_of_measurement: UnitsOfMeasurement = UnitsOfMeasurement.IN,
+                       stackable: bool = True) -> 'LoadLine':
+        """
+        Build from either bol.commodity.Commodity or quote.quote.Commodity.
+        """
+        if None in (commodity.length, commodity.width, commodity.height):
+            raise ValueError(f'Commodity line {commodity.line_number} needs length, width and height to be planned')
+        handling_units = (getattr(commodity, 'number_of_handling_units', None)
+                          or getattr(commodity, 'unit_number', None)
+                          or 1)
+        weight = getattr(commodity, 'total_weight', None)
+        if weight is None:
+            weight = getattr(commodity, 'weight', None)
+        return cls(length=commodity.length,
+                   width=commodity.width,
+                   height=commodity.height,
+                   handling_units=handling_units,
+                   weight=weight,
+                   unit_of_measurement=unit_of_measurement,
+                   stackable=stackable,
+                   line_number=commodity.line_number)
+
+    @property
+    def cubic_inches(self) -> float:
+        return self.length * self.width * self.height * self.handling_units
+
+
+class _Row:
+    __slots__ = ('depth', 'width_left')
+
+    def __init__(self, depth: float, width_left: float):
+        self.depth = depth
+        self.width_left = width_left
+
+
+class LoadPlan:
+    def __init__(self, cubic_feet: float, linear_feet: float, longest_side: float, overall_width: float,
+                 overall_height: float, weight: float | None, do_not_stack: bool, over_dimension: bool,
+                 capacity_load: bool, fits_trailer: bool, stacks: int):
+        self.cubic_feet = cubic_feet
+        self.linear_feet = linear_feet
+        self.longest_side = longest_side
+        self.overall_width = overall_width
+        self.overall_height = overall_height
+        self.weight = weight
+        self.do_not_stack = do_not_stack
+        self.over_dimension = over_dimension
+        self.capacity_load = capacity_load
+        self.fits_trailer = fits_trailer
+        self.stacks = stacks
+
+    @property
+    def density(self) -> float | None:
+        if self.weight is None or not self.cubic_feet:
+            return None
+        return self.weight / self.cubic_feet
+
+    def quote_specifics_kwargs(self) -> dict:
+        return {
+            'overall_cubic_feet': round(self.cubic_feet, 2),
+            'overall_length'    : math.ceil(self.linear_feet * 12),
+            'overall_width'     : math.ceil(self.overall_width),
+            'overall_height'    : math.ceil(self.overall_height),
+            'measurement_unit'  : UnitsOfMeasurement.IN,
+        }
+
+    def quote_additional_services_kwargs(self) -> dict:
+        return {key: value for key, value in {
+            'do_not_stack'  : True if self.do_not_stack else None,
+            'capacity_load' : True if self.capacity_load else None,
+            'over_dimension': True if self.over_dimension else None,
+            'longest_side'  : math.ceil(self.longest_side) if self.over_dimension else None,
+        }.items() if value is not None}
+
+    def bol_specifics_kwargs(self) -> dict:
+        return {
+            'total_cube'              : round(self.cubic_feet, 2),
+            'cube_unit_of_measurement': UnitsOfMeasurement.FT,
+        }
+
+    def bol_additional_services_kwargs(self) -> dict:
+        return {key: value for key, value in {
+            'capacity_load'    : True if self.capacity_load else None,
+            'over_dimension'   : True if self.over_dimension else None,
+            'longest_dimension': math.ceil(self.longest_side) if self.over_dimension else None,
+        }.items() if value is not None}
+
+
+def _stacks(line: LoadLine, trailer: Trailer) -> tuple[int, float]:
+    tier = max(1, int(trailer.height // line.height)) if line.stackable else 1
+    tier = min(tier, line.handling_units)
+    return math.ceil(line.handling_units / tier), tier * line.height
+
+
+def _footprint(line: LoadLine, trailer: Trailer, stacks: int) -> tuple[float, float]:
+    """
+    (depth along the trailer, width across it) for the orientation that uses the fewest linear inches.
+    """
+    best = None
+    for depth, across in ((line.length, line.width), (line.width, line.length)):
+        per_row = int(trailer.width // across)
+        if per_row == 0:
+            continue
+        linear = math.ceil(stacks / per_row) * depth
+        if best is None or linear < best[0]:
+            best = (linear, depth, across)
+    if best is None:
+        # wider than the trailer either way: load lengthwise, one per row
+        return max(line.length, line.width), min(line.length, line.width)
+    return best[1], best[2]
+
+
+def plan_load(lines: list[LoadLine],
+              trailer: Trailer = TRAILER_53,
+              rules: PlanningRules = DEFAULT_RULES) -> LoadPlan:
+    if not lines:
+        raise ValueError('A load plan needs at least one line')
+
+    pieces = []
+    overall_height = 0.0
+    stack_count = 0
+    for line in lines:
+        stacks, stack_height = _stacks(line, trailer)
+        depth, across = _footprint(line, trailer, stacks)
+        pieces.append((depth, across, stacks))
+        overall_height = max(overall_height, stack_height)
+        stack_count += stacks
+
+    # first-fit decreasing shelf packing: deepest stacks open rows, shallower ones fill the gaps
+    rows: list[_Row] = []
+    overall_width = 0.0
+    for depth, across, stacks in sorted(pieces, key=lambda piece: (piece[0], piece[1]), reverse=True):
+        for _ in range(stacks):
+            for row in rows:
+                if row.depth >= depth and row.width_left >= across:
+                    row.width_left -= across
+                    break
+            else:
+                rows.append(_Row(depth, max(trailer.width - across, 0.0)))
+        overall_width = max(overall_width, min(across, trailer.width))
+    if rows:
+        overall_width = max(overall_width, max(trailer.width - row.width_left for row in rows))
+
+    linear_inches = sum(row.depth for row in rows)
+    cubic_feet = sum(line.cubic_inches for line in lines) / CUBIC_INCHES_PER_CUBIC_FOOT
+    weights = [line.weight for line in lines]
+    weight = None if None in weights else float(sum(weights))
+    longest_side = max(max(line.length, line.width, line.height) for line in lines)
+    linear_feet = linear_inches / 12
+
+    capacity_load = False
+    if rules.capacity_cubic_feet is not None and cubic_feet >= rules.capacity_cubic_feet:
+        density = weight / cubic_feet if weight is not None and cubic_feet else None
+        capacity_load = (rules.capacity_max_density is None or density is None
+                         or density < rules.capacity_max_density)
+    if rules.capacity_linear_feet is not None and linear_feet >= rules.capacity_linear_feet:
+        capacity_load = True
+
+    return LoadPlan(cubic_feet=cubic_feet,
+                    linear_feet=linear_feet,
+                    longest_side=longest_side,
+                    overall_width=overall_width,
+                    overall_height=overall_height,
+                    weight=weight,
+                    do_not_stack=any(not line.stackable for line in lines),
+                    over_dimension=longest_side >= rules.over_dimension_length,
+                    capacity_load=capacity_load,
+                    fits_trailer=linear_inches <= trailer.length and overall_height <= trailer.height,
+                    stacks=stack_count)
+
+
+def plan_loads(shipments, trailer: Trailer = TRAILER_53, rules: PlanningRules = DEFAULT_RULES):
+    """
+    Plan a batch lazily; yields one LoadPlan per shipment (a list of LoadLine).
+    """
+    for lines in shipments:
+        yield plan_load(lines, trailer, rules)
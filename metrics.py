@@ -0,0 +1,70 @@
+"""
+Latency and throughput statistics kept in memory by the SDK helpers.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+
+class LatencyStats:
+    def __init__(self, window: int = 1024):
+        self._samples = deque(maxlen=window)
+        self._sorted = None
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.count = 0
+        self.errors = 0
+        self.timed = 0
+        self.total_seconds = 0.0
+
+    def record(self, seconds: float, error: bool = False):
+        with self._lock:
+            self._samples.append(seconds)
+            self._sorted = None
+            self.count += 1
+            self.timed += 1
+            self.total_seconds += seconds
+            if error:
+                self.errors += 1
+
+    def record_error(self):
+        with self._lock:
+            self.count += 1
+            self.errors += 1
+
+    def export_samples(self) -> list[float]:
+        with self._lock:
+            return list(self._samples)
+
+    def import_samples(self, samples):
+        """
+        Seed the percentile window with samples from an earlier process; the counters are not
+        touched, so rates and means only cover this process.
+        """
+        with self._lock:
+            self._samples.extend(samples)
+            self._sorted = None
+
+    def percentile(self, percent: float) -> float | None:
+        with self._lock:
+            if not self._samples:
+                return None
+            if self._sorted is None:
+                self._sorted = sorted(self._samples)
+            ordered = self._sorted
+        rank = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+        return ordered[min(rank, len(ordered) - 1)]
+
+    def snapshot(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            'count'     : self.count,
+            'errors'    : self.errors,
+            'per_second': self.count / elapsed if elapsed > 0 else 0.0,
+            'mean'      : self.total_seconds / self.timed if self.timed else None,
+            'p50'       : self.percentile(50),
+            'p95'       : self.percentile(95),
+            'p99'       : self.percentile(99),
+            'max'       : self.percentile(100),
+        }
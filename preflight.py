@@ -0,0 +1,317 @@
+"""
+Offline pre-flight validation of assembled quote and BOL requests.
+
+The rules run against the post body that would be sent to ArcBest (the output of
+build_quote_post_body / build_bol_post_body), so they catch the same field dependencies the
+server rejects, without a round trip.  Every violation is reported, not just the first one.
+
+Rules are declared in the RULES table and compiled once per process into per-kind rule lists;
+per-line rules use {n} in their field names and run once for every commodity line in the body.
+"""
+import re
+from datetime import date, datetime
+from functools import cache
+
+from bol.hazmat import Segregation, find_conflicts, profile_post_body_line
+from key_pool import get_key_pool
+from utils import is_valid_time
+from zip_index import get_zip_index
+
+QUOTE = 'quote'
+BOL = 'bol'
+
+REFERENCE_KEY_PATTERN = re.compile(r'^(?:PO|POPiece|POWeight|PODept|CRN)(None|\d+)$')
+LINE_KEY_PATTERN = re.compile(r'^(?:Wgt|Class|UnitNo|UnitType|HN|HT|WT|CL|HZ|Desc|FrtLng|FrtWdth|FrtHght)(\d+)$')
+
+
+class Violation:
+    def __init__(self, rule_id: str, message: str, fields: tuple = (), line: int | None = None):
+        self.rule_id = rule_id
+        self.message = message
+        self.fields = fields
+        self.line = line
+
+    def __str__(self):
+        prefix = f'line {self.line}: ' if self.line is not None else ''
+        return f'{prefix}{self.message} [{self.rule_id}]'
+
+    def __repr__(self):
+        return f'Violation({self.rule_id!r}, {str(self)!r})'
+
+
+class PreflightError(ValueError):
+    def __init__(self, kind: str, violations: list[Violation]):
+        self.kind = kind
+        self.violations = violations
+        super().__init__(f'{len(violations)} pre-flight violation(s) in {kind} request: '
+                         + '; '.join(str(v) for v in violations))
+
+
+def is_set(value) -> bool:
+    # the quote models send 'Y'/'N', some BOL models send raw booleans
+    return value is True or (isinstance(value, str) and value.upper() == 'Y')
+
+
+def is_present(value) -> bool:
+    return value is not None and value != '' and value != []
+
+
+def positive(value) -> bool:
+    try:
+        return float(value) > 0
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_wire_date(value) -> date | None:
+    try:
+        return datetime.strptime(value, '%m/%d/%y').date()
+    except (TypeError, ValueError):
+        return None
+
+
+# -- rule checks: each takes (body, fields) and returns a message or None --
+
+def requires(trigger: str, *required: str, check=is_present):
+    def rule(body: dict, fields: dict):
+        if is_set(body.get(fields[trigger])):
+            missing = [fields[name] for name in required if not check(body.get(fields[name]))]
+            if missing:
+                return f'{fields[trigger]} is set but {", ".join(missing)} is missing or invalid'
+        return None
+    rule.fields = (trigger, *required)
+    return rule
+
+
+def present_requires(field: str, *required: str):
+    def rule(body: dict, fields: dict):
+        if is_present(body.get(fields[field])):
+            missing = [fields[name] for name in required if not is_present(body.get(fields[name]))]
+            if missing:
+                return f'{fields[field]} is provided but {", ".join(missing)} is missing'
+        return None
+    rule.fields = (field, *required)
+    return rule
+
+
+def forbidden_unless(trigger: str, *dependent: str):
+    def rule(body: dict, fields: dict):
+        if not is_set(body.get(fields[trigger])):
+            stray = [fields[name] for name in dependent if is_present(body.get(fields[name]))]
+            if stray:
+                return f'{", ".join(stray)} provided but {fields[trigger]} is not set'
+        return None
+    rule.fields = (trigger, *dependent)
+    return rule
+
+
+def positive_field(field: str):
+    def rule(body: dict, fields: dict):
+        if not positive(body.get(fields[field])):
+            return f'{fields[field]} must be greater than 0'
+        return None
+    rule.fields = (field,)
+    return rule
+
+
+def class_requires(class_field: str, prefix: str, required: str):
+    def rule(body: dict, fields: dict):
+        hazmat_class = body.get(fields[class_field])
+        if hazmat_class is not None and str(hazmat_class).startswith(prefix) \
+                and not is_present(body.get(fields[required])):
+            return f'hazmat class {hazmat_class} requires {fields[required]}'
+        return None
+    rule.fields = (class_field, required)
+    return rule
+
+
+def api_key(body: dict, fields: dict):
+    # with a key pool installed the transport fills in the key when the request is sent
+    if is_present(body.get('ID')) or get_key_pool() is not None:
+        return None
+    return 'ID (the ArcBest API key) is missing'
+
+
+def has_commodity_lines(body: dict, fields: dict):
+    return None if line_numbers(body) else 'the request has no commodity lines'
+
+
+def quote_ship_date(body: dict, fields: dict):
+    try:
+        date(int(body['ShipYear']), int(body['ShipMonth']), int(body['ShipDay']))
+    except (KeyError, TypeError, ValueError):
+        return 'ShipYear/ShipMonth/ShipDay do not form a valid date'
+    return None
+
+
+def bol_ship_date(body: dict, fields: dict):
+    if parse_wire_date(body.get('ShipDate')) is None:
+        return 'ShipDate is missing or not in MM/DD/YY format'
+    return None
+
+
+def reference_index(body: dict, fields: dict):
+    bad = []
+    for key in body:
+        match = REFERENCE_KEY_PATTERN.match(key)
+        if match and not (match.group(1).isdigit() and 1 <= int(match.group(1)) <= 10):
+            bad.append(key)
+    if bad:
+        return f'reference number fields {", ".join(bad)} need a po_index between 1 and 10'
+    return None
+
+
+def time_window(body: dict, fields: dict):
+    if not is_set(body.get('TimeKeeper')):
+        return None
+    problems = []
+    for name in ('DeliveryTimeMin', 'DeliveryTimeMax', 'DeliveryTime'):
+        value = body.get(name)
+        if value is not None and not is_valid_time(value):
+            problems.append(f'{name} {value!r} is not HH:MM (24-hour, 15-minute steps, 09:00-17:45)')
+    time_min, time_max = body.get('DeliveryTimeMin'), body.get('DeliveryTimeMax')
+    if time_min and time_max and is_valid_time(time_min) and is_valid_time(time_max) and time_min >= time_max:
+        problems.append('DeliveryTimeMin must be earlier than DeliveryTimeMax')
+    if body.get('DeliveryTimeType') == 'by' and body.get('DeliveryTime') is None:
+        problems.append("DeliveryTimeType 'by' requires DeliveryTime")
+
+    date_min, date_max = parse_wire_date(body.get('DeliveryDateMin')), parse_wire_date(body.get('DeliveryDateMax'))
+    if body.get('DeliveryDateType') == 'between':
+        if date_min is None or date_max is None:
+            problems.append("DeliveryDateType 'between' requires DeliveryDateMin and DeliveryDateMax")
+        elif date_min > date_max:
+            problems.append('DeliveryDateMin is after DeliveryDateMax')
+    ship_date = parse_wire_date(body.get('ShipDate'))
+    if ship_date is not None and date_min is not None and date_min < ship_date:
+        problems.append('DeliveryDateMin is before ShipDate')
+    return '; '.join(problems) or None
+
+
+def hazmat_segregation(body: dict, fields: dict):
+    profiles = [profile_post_body_line(body, n) for n in line_numbers(body)]
+    conflicts = find_conflicts(profiles, include_separation=False)
+    forbidden = [str(conflict) for conflict in conflicts if conflict.segregation is Segregation.FORBIDDEN]
+    for conflict in conflicts:
+        if conflict.segregation is Segregation.POSSIBLY_FORBIDDEN:
+            # the lines do not give their exact class, zone or compatibility group; not blocking
+            print(f'Hazmat segregation warning: {conflict}')
+    return '; '.join(forbidden) or None
+
+
+def addresses(body: dict, fields: dict):
+    # only with an offline ZIP index installed; ZIPs missing from the index are not flagged
+    index = get_zip_index()
+    if index is None:
+        return None
+    problems = []
+    for party, prefix in (('shipper', 'Ship'), ('consignee', 'Cons')):
+        result = index.check(body.get(f'{prefix}City'), body.get(f'{prefix}State'), body.get(f'{prefix}Zip'),
+                             body.get(f'{prefix}Country'))
+        if result.known:
+            problems.extend(f'{party} {problem}' for problem in result.problems)
+    return '; '.join(problems) or None
+
+
+class Rule:
+    def __init__(self, rule_id: str, kinds: tuple, check, per_line: bool = False):
+        self.rule_id = rule_id
+        self.kinds = kinds
+        self.check = check
+        self.per_line = per_line
+        self.fields = getattr(check, 'fields', ())
+
+
+RULES = (
+    Rule('api-key', (QUOTE, BOL), api_key),
+    Rule('commodity-lines', (QUOTE, BOL), has_commodity_lines),
+    Rule('limited-access-pickup', (QUOTE, BOL), requires('Acc_LAP', 'LAPType')),
+    Rule('limited-access-delivery', (QUOTE,), requires('ACC_LAD', 'LADType')),
+    Rule('limited-access-delivery', (BOL,), requires('Acc_LAD', 'LADType')),
+    Rule('trade-show-delivery', (QUOTE,), requires('Acc_TRDSHWD', 'TRDSHWDType')),
+    Rule('excess-liability', (QUOTE,), requires('Acc_ELC', 'DeclaredValue', 'DeclaredType')),
+    Rule('excess-liability', (BOL,), requires('Acc_ELC', 'DeclaredValue', check=positive)),
+    Rule('declared-value-type', (QUOTE,), present_requires('DeclaredValue', 'DeclaredType')),
+    Rule('over-dimension', (QUOTE, BOL), requires('Acc_OD', 'ODLongestSide', check=positive)),
+    Rule('sort-and-segregate', (QUOTE, BOL), requires('Acc_SEG', 'SegPieces', check=positive)),
+    Rule('truck-pack', (QUOTE, BOL), requires('Acc_TRPACK', 'TPBoxes', check=positive)),
+    Rule('ship-date', (QUOTE,), quote_ship_date),
+    Rule('ship-date', (BOL,), bol_ship_date),
+    Rule('reference-index', (BOL,), reference_index),
+    Rule('address', (QUOTE, BOL), addresses),
+    Rule('time-window', (BOL,), time_window),
+    Rule('hazmat-segregation', (BOL,), hazmat_segregation),
+    Rule('line-weight', (QUOTE,), positive_field('Wgt{n}'), per_line=True),
+    Rule('line-weight', (BOL,), positive_field('WT{n}'), per_line=True),
+    Rule('hazmat-details', (BOL,), requires('HZ{n}', 'HZCL{n}', 'HZUN{n}', 'HZPropName{n}',
+                                            'HZContact{n}', 'HZPH{n}'), per_line=True),
+    Rule('hazmat-flag', (BOL,), forbidden_unless('HZ{n}', 'HZCL{n}', 'HZUN{n}', 'HZPropName{n}'), per_line=True),
+    Rule('hazmat-zone', (BOL,), requires('HZPIH{n}', 'HZZone{n}'), per_line=True),
+    Rule('hazmat-compatibility', (BOL,), class_requires('HZCL{n}', '1', 'Compat{n}'), per_line=True),
+)
+
+
+class CompiledRules:
+    def __init__(self, kind: str):
+        rules = [rule for rule in RULES if kind in rule.kinds]
+        self.kind = kind
+        self.body_rules = [(rule, {name: name for name in rule.fields}) for rule in rules if not rule.per_line]
+        self.line_rules = [rule for rule in rules if rule.per_line]
+        self._line_fields = {}
+
+    def line_fields(self, rule: Rule, n: int) -> dict:
+        fields = self._line_fields.get((rule.rule_id, rule.fields, n))
+        if fields is None:
+            fields = {name: name.format(n=n) for name in rule.fields}
+            self._line_fields[(rule.rule_id, rule.fields, n)] = fields
+        return fields
+
+
+@cache
+def compiled_rules(kind: str) -> CompiledRules:
+    if kind not in (QUOTE, BOL):
+        raise ValueError(f"Unknown request kind {kind!r}, expected '{QUOTE}' or '{BOL}'")
+    return CompiledRules(kind)
+
+
+def line_numbers(body: dict) -> list[int]:
+    numbers = set()
+    for key in body:
+        match = LINE_KEY_PATTERN.match(key)
+        if match:
+            numbers.add(int(match.group(1)))
+    return sorted(numbers)
+
+
+def validate(kind: str, post_body: dict) -> list[Violation]:
+    compiled = compiled_rules(kind)
+    violations = []
+    for rule, fields in compiled.body_rules:
+        message = rule.check(post_body, fields)
+        if message:
+            violations.append(Violation(rule.rule_id, message, tuple(fields.values())))
+    if compiled.line_rules:
+        for n in line_numbers(post_body):
+            for rule in compiled.line_rules:
+                fields = compiled.line_fields(rule, n)
+                message = rule.check(post_body, fields)
+                if message:
+                    violations.append(Violation(rule.rule_id, message, tuple(fields.values()), line=n))
+    return violations
+
+
+def validate_batch(kind: str, post_bodies) -> dict[int, list[Violation]]:
+    """
+    Validate many request bodies; returns {position: violations} for the bodies that failed.
+    """
+    failures = {}
+    for position, post_body in enumerate(post_bodies):
+        violations = validate(kind, post_body)
+        if violations:
+            failures[position] = violations
+    return failures
+
+
+def check(kind: str, post_body: dict) -> None:
+    violations = validate(kind, post_body)
+    if violations:
+        raise PreflightError(kind, violations)
@@ -0,0 +1,218 @@
+"""
+Per-call phase timing for the ArcBest endpoints.
+
+Every call to get_quote, get_bol and get_tracking_data is split into three phases:
+    build   - assembling the post body from the as_dict() blocks
+    network - the round trip to ArcBest
+    parse   - turning the XML response into a dict
+
+Profiling is off until a sink is configured, either in code with configure_profiling() or through
+the environment, so it can be switched on for production traffic without code changes:
+
+    ARCBEST_PROFILE_JSONL=/tmp/arcbest_profile.jsonl   write one JSON record per sampled call
+    ARCBEST_PROFILE_SAMPLE_RATE=0.1                    fraction of calls that get phase timings
+    ARCBEST_PROFILE_DEEP_RATE=0.01                     fraction of calls that also get cProfile/tracemalloc
+    ARCBEST_PROFILE_CPROFILE=Y
+    ARCBEST_PROFILE_TRACEMALLOC=Y
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Callable
+
+from utils import logger
+
+PHASES = ('build', 'network', 'parse')
+
+
+class JsonlFileSink:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, record: dict):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+
+class ProfilingConfig:
+    def __init__(self,
+                 sink: Callable[[dict], None],
+                 sample_rate: float = 1.0,
+                 deep_sample_rate: float = 0.0,
+                 cprofile: bool = False,
+                 tracemalloc: bool = False,
+                 top_n: int = 15):
+        if not 0.0 <= sample_rate <= 1.0 or not 0.0 <= deep_sample_rate <= 1.0:
+            raise ValueError('Sample rates must be between 0 and 1')
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.deep_sample_rate = deep_sample_rate
+        self.cprofile = cprofile
+        self.tracemalloc = tracemalloc
+        self.top_n = top_n
+
+
+_UNSET = object()
+_config: ProfilingConfig | None | object = _UNSET
+
+# cProfile and tracemalloc are process wide, so only one call at a time gets a deep capture
+_deep_capture_lock = threading.Lock()
+
+
+def configure_profiling(sink: Callable[[dict], None] | str,
+                        sample_rate: float = 1.0,
+                        deep_sample_rate: float = 0.0,
+                        cprofile: bool = False,
+                        tracemalloc: bool = False,
+                        top_n: int = 15) -> ProfilingConfig:
+    """
+    Turn on profiling.  The sink is any callable taking the record dict, or a path to a JSONL file.
+    """
+    global _config
+    if isinstance(sink, str):
+        sink = JsonlFileSink(sink)
+    _config = ProfilingConfig(sink=sink,
+                              sample_rate=sample_rate,
+                              deep_sample_rate=deep_sample_rate,
+                              cprofile=cprofile,
+                              tracemalloc=tracemalloc,
+                              top_n=top_n)
+    return _config
+
+
+def disable_profiling():
+    global _config
+    _config = None
+
+
+def _config_from_env() -> ProfilingConfig | None:
+    path = os.environ.get('ARCBEST_PROFILE_JSONL')
+    if not path:
+        return None
+    return ProfilingConfig(sink=JsonlFileSink(path),
+                           sample_rate=float(os.environ.get('ARCBEST_PROFILE_SAMPLE_RATE', '1.0')),
+                           deep_sample_rate=float(os.environ.get('ARCBEST_PROFILE_DEEP_RATE', '0.0')),
+                           cprofile=os.environ.get('ARCBEST_PROFILE_CPROFILE', 'N').upper() == 'Y',
+                           tracemalloc=os.environ.get('ARCBEST_PROFILE_TRACEMALLOC', 'N').upper() == 'Y')
+
+
+def get_profiling_config() -> ProfilingConfig | None:
+    global _config
+    if _config is _UNSET:
+        _config = _config_from_env()
+    return _config
+
+
+class CallProfile:
+    def __init__(self, endpoint: str, config: ProfilingConfig):
+        self.endpoint = endpoint
+        self.config = config
+        self.started_at = time.time()
+        self.phases = {}
+        self.extra = {}
+        self.error = None
+        self.deep = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def annotate(self, **kwargs):
+        self.extra.update(kwargs)
+
+    def as_dict(self) -> dict:
+        record = {
+            'endpoint'  : self.endpoint,
+            'started_at': self.started_at,
+            'phases'    : {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            'total'     : round(sum(self.phases.values()), 6),
+            **self.extra,
+        }
+        if self.error is not None:
+            record['error'] = self.error
+        if self.deep:
+            record.update(self.deep)
+        return record
+
+
+class _NullProfile:
+    def phase(self, name: str):
+        return nullcontext()
+
+    def annotate(self, **kwargs):
+        pass
+
+
+_NULL_PROFILE = _NullProfile()
+
+
+@contextmanager
+def profile_call(endpoint: str):
+    """
+    Wrap one SDK call.  Yields an object with phase(name) and annotate(**kwargs); when profiling is off,
+    or the call was not sampled, both are no-ops.
+    """
+    config = get_profiling_config()
+    if config is None or random.random() >= config.sample_rate:
+        yield _NULL_PROFILE
+        return
+
+    profile = CallProfile(endpoint, config)
+    deep = ((config.cprofile or config.tracemalloc)
+            and random.random() < config.deep_sample_rate
+            and _deep_capture_lock.acquire(blocking=False))
+    profiler = None
+    started_tracemalloc = False
+    try:
+        if deep:
+            if config.tracemalloc:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    started_tracemalloc = True
+                tracemalloc.reset_peak()
+            if config.cprofile:
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # another profiler is already active in this process
+                    profiler = None
+        yield profile
+    except BaseException as e:
+        profile.error = type(e).__name__
+        raise
+    finally:
+        if deep:
+            try:
+                if profiler is not None:
+                    profiler.disable()
+                    out = io.StringIO()
+                    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(config.top_n)
+                    profile.deep['cprofile'] = out.getvalue()
+                if config.tracemalloc:
+                    current, peak = tracemalloc.get_traced_memory()
+                    profile.deep['tracemalloc_peak_bytes'] = peak
+                    top = tracemalloc.take_snapshot().statistics('lineno')[:config.top_n]
+                    profile.deep['tracemalloc_top'] = [str(stat) for stat in top]
+                    if started_tracemalloc:
+                        tracemalloc.stop()
+            finally:
+                _deep_capture_lock.release()
+        try:
+            config.sink(profile.as_dict())
+        except Exception as e:
+            logger.warning(f'Profiling sink failed: {e}')
@@ -0,0 +1,334 @@
+"""
+Offline rate estimates learned from historical quote requests and responses.
+
+The model is a table of rate-per-hundredweight statistics keyed by lane, freight class and weight
+break, plus a flat dollar delta per accessorial.  Each estimate reports a confidence in [0, 1]
+built from how many quotes back the cell and how consistent they were; lookups fall back from a
+3-digit-zip lane to a state lane to a state lane across all classes, losing confidence at each step.
+
+    estimator = RateEstimator()
+    estimator.fit(pairs_from_cassette('quotes.jsonl'))
+    estimator.save('rates.json')
+
+    estimate = quote_or_estimate(estimator, shipper, consignee, commodity, shipment_specifics)
+    estimate.charge, estimate.confidence, estimate.source    # source is 'estimate' or 'quote'
+
+Training pairs are (quote post body, response) where the response is the parsed response dict
+or the total charge itself; build_quote_post_body gives the post body for model objects.
+"""
+import json
+import math
+import re
+from bisect import bisect_right
+from typing import Callable, Iterable
+
+import xmltodict
+
+from quote.quote import build_quote_post_body, commodity_lines, get_quote
+
+WEIGHT_BREAKS = (0, 500, 1000, 2000, 5000, 10000, 20000)
+# the element of the aquotexml response holding the shipment's total charge, from the root down
+CHARGE_PATH = ('ABF', 'CHARGE')
+ACCESSORIAL_PREFIX = 'Acc_'
+LINE_FIELD = re.compile(r'^(Wgt|Class)(\d+)$')
+# confidence multiplier for each fallback level
+LEVEL_CONFIDENCE = {'zip3': 1.0, 'state': 0.8, 'state_any_class': 0.5}
+# quotes needed before a cell counts for half of its possible confidence
+HALF_CONFIDENCE_SAMPLES = 5
+
+
+class RateEstimate:
+    def __init__(self, charge: float | None, confidence: float, basis: str | None = None,
+                 samples: int = 0, source: str = 'estimate'):
+        self.charge = charge
+        self.confidence = confidence
+        self.basis = basis
+        self.samples = samples
+        self.source = source
+
+    def as_dict(self):
+        return {
+            'charge'    : self.charge,
+            'confidence': self.confidence,
+            'basis'     : self.basis,
+            'samples'   : self.samples,
+            'source'    : self.source,
+        }
+
+    def __repr__(self):
+        return f'RateEstimate(charge={self.charge}, confidence={self.confidence:.2f}, source={self.source!r})'
+
+
+class _Cell:
+    # Welford running mean/variance of the rate per hundredweight
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def cv(self) -> float:
+        if self.count < 2 or self.mean <= 0:
+            return 1.0
+        return math.sqrt(self.m2 / (self.count - 1)) / self.mean
+
+    def confidence(self) -> float:
+        return self.count / (self.count + HALF_CONFIDENCE_SAMPLES) / (1 + self.cv)
+
+
+def weight_break(weight: float) -> int:
+    return WEIGHT_BREAKS[bisect_right(WEIGHT_BREAKS, weight) - 1]
+
+
+def find_charge(response) -> float | None:
+    """
+    The total charge of a parsed quote response (or a charge passed as a number); None when the
+    response has no CHARGE_PATH element.  Nothing else is searched, so an itemized or accessorial
+    charge is never mistaken for the total.
+    """
+    if isinstance(response, (int, float)):
+        return float(response)
+    value = response
+    for key in CHARGE_PATH:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    if not isinstance(value, (str, int, float)):
+        return None
+    try:
+        return float(str(value).replace(',', '').replace('$', ''))
+    except ValueError:
+        return None
+
+
+def shipment_features(post_body: dict) -> tuple | None:
+    """
+    (origin zip3, destination zip3, origin state, destination state, class, total weight,
+    accessorials) for a quote post body, or None if it lacks a lane or weight.
+    """
+    weights, classes = {}, {}
+    for key, value in post_body.items():
+        match = LINE_FIELD.match(key)
+        if match and value not in (None, ''):
+            (weights if match.group(1) == 'Wgt' else classes)[match.group(2)] = value
+    try:
+        line_weights = {line: float(weight) for line, weight in weights.items()}
+    except ValueError:
+        return None
+    total_weight = sum(line_weights.values())
+    origin, destination = str(post_body.get('ShipZip') or ''), str(post_body.get('ConsZip') or '')
+    if total_weight <= 0 or not origin or not destination:
+        return None
+    # the class carrying the most weight drives the rate
+    heaviest = max(line_weights, key=line_weights.get)
+    freight_class = str(classes.get(heaviest, ''))
+    accessorials = frozenset(key for key, value in post_body.items()
+                             if key.startswith(ACCESSORIAL_PREFIX) and value == 'Y')
+    return (origin[:3], destination[:3], post_body.get('ShipState'), post_body.get('ConsState'),
+            freight_class, total_weight, accessorials)
+
+
+def _cell_keys(features: tuple) -> list[tuple[str, tuple]]:
+    origin_zip, destination_zip, origin_state, destination_state, freight_class, weight, _ = features
+    band = weight_break(weight)
+    return [('zip3', (origin_zip, destination_zip, freight_class, band)),
+            ('state', (origin_state, destination_state, freight_class, band)),
+            ('state_any_class', (origin_state, destination_state, '*', band))]
+
+
+class RateEstimator:
+    def __init__(self):
+        self.cells = {level: {} for level in LEVEL_CONFIDENCE}
+        self.accessorial_deltas = {}
+        # (cell key, accessorial set) -> [quotes, hundredweight sum, charge sum], folded into the
+        # deltas by finish()
+        self._accessorial_groups = {}
+        self._deltas_stale = False
+        self.samples = 0
+
+    def observe(self, post_body: dict, response) -> bool:
+        features = shipment_features(post_body)
+        charge = find_charge(response)
+        if features is None or charge is None or charge <= 0:
+            return False
+        weight, accessorials = features[5], features[6]
+        cwt = weight / 100
+        keys = _cell_keys(features)
+        base_charge = charge
+        if accessorials:
+            group = self._accessorial_groups.setdefault((keys[0][1], accessorials), [0, 0.0, 0.0])
+            group[0] += 1
+            group[1] += cwt
+            group[2] += charge
+            # with every accessorial's delta known, the rest of the charge is a base rate sample too
+            self._refresh_deltas()
+            if all(accessorial in self.accessorial_deltas for accessorial in accessorials):
+                base_charge = charge - sum(self.accessorial_deltas[accessorial] for accessorial in accessorials)
+            else:
+                base_charge = None
+        if base_charge is not None and base_charge > 0:
+            for level, key in keys:
+                self.cells[level].setdefault(key, _Cell()).add(base_charge / cwt)
+        self.samples += 1
+        # the deltas are measured against the base cells, so any new sample can move them
+        self._deltas_stale = True
+        return True
+
+    def _refresh_deltas(self):
+        if self._deltas_stale:
+            self.finish()
+
+    def finish(self):
+        """
+        Turn the quotes that carried accessorials into per-accessorial deltas: whatever a group
+        paid above its base cell is split evenly across its accessorials.  Runs on its own before an
+        estimate when quotes were observed since the last time.
+        """
+        totals = {}
+        for (key, accessorials), (count, cwt, charge) in self._accessorial_groups.items():
+            cell = self.cells['zip3'].get(key)
+            if cell is None:
+                continue
+            per_accessorial = (charge - cell.mean * cwt) / count / len(accessorials)
+            for accessorial in accessorials:
+                total = totals.setdefault(accessorial, [0, 0.0])
+                total[0] += count
+                total[1] += per_accessorial * count
+        for accessorial, (count, delta_sum) in totals.items():
+            self.accessorial_deltas[accessorial] = delta_sum / count
+        self._deltas_stale = False
+
+    def fit(self, pairs: Iterable[tuple[dict, object]]) -> 'RateEstimator':
+        for post_body, response in pairs:
+            self.observe(post_body, response)
+        self.finish()
+        return self
+
+    def estimate_body(self, post_body: dict) -> RateEstimate:
+        self._refresh_deltas()
+        features = shipment_features(post_body)
+        if features is None:
+            return RateEstimate(None, 0.0)
+        weight, accessorials = features[5], features[6]
+        for level, key in _cell_keys(features):
+            cell = self.cells[level].get(key)
+            if cell is None:
+                continue
+            charge = cell.mean * weight / 100
+            confidence = cell.confidence() * LEVEL_CONFIDENCE[level]
+            for accessorial in accessorials:
+                if accessorial in self.accessorial_deltas:
+                    charge += self.accessorial_deltas[accessorial]
+                else:
+                    # an accessorial never seen in training makes the estimate a guess
+                    confidence *= 0.5
+            return RateEstimate(round(charge, 2), round(confidence, 3), level, cell.count)
+        return RateEstimate(None, 0.0)
+
+    def estimate(self, shipper, consignee, commodity, shipment_specifics,
+                 pickup_services=None, delivery_services=None, additional_services=None) -> RateEstimate:
+        return self.estimate_body(build_quote_post_body(shipper, consignee, commodity, shipment_specifics,
+                                                        pickup_services, delivery_services, additional_services))
+
+    def group_estimator(self, shipper, consignee, shipment_specifics, pickup_services=None,
+                        delivery_services=None, additional_services=None,
+                        min_confidence: float = 0.0) -> Callable[[list], float | None]:
+        """
+        An estimate_group callable for optimize_consolidation on one lane.
+        """
+        base = {**shipper.as_shipper_dict(), **consignee.as_consignee_dict(), **shipment_specifics.as_dict()}
+        for services in (pickup_services, delivery_services, additional_services):
+            if services is not None:
+                base.update(services.as_dict())
+
+        def estimate_group(lines: list) -> float | None:
+            body = dict(base)
+            for line in commodity_lines(lines):
+                body.update(line.as_dict())
+            estimate = self.estimate_body(body)
+            return estimate.charge if estimate.confidence >= min_confidence else None
+
+        return estimate_group
+
+    def as_dict(self) -> dict:
+        return {
+            'version'    : 1,
+            'samples'    : self.samples,
+            'cells'      : {level: [[list(key), cell.count, cell.mean, cell.m2] for key, cell in cells.items()]
+                            for level, cells in self.cells.items()},
+            'accessorials': self.accessorial_deltas,
+        }
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.as_dict(), f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path: str) -> 'RateEstimator':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != 1:
+            raise ValueError(f'Unsupported rate model version {data.get("version")!r}')
+        estimator = cls()
+        estimator.samples = data['samples']
+        for level, cells in data['cells'].items():
+            estimator.cells[level] = {tuple(key): _Cell(count, mean, m2) for key, count, mean, m2 in cells}
+        estimator.accessorial_deltas = data['accessorials']
+        return estimator
+
+
+def pairs_from_cassette(path: str):
+    """
+    Training pairs from the 200 responses to quote calls recorded in a cassette.
+    """
+    from cassette import Cassette, entry_body
+    for entry in Cassette(path).entries():
+        if entry['kind'] == 'quote' and entry['status'] == 200:
+            try:
+                response = xmltodict.parse(entry_body(entry))
+            except Exception:
+                continue
+            yield entry['request'], response
+
+
+def quote_or_estimate(estimator: RateEstimator, shipper, consignee, commodity, shipment_specifics,
+                      pickup_services=None, delivery_services=None, additional_services=None,
+                      min_confidence: float = 0.7, learn: bool = True, **quote_kwargs) -> RateEstimate:
+    """
+    The offline estimate when it is at least min_confidence, otherwise a live quote (which the
+    estimator also learns from, unless learn is False).
+    """
+    post_body = build_quote_post_body(shipper, consignee, commodity, shipment_specifics,
+                                      pickup_services, delivery_services, additional_services)
+    estimate = estimator.estimate_body(post_body)
+    if estimate.charge is not None and estimate.confidence >= min_confidence:
+        return estimate
+    response = get_quote(shipper, consignee, commodity, shipment_specifics, pickup_services,
+                         delivery_services, additional_services, **quote_kwargs)
+    charge = find_charge(response)
+    if charge is None:
+        return estimate
+    if learn:
+        estimator.observe(post_body, charge)
+    return RateEstimate(charge, 1.0, 'quote', source='quote')
+
+
+def group_quoter(shipper, consignee, shipment_specifics, pickup_services=None, delivery_services=None,
+                 additional_services=None, **quote_kwargs) -> Callable[[list], float | None]:
+    """
+    A quote_group callable for optimize_consolidation on one lane: each candidate shipment is
+    quoted with all of its lines in a single get_quote request.
+    """
+    def quote_group(lines: list) -> float | None:
+        return find_charge(get_quote(shipper, consignee, list(lines), shipment_specifics, pickup_services,
+                                     delivery_services, additional_services, **quote_kwargs))
+
+    return quote_group
@@ -0,0 +1,234 @@
+"""
+Split-vs-consolidate optimizer for orders shipping on the same lane and day.
+
+Candidate plans are the partitions of the commodity lines into shipments.  Each distinct group of
+lines is priced from the rate cache when possible, otherwise from an optional estimator; plans are
+ranked on those prices and only the groups appearing in the most promising plans are sent for real
+quotes, concurrently and within a time budget.  The cheapest plan whose every shipment has a real
+(quoted or cached) price wins.
+
+quote_group receives the commodity lines of one candidate shipment and returns its total charge, or
+None when ArcBest could not quote it.
+"""
+import json
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable
+
+from cache import TTLCache
+
+LINE_SUFFIX = re.compile(r'\d+$')
+
+# quoted group prices are reused across optimizer runs for the same lane
+rate_cache = TTLCache(ttl=15 * 60, max_entries=50000)
+
+
+class GroupPrice:
+    """
+    The price of one group key (the same freight on the same lane), shared by every plan's group
+    with that key.
+    """
+    def __init__(self):
+        self.charge = None
+        self.estimate = None
+        self.quoted = False
+
+
+class ShipmentGroup:
+    def __init__(self, lines: list, key: str, price: GroupPrice):
+        # the plan's own line objects; lines with equal content share the key and the price only
+        self.lines = lines
+        self.key = key
+        self.price = price
+
+    @property
+    def charge(self) -> float | None:
+        return self.price.charge
+
+    @property
+    def estimate(self) -> float | None:
+        return self.price.estimate
+
+    @property
+    def quoted(self) -> bool:
+        return self.price.quoted
+
+
+class ConsolidationPlan:
+    def __init__(self, groups: list[ShipmentGroup]):
+        self.groups = groups
+
+    @property
+    def shipments(self) -> list[list]:
+        return [group.lines for group in self.groups]
+
+    @property
+    def total_charge(self) -> float | None:
+        if any(group.charge is None for group in self.groups):
+            return None
+        return sum(group.charge for group in self.groups)
+
+    @property
+    def estimated_charge(self) -> float | None:
+        prices = [group.charge if group.charge is not None else group.estimate for group in self.groups]
+        if None in prices:
+            return None
+        return sum(prices)
+
+    def __repr__(self):
+        return f'ConsolidationPlan(shipments={len(self.groups)}, total_charge={self.total_charge})'
+
+
+def line_signature(line) -> list:
+    # a line's fields without its line number, so the same freight gets the same key in any group
+    return sorted((LINE_SUFFIX.sub('', key), str(value)) for key, value in line.as_dict().items())
+
+
+def group_key(lane: str, lines: list) -> str:
+    return json.dumps([lane, sorted(line_signature(line) for line in lines)], separators=(',', ':'))
+
+
+def plan_key(plan: ConsolidationPlan) -> tuple:
+    return tuple(sorted(group.key for group in plan.groups))
+
+
+def partitions(items: list, max_groups: int | None = None):
+    """
+    Yield every partition of items into groups (restricted growth order), optionally capped in size.
+    """
+    if not items:
+        yield []
+        return
+    first, rest = items[0], items[1:]
+    for partition in partitions(rest, max_groups):
+        for position in range(len(partition)):
+            yield partition[:position] + [[first] + partition[position]] + partition[position + 1:]
+        if max_groups is None or len(partition) < max_groups:
+            yield [[first]] + partition
+
+
+def _can_ship_together(lines: list) -> bool:
+    if not all(hasattr(line, 'hazmat') for line in lines):
+        return True
+    from bol.hazmat import Segregation, find_conflicts, profile_commodity
+    conflicts = find_conflicts([profile_commodity(line) for line in lines], include_separation=False)
+    # a possible conflict is enough to keep lines apart: splitting costs money, not compliance
+    return not any(conflict.segregation in (Segregation.FORBIDDEN, Segregation.POSSIBLY_FORBIDDEN)
+                   for conflict in conflicts)
+
+
+def optimize_consolidation(lines: list,
+                           quote_group: Callable[[list], float | None],
+                           lane: str = '',
+                           estimate_group: Callable[[list], float | None] | None = None,
+                           cache: TTLCache | None = None,
+                           time_budget: float = 10.0,
+                           max_quotes: int = 16,
+                           parallel: int = 4,
+                           max_groups: int | None = None,
+                           max_candidates: int = 20000) -> ConsolidationPlan | None:
+    if not lines:
+        raise ValueError('Nothing to optimize: no commodity lines')
+    cache = rate_cache if cache is None else cache
+    deadline = time.monotonic() + time_budget
+
+    # group key -> its GroupPrice, or None when the lines cannot ship together
+    prices = {}
+
+    def plan_for(partition: list[list]) -> ConsolidationPlan | None:
+        plan_groups = []
+        for group_lines in partition:
+            key = group_key(lane, group_lines)
+            if key not in prices:
+                price = prices[key] = GroupPrice() if _can_ship_together(group_lines) else None
+                if price is not None:
+                    price.charge = cache.get(key)
+                    price.quoted = price.charge is not None
+                    if not price.quoted and estimate_group is not None:
+                        price.estimate = estimate_group(group_lines)
+            if prices[key] is None:
+                return None
+            plan_groups.append(ShipmentGroup(group_lines, key, prices[key]))
+        return ConsolidationPlan(plan_groups)
+
+    # shipping every line separately and shipping all of them together are always candidates, and
+    # are priced first, so truncating the enumeration never loses the plans to beat
+    lines = list(lines)
+    baselines = [[[line] for line in lines]] if max_groups is None or len(lines) <= max_groups else []
+    baselines.append([lines])
+    seeded = []
+    seen = set()
+    for partition in baselines:
+        plan = plan_for(partition)
+        if plan is not None and plan_key(plan) not in seen:
+            seen.add(plan_key(plan))
+            seeded.append(plan)
+
+    candidates = []
+    for count, partition in enumerate(partitions(lines, max_groups)):
+        if count >= max_candidates:
+            break
+        plan = plan_for(partition)
+        if plan is not None and plan_key(plan) not in seen:
+            # partitions that differ only in which of two identical lines goes where price the same
+            seen.add(plan_key(plan))
+            candidates.append(plan)
+
+    def rank(plan: ConsolidationPlan):
+        # priced plans first, cheapest first; unpriced plans favour fewer shipments
+        price = plan.estimated_charge
+        return (price is None, price if price is not None else len(plan.groups))
+
+    candidates = seeded + sorted(candidates, key=rank)
+
+    quotes_left = max_quotes
+    pending = {}
+    executor = ThreadPoolExecutor(max_workers=parallel)
+
+    def best_charge():
+        return min((plan.total_charge for plan in candidates if plan.total_charge is not None), default=None)
+
+    def collect() -> bool:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        done, _ = wait(list(pending.values()), timeout=remaining, return_when=FIRST_COMPLETED)
+        for key in [key for key, future in pending.items() if future in done]:
+            price = prices[key]
+            price.quoted = True
+            try:
+                price.charge = pending.pop(key).result()
+            except Exception:
+                price.charge = None
+            if price.charge is not None:
+                cache.set(key, price.charge)
+        return True
+
+    try:
+        best = best_charge()
+        for plan in candidates:
+            if time.monotonic() >= deadline or (quotes_left <= 0 and not pending):
+                break
+            if any(group.quoted and group.charge is None for group in plan.groups):
+                continue
+            estimate = plan.estimated_charge
+            if best is not None and estimate is not None and estimate >= best:
+                continue
+            for group in plan.groups:
+                if quotes_left > 0 and not group.quoted and group.key not in pending:
+                    pending[group.key] = executor.submit(quote_group, group.lines)
+                    quotes_left -= 1
+            # keep at most `parallel` quotes in flight, re-ranking as they come back
+            while len(pending) >= parallel and collect():
+                best = best_charge()
+        while pending and collect():
+            pass
+    finally:
+        # quotes still in flight at the deadline are abandoned
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    priced = [plan for plan in candidates if plan.total_charge is not None]
+    if not priced:
+        return None
+    return min(priced, key=lambda plan: (plan.total_charge, len(plan.groups)))
@@ -1,9 +1,12 @@
-import os
 # import pprint
-import requests
-import xmltodict
+import copy
 from enum import Enum
 
+import transport
+from key_pool import resolve_api_key
+from preflight import check as preflight_check
+from profiling import profile_call
+from transport import ResponsePolicy
 from utils import bool_to_str, get_current_date_as_tuple, pp
 from shared_enums import PackageType, UnitsOfMeasurement, LimitedAccessOptions, ShipmentClasses
 
@@ -122,8 +125,9 @@ class ShippingParty:
 
 
 class Commodity:
+    # line_number may be left out when the commodity is passed to get_quote in a list of lines
     def __init__(self, weight,
-                 line_number: int,
+                 line_number: int | None = None,
                  shipment_class: ShipmentClasses | None = None,
                  length: float | None = None,
                  width: float | None = None,
@@ -193,7 +197,7 @@ class PickupServices:
                  residential: bool | None = None,
                  trade_show: bool | None = None):
 
-        if limited_access is not None and type_of_limited_access is None:
+        if limited_access and type_of_limited_access is None:
             raise ValueError('If limited_access is true, type_of_limited_access must be provided')
 
         self.lift_gate = lift_gate
@@ -226,9 +230,9 @@ class DeliveryServices:
                  trade_show: bool | None = None,
                  trade_show_type: TradeshowDeliveryTypes | None = None):
 
-        if limited_access is not None and type_of_limited_access is None:
+        if limited_access and type_of_limited_access is None:
             raise ValueError('If limited_access is true, the type of limited access must be provided')
-        if trade_show is not None and trade_show_type is None:
+        if trade_show and trade_show_type is None:
             raise ValueError('If trade_show is true, the type of trade show must be provided')
 
         self.construction_site = construction_site
@@ -304,14 +308,14 @@ class AdditionalServices:
         self.terminal_delivery = terminal_delivery
         self.terminal_pickup = terminal_pickup
 
-        if self.excess_liability is not None and self.declared_value is None:
+        if self.excess_liability and self.declared_value is None:
             raise ValueError('If excess liability is true, the declared value must be provided')
-        if self.excess_liability is not None and self.declared_type is None:
+        if self.excess_liability and self.declared_type is None:
             raise ValueError('If excess liability is true, the declared type must be provided')
-        if self.sort_and_segregate is not None and self.num_to_sort_and_segregate is None:
+        if self.sort_and_segregate and self.num_to_sort_and_segregate is None:
             raise ValueError('If sort and segregate is true, '
                              'the number of packages to sort and separate must be provided')
-        if self.truck_pack is not None and self.truck_pack_count is None:
+        if self.truck_pack and self.truck_pack_count is None:
             raise ValueError('If truck pack is true, the number of packages in the truck must be provided')
 
     def as_dict(self):
@@ -340,44 +344,127 @@ class AdditionalServices:
         }.items() if value is not None}
 
 
+def _block(value) -> dict:
+    return value.as_dict() if value is not None else {}
+
+
+def commodity_lines(commodity: Commodity | list[Commodity]) -> list[Commodity]:
+    """
+    The lines of a quote: a list of commodities is numbered 1..n in order, a single commodity keeps
+    its own line number.  Numbered lines are copies, so the caller's objects are never changed.
+    """
+    if isinstance(commodity, Commodity):
+        if commodity.line_number is not None:
+            return [commodity]
+        commodity = [commodity]
+    lines = []
+    for line_number, line in enumerate(commodity, start=1):
+        if line.line_number != line_number:
+            line = copy.copy(line)
+            line.line_number = line_number
+        lines.append(line)
+    if not lines:
+        raise ValueError('A quote needs at least one commodity line')
+    return lines
+
+
+def _commodity_block(commodity) -> dict:
+    fields = {}
+    for line in commodity_lines(commodity):
+        fields.update(line.as_dict())
+    return fields
+
+
+# the post body is the merge of these blocks in this order; request templates rely on the order
+QUOTE_BODY_BLOCKS = (
+    ('shipper', lambda shipper: shipper.as_shipper_dict()),
+    ('consignee', lambda consignee: consignee.as_consignee_dict()),
+    ('commodity', _commodity_block),
+    ('shipment_specifics', lambda shipment_specifics: shipment_specifics.as_dict()),
+    ('arcbest_api_key', lambda arcbest_api_key: {'ID': arcbest_api_key}),
+    ('pickup_services', _block),
+    ('delivery_services', _block),
+    ('additional_services', _block),
+)
+
+
+def build_quote_post_body(shipper: ShippingParty,
+                          consignee: ShippingParty,
+                          commodity: Commodity | list[Commodity],
+                          shipment_specifics: ShipmentSpecifics,
+                          pickup_services: PickupServices | None = None,
+                          delivery_services: DeliveryServices | None = None,
+                          additional_services: AdditionalServices | None = None,
+                          arcbest_api_key: str | None = None
+                          ) -> dict:
+    arguments = {
+        'shipper'            : shipper,
+        'consignee'          : consignee,
+        'commodity'          : commodity,
+        'shipment_specifics' : shipment_specifics,
+        'arcbest_api_key'    : arcbest_api_key,
+        'pickup_services'    : pickup_services,
+        'delivery_services'  : delivery_services,
+        'additional_services': additional_services,
+    }
+    post_body = {}
+    for name, block in QUOTE_BODY_BLOCKS:
+        post_body.update(block(arguments[name]))
+    return post_body
+
+
 def get_quote(shipper: ShippingParty,
               consignee: ShippingParty,
-              commodity: Commodity,
+              commodity: Commodity | list[Commodity],
               shipment_specifics: ShipmentSpecifics,
               pickup_services: PickupServices | None = None,
               delivery_services: DeliveryServices | None = None,
-              additional_services: AdditionalServices | None = None
+              additional_services: AdditionalServices | None = None,
+              response_policy: ResponsePolicy | None = None,
+              preflight: bool = True,
+              timeout: float | None = None,
+              hedge: bool = False,
+              template=None
               ) -> dict | None:
 
     response_dict = None
 
-    arcbest_quote_api_endpoint = 'https://www.abfs.com/xml/aquotexml.asp'
-    arcbest_api_key = os.environ.get('ARCBEST_API_KEY')
-    post_body = {**shipper.as_shipper_dict(),
-                 **consignee.as_consignee_dict(),
-                 **commodity.as_dict(),
-                 **shipment_specifics.as_dict(),
-                 'ID': arcbest_api_key}
-
-    if pickup_services is not None:
-        post_body.update(pickup_services.as_dict())
-
-    if delivery_services is not None:
-        post_body.update(delivery_services.as_dict())
-
-    if additional_services is not None:
-        post_body.update(additional_services.as_dict())
-
-    print(f'Arcbest API request: {post_body}')
-    # NB: the response.text is XML!
-    response = requests.post(url=arcbest_quote_api_endpoint, params={'api_key': arcbest_api_key}, data=post_body)
-
-    if response.status_code == 200:
-        # print(f'Arcbest API response: {response.text}')
-        response_dict = xmltodict.parse(response.text)
-        print(f'Arcbest API response dict: {pp.pprint(response_dict)}')
-    else:
-        print(f'Arcbest API request failed with status code: {response.status_code}')
+    with profile_call('quote') as profile:
+        with profile.phase('build'):
+            arcbest_quote_api_endpoint = 'https://www.abfs.com/xml/aquotexml.asp'
+            arcbest_api_key = resolve_api_key()
+            body_arguments = dict(shipper=shipper,
+                                  consignee=consignee,
+                                  commodity=commodity,
+                                  shipment_specifics=shipment_specifics,
+                                  pickup_services=pickup_services,
+                                  delivery_services=delivery_services,
+                                  additional_services=additional_services,
+                                  arcbest_api_key=arcbest_api_key)
+            if template is not None:
+                # a request_templates.QuoteTemplate with the static blocks already encoded
+                encoded = template.encode(**body_arguments)
+                post_body, wire_body = encoded.fields, encoded.body
+            else:
+                post_body = wire_body = build_quote_post_body(**body_arguments)
+            if preflight:
+                preflight_check('quote', post_body)
+
+        print(f'Arcbest API request: {post_body}')
+        # NB: the response.text is XML!
+        with profile.phase('network'):
+            response = transport.post('quote', arcbest_quote_api_endpoint, arcbest_api_key, wire_body, response_policy,
+                                      timeout=timeout, hedge=hedge)
+        with response:
+            profile.annotate(status_code=response.status_code, response_bytes=response.size)
+
+            if response.status_code == 200:
+                # print(f'Arcbest API response: {response.text}')
+                with profile.phase('parse'):
+                    response_dict = transport.parse_xml(response)
+                print(f'Arcbest API response dict: {pp.pformat(response_dict)}')
+            else:
+                print(f'Arcbest API request failed with status code: {response.status_code}')
 
     return response_dict
 
@@ -0,0 +1,146 @@
+"""
+Token-bucket rate limiting and adaptive concurrency limiting for upstream ArcBest calls.
+"""
+import threading
+import time
+from collections import deque
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float | None = None):
+        if rate <= 0:
+            raise ValueError('rate must be greater than 0')
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0, timeout: float | None = None) -> bool:
+        if tokens > self.burst:
+            # the bucket never holds more than burst tokens, so this would wait forever
+            raise ValueError(f'Cannot acquire {tokens} tokens from a bucket of {self.burst}')
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                if now + wait > deadline:
+                    return False
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit: grows by `increase` per limit's worth of healthy completions, and is
+    multiplied by `decrease` on an error, timeout or a latency spike (a call slower than
+    `spike_factor` times the moving baseline).  Calls started before a cut cannot cut again, so one
+    slow burst only shrinks the limit once.
+    """
+    def __init__(self,
+                 initial: int = 4,
+                 min_limit: int = 1,
+                 max_limit: int = 64,
+                 increase: float = 1.0,
+                 decrease: float = 0.5,
+                 spike_factor: float = 2.0,
+                 smoothing: float = 0.05,
+                 history: int = 512):
+        if not 1 <= min_limit <= initial <= max_limit:
+            raise ValueError('limits must satisfy 1 <= min_limit <= initial <= max_limit')
+        if not 0 < decrease < 1:
+            raise ValueError('decrease must be between 0 and 1')
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.spike_factor = spike_factor
+        self.smoothing = smoothing
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._last_cut = float('-inf')
+        self._condition = threading.Condition()
+        self.baseline = None
+        self.samples = 0
+        self.cuts = 0
+        self.history = deque([(time.time(), initial, 'start')], maxlen=history)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self, timeout: float | None = None) -> float | None:
+        """
+        Wait for a free slot; returns the start time to pass to release(), or None on timeout.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._in_flight < self.limit, timeout):
+                return None
+            self._in_flight += 1
+            return time.monotonic()
+
+    def release(self, started: float, failed: bool = False):
+        with self._condition:
+            self._in_flight -= 1
+            self._record(started, time.monotonic() - started, failed)
+            self._condition.notify_all()
+
+    def record(self, started: float, latency: float, failed: bool = False):
+        """
+        Feed one completed call into the limit for callers that track their own in-flight count.
+        """
+        with self._condition:
+            self._record(started, latency, failed)
+            self._condition.notify_all()
+
+    def _record(self, started: float, latency: float, failed: bool):
+        self.samples += 1
+        spike = self.baseline is not None and latency > self.spike_factor * self.baseline
+        if not failed:
+            self.baseline = latency if self.baseline is None else (
+                    self.baseline + self.smoothing * (latency - self.baseline))
+        if failed or spike:
+            if started > self._last_cut:
+                self._last_cut = time.monotonic()
+                self.cuts += 1
+                self._set(max(self.min_limit, self._limit * self.decrease), 'error' if failed else 'latency')
+        elif self._limit < self.max_limit:
+            self._set(min(self.max_limit, self._limit + self.increase / self._limit), 'increase')
+
+    def _set(self, limit: float, reason: str):
+        changed = int(limit) != int(self._limit)
+        self._limit = limit
+        if changed:
+            self.history.append((time.time(), int(limit), reason))
+
+    def snapshot(self) -> dict:
+        with self._condition:
+            return {
+                'limit'    : self.limit,
+                'in_flight': self._in_flight,
+                'baseline' : self.baseline,
+                'samples'  : self.samples,
+                'cuts'     : self.cuts,
+                'history'  : [{'time': at, 'limit': limit, 'reason': reason} for at, limit, reason in self.history],
+            }
@@ -0,0 +1,134 @@
+"""
+Pre-encoded request templates for quotes and BOLs that repeat the same blocks.
+
+Most BOLs share their Requestor, shipper, DocLabelInfo and CopyConfirmation.  A template encodes
+those static blocks into form bytes once; each call then only builds and encodes the variable
+blocks (commodity lines, reference numbers, ship date, ...) and joins the pieces.  The bytes are
+the same, field for field and in the same order, as requests produces for the post body dict.
+
+    template = BolTemplate(requestor=requestor, shipping_party=shipper,
+                           copy_confirmation=copy_confirmation, doc_label_info=doc_label_info)
+    template.get_bol(consignee=consignee, commodity_lines=lines, shipment_specifics=specifics)
+
+A call whose variable blocks repeat a field of another block, or that overrides a static block,
+falls back to sending the merged post body dict, so the output always matches the untemplated
+request.
+"""
+import inspect
+from urllib.parse import quote_plus
+
+from bol.bill_of_lading import BOL_BODY_BLOCKS, build_bol_post_body, get_bol
+from key_pool import get_key_pool
+from quote.quote import QUOTE_BODY_BLOCKS, build_quote_post_body, get_quote
+
+
+def _encode_value(value) -> str:
+    if isinstance(value, bytes):
+        return quote_plus(value)
+    return quote_plus(str(value))
+
+
+def encode_fields(fields: dict) -> bytes:
+    """
+    Form-encode fields exactly as requests encodes a data dict: None values are dropped and list
+    values repeat the key.
+    """
+    pairs = []
+    for key, value in fields.items():
+        values = value if isinstance(value, (list, tuple)) else (value,)
+        for item in values:
+            if item is not None:
+                pairs.append(f'{quote_plus(key)}={_encode_value(item)}')
+    return '&'.join(pairs).encode('ascii')
+
+
+class EncodedRequest:
+    def __init__(self, body: bytes | dict, fields: dict):
+        self.body = body
+        self.fields = fields
+
+
+class RequestTemplate:
+    def __init__(self, kind: str, blocks: tuple, builder, **static):
+        names = [name for name, _ in blocks]
+        unknown = set(static) - set(names)
+        if unknown:
+            raise ValueError(f'Unknown {kind} blocks: {", ".join(sorted(unknown))}')
+        if 'arcbest_api_key' in static:
+            raise ValueError('The API key is filled in per call and cannot be part of a template')
+        self.kind = kind
+        self.builder = builder
+        self.static = static
+        self.defaults = {name: parameter.default for name, parameter in inspect.signature(builder).parameters.items()
+                         if parameter.default is not inspect.Parameter.empty}
+        self.static_fields = {}
+        # pre-encoded bytes for each run of static blocks, and (name, block) for the variable ones
+        self.segments = []
+        run = {}
+        for name, block in blocks:
+            if name in static:
+                fields = block(static[name])
+                if not self.static_fields.keys().isdisjoint(fields.keys() - run.keys()):
+                    raise ValueError(f'{kind} block {name} repeats a field of an earlier static block')
+                run.update(fields)
+                self.static_fields.update(fields)
+            else:
+                if run:
+                    self.segments.append(encode_fields(run))
+                    run = {}
+                self.segments.append((name, block))
+        if run:
+            self.segments.append(encode_fields(run))
+
+    def encode(self, **arguments) -> EncodedRequest:
+        """
+        Encode one request from the variable blocks.  An argument that names a static block and is
+        not the template's own object (or None) overrides it, and the request falls back to the
+        merged post body.
+        """
+        arguments = {**self.static, **{name: value for name, value in arguments.items()
+                                       if value is not None or name not in self.static}}
+        if any(arguments[name] is not value for name, value in self.static.items()):
+            return self._encode_merged(arguments)
+        fields = dict(self.static_fields)
+        chunks = []
+        for segment in self.segments:
+            if isinstance(segment, bytes):
+                if segment:
+                    chunks.append(segment)
+                continue
+            name, block = segment
+            value = arguments.get(name, self.defaults.get(name))
+            if name == 'arcbest_api_key' and value is None and get_key_pool() is not None:
+                # the transport fills in the pooled key at this position
+                chunks.append(b'ID=')
+                continue
+            block_fields = block(value)
+            if not fields.keys().isdisjoint(block_fields.keys()):
+                return self._encode_merged(arguments)
+            fields.update(block_fields)
+            if block_fields:
+                chunk = encode_fields(block_fields)
+                if chunk:
+                    chunks.append(chunk)
+        return EncodedRequest(b'&'.join(chunks), fields)
+
+    def _encode_merged(self, arguments: dict) -> EncodedRequest:
+        fields = self.builder(**arguments)
+        return EncodedRequest(fields, fields)
+
+
+class BolTemplate(RequestTemplate):
+    def __init__(self, **static):
+        super().__init__('bol', BOL_BODY_BLOCKS, build_bol_post_body, **static)
+
+    def get_bol(self, **arguments) -> dict | None:
+        return get_bol(**{**self.static, **arguments}, template=self)
+
+
+class QuoteTemplate(RequestTemplate):
+    def __init__(self, **static):
+        super().__init__('quote', QUOTE_BODY_BLOCKS, build_quote_post_body, **static)
+
+    def get_quote(self, **arguments) -> dict | None:
+        return get_quote(**{**self.static, **arguments}, template=self)
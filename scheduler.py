@@ -0,0 +1,164 @@
+"""
+Priority scheduling of upstream ArcBest calls that share one request budget.
+
+A Scheduler allows at most `capacity` calls in flight.  When a slot frees up it goes to the waiting
+call with the smallest weighted-fair-queuing tag, so each class gets slots in proportion to its
+weight while it has work queued.  Background classes (tracking refreshes by default) only get a
+slot when no foreground call is waiting, and never more than `background_share` of the capacity,
+so BOL and quote calls always find headroom.  An HTTP call already in flight cannot be interrupted
+without wasting it, so background work is held back at admission rather than preempted.
+
+    transport.set_scheduler(Scheduler(capacity=8))
+"""
+import threading
+import time
+from collections import deque
+
+from metrics import LatencyStats
+
+
+class SchedulerBusy(Exception):
+    pass
+
+
+class SchedulingClass:
+    def __init__(self, name: str, weight: float, background: bool = False, max_queue: int | None = None):
+        if weight <= 0:
+            raise ValueError('weight must be greater than 0')
+        self.name = name
+        self.weight = weight
+        self.background = background
+        self.max_queue = max_queue
+
+
+DEFAULT_CLASSES = (
+    SchedulingClass('bol', weight=8),
+    SchedulingClass('quote', weight=4),
+    SchedulingClass('tracking', weight=1, background=True, max_queue=10000),
+)
+
+
+class _Waiter:
+    __slots__ = ('tag', 'enqueued', 'granted')
+
+    def __init__(self, tag: float):
+        self.tag = tag
+        self.enqueued = time.monotonic()
+        self.granted = False
+
+
+class _ClassState:
+    def __init__(self, scheduling_class: SchedulingClass):
+        self.scheduling_class = scheduling_class
+        self.queue = deque()
+        self.finish_tag = 0.0
+        self.in_flight = 0
+        self.admitted = 0
+        self.timed_out = 0
+        self.rejected = 0
+        self.wait = LatencyStats()
+
+    def as_dict(self) -> dict:
+        return {
+            'weight'     : self.scheduling_class.weight,
+            'background' : self.scheduling_class.background,
+            'queue_depth': len(self.queue),
+            'in_flight'  : self.in_flight,
+            'admitted'   : self.admitted,
+            'timed_out'  : self.timed_out,
+            'rejected'   : self.rejected,
+            'wait'       : self.wait.snapshot(),
+        }
+
+
+class Scheduler:
+    def __init__(self,
+                 capacity: int = 8,
+                 classes: tuple = DEFAULT_CLASSES,
+                 background_share: float = 0.5,
+                 routes: dict | None = None):
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        if not 0 < background_share <= 1:
+            raise ValueError('background_share must be between 0 and 1')
+        self.capacity = capacity
+        self.background_limit = max(1, int(capacity * background_share))
+        self.classes = {scheduling_class.name: _ClassState(scheduling_class) for scheduling_class in classes}
+        # call kind -> class name; kinds without a route use the class of the same name
+        self.routes = routes or {}
+        self._in_flight = 0
+        self._virtual_time = 0.0
+        self._condition = threading.Condition()
+
+    def class_for(self, kind: str) -> str:
+        name = self.routes.get(kind, kind)
+        if name not in self.classes:
+            raise ValueError(f'No scheduling class for {kind!r}')
+        return name
+
+    def acquire(self, kind: str, timeout: float | None = None) -> str | None:
+        """
+        Wait for a slot for a call of this kind.  Returns the class name to hand back to release(),
+        or None if no slot came up within the timeout.
+        """
+        name = self.class_for(kind)
+        state = self.classes[name]
+        with self._condition:
+            max_queue = state.scheduling_class.max_queue
+            if max_queue is not None and len(state.queue) >= max_queue:
+                state.rejected += 1
+                raise SchedulerBusy(f'{name} queue is full ({max_queue} waiting)')
+            state.finish_tag = max(self._virtual_time, state.finish_tag) + 1 / state.scheduling_class.weight
+            waiter = _Waiter(state.finish_tag)
+            state.queue.append(waiter)
+            self._dispatch()
+            if not self._condition.wait_for(lambda: waiter.granted, timeout):
+                state.queue.remove(waiter)
+                state.timed_out += 1
+                return None
+        state.wait.record(time.monotonic() - waiter.enqueued)
+        return name
+
+    def release(self, name: str):
+        with self._condition:
+            self._in_flight -= 1
+            self.classes[name].in_flight -= 1
+            self._dispatch()
+
+    def _eligible(self) -> list:
+        foreground = [state for state in self.classes.values()
+                      if state.queue and not state.scheduling_class.background]
+        if foreground:
+            return foreground
+        background_in_flight = sum(state.in_flight for state in self.classes.values()
+                                   if state.scheduling_class.background)
+        if background_in_flight >= self.background_limit:
+            return []
+        return [state for state in self.classes.values() if state.queue]
+
+    def _dispatch(self):
+        # called with the condition held
+        granted = False
+        while self._in_flight < self.capacity:
+            candidates = self._eligible()
+            if not candidates:
+                break
+            state = min(candidates, key=lambda candidate: candidate.queue[0].tag)
+            waiter = state.queue.popleft()
+            waiter.granted = True
+            self._virtual_time = max(self._virtual_time, waiter.tag - 1 / state.scheduling_class.weight)
+            self._in_flight += 1
+            state.in_flight += 1
+            state.admitted += 1
+            granted = True
+        if granted:
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                'capacity'        : self.capacity,
+                'background_limit': self.background_limit,
+                'in_flight'       : self._in_flight,
+                'classes'         : {name: state.as_dict() for name, state in self.classes.items()},
+            }
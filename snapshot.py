@@ -0,0 +1,165 @@
+"""
+Warm-start snapshots of the SDK's in-memory state.
+
+A new process starts with empty response caches, no latency history (so hedging has no delay to
+go by) and an empty in-memory reference index, and every call goes upstream until they fill up.
+A snapshot saves that state to a compact file at shutdown or on a schedule and loads it at startup:
+
+    snapshot.load('arcbest.snapshot')                  # before serving
+    writer = snapshot.SnapshotWriter('arcbest.snapshot', interval=300).start()
+    ...
+    writer.stop()                                      # saves once more
+
+Cache expiry times are stored as wall-clock times, so entries that expired while no process was
+running are dropped on load and the rest keep their remaining TTL.  Latency samples seed the
+percentile windows only; counters start from zero.  A reference index backed by a file is already
+persistent and is left out.
+
+The file is a codec message compressed with zlib, written to a temporary file and renamed into
+place, so a reader never sees half a snapshot.
+"""
+import os
+import threading
+import time
+import zlib
+
+import codec
+import transport
+from cache import TTLCache
+from metrics import LatencyStats
+from quote import optimizer
+from tracking.reference_index import ReferenceIndex, get_reference_index
+
+MAGIC = b'ABSNAP'
+VERSION = 1
+
+
+def default_components() -> dict:
+    """
+    name -> cache, latency stats or reference index, for the state the SDK keeps per process.
+    """
+    components = {'quote.rate_cache': optimizer.rate_cache}
+    for kind, stats in transport.LATENCY.items():
+        components[f'transport.latency.{kind}'] = stats
+    index = get_reference_index()
+    if index is not None and index.path == ':memory:':
+        components['reference_index'] = index
+    return components
+
+
+def capture(components: dict) -> dict:
+    state = {}
+    for name, component in components.items():
+        if isinstance(component, TTLCache):
+            state[name] = {'type': 'cache', 'entries': component.export_entries()}
+        elif isinstance(component, LatencyStats):
+            state[name] = {'type': 'latency', 'samples': component.export_samples()}
+        elif isinstance(component, ReferenceIndex):
+            state[name] = {'type': 'references', 'rows': component.export_rows()}
+        else:
+            raise TypeError(f'Cannot snapshot {name}: {type(component).__name__}')
+    return state
+
+
+def _key(key):
+    # the codec returns tuples as lists, which cannot be dict keys
+    return tuple(_key(part) for part in key) if isinstance(key, list) else key
+
+
+def restore(state: dict, components: dict) -> dict:
+    """
+    Load captured state into the components of the same name; returns name -> items loaded.
+    Names missing on either side are skipped.
+    """
+    loaded = {}
+    for name, component in components.items():
+        saved = state.get(name)
+        if saved is None:
+            continue
+        if isinstance(component, TTLCache) and saved['type'] == 'cache':
+            loaded[name] = component.import_entries((_key(key), value, expires_at)
+                                                    for key, value, expires_at in saved['entries'])
+        elif isinstance(component, LatencyStats) and saved['type'] == 'latency':
+            component.import_samples(saved['samples'])
+            loaded[name] = len(saved['samples'])
+        elif isinstance(component, ReferenceIndex) and saved['type'] == 'references':
+            loaded[name] = component.import_rows(saved['rows'])
+    return loaded
+
+
+def save(path: str, components: dict | None = None) -> int:
+    """
+    Write a snapshot of the components (default_components() when None); returns its size in bytes.
+    """
+    components = default_components() if components is None else components
+    data = MAGIC + bytes([VERSION]) + zlib.compress(codec.encode({'saved_at': time.time(),
+                                                                  'state'   : capture(components)}), 6)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+    return len(data)
+
+
+def load(path: str, components: dict | None = None) -> dict:
+    """
+    Restore a snapshot written by save(); returns name -> items loaded.  A missing or unreadable
+    file is reported and ignored, so a process always starts, just cold.
+    """
+    components = default_components() if components is None else components
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return {}
+    if not data.startswith(MAGIC) or len(data) <= len(MAGIC) or data[len(MAGIC)] != VERSION:
+        print(f'Ignoring snapshot {path}: not a version {VERSION} snapshot')
+        return {}
+    try:
+        message = codec.decode(zlib.decompress(data[len(MAGIC) + 1:]))
+    except (zlib.error, ValueError) as e:
+        print(f'Ignoring snapshot {path}: {e}')
+        return {}
+    loaded = restore(message['state'], components)
+    print(f'Loaded snapshot {path} from {time.time() - message["saved_at"]:.0f}s ago: {loaded}')
+    return loaded
+
+
+class SnapshotWriter:
+    """
+    Save a snapshot every `interval` seconds on a daemon thread, and once more on stop().
+    """
+    def __init__(self, path: str, interval: float = 300.0, components: dict | None = None):
+        if interval <= 0:
+            raise ValueError('interval must be greater than 0')
+        self.path = path
+        self.interval = interval
+        self.components = components
+        self.saves = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> 'SnapshotWriter':
+        self._thread = threading.Thread(target=self._run, name='arcbest-snapshot', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.save()
+
+    def save(self):
+        try:
+            save(self.path, self.components)
+            self.saves += 1
+        except OSError as e:
+            self.errors += 1
+            print(f'Snapshot {self.path} failed: {e}')
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.save()
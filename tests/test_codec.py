@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from datetime import date, datetime
+
+import pytest
+
+import codec
+from bol.commodity import HazMatCompatibilities
+from quote.quote import Commodity
+from shared_enums import PackageType, ShipmentClasses
+
+
+@pytest.mark.parametrize('value', [
+    None, True, False, 0, 1, -1, 2 ** 63, -(2 ** 70), 1.5, float('inf'), '', 'DALLAS', 'é€😀', b'', b'\x00\xff',
+    [], {}, [1, 'a', None, [2.5]], {'a': {'b': [1, 2]}, 'c': None},
+    date(2024, 5, 30), datetime(2024, 5, 30, 13, 45, 7),
+    ShipmentClasses.CLASS_50, PackageType.Pallet, HazMatCompatibilities.CLASS_1_4,
+])
+def test_plain_values_round_trip(value):
+    decoded = codec.decode(codec.encode(value))
+    assert decoded == value
+    assert type(decoded) is type(value)
+
+
+def test_tuples_and_ordered_dicts_come_back_as_lists_and_dicts():
+    decoded = codec.decode(codec.encode({'row': (1, 2), 'tree': OrderedDict([('b', 1), ('a', 2)])}))
+    assert decoded == {'row': [1, 2], 'tree': {'b': 1, 'a': 2}}
+    assert list(decoded['tree']) == ['b', 'a']
+
+
+def test_models_round_trip_without_their_constructor():
+    line = Commodity(400, line_number=1, shipment_class=ShipmentClasses.CLASS_50, length=48, width=48, height=48,
+                     unit_number=3, packing_type=PackageType.Pallet)
+    decoded = codec.decode(codec.encode({'lines': [line, line]}))
+    assert [type(item) for item in decoded['lines']] == [Commodity, Commodity]
+    assert decoded['lines'][0].as_dict() == line.as_dict()
+    assert decoded['lines'][1].__dict__ == line.__dict__
+
+
+def test_repeated_strings_round_trip():
+    rows = [{'status': 'DELIVERED', 'city': 'TULSA'} for _ in range(50)]
+    payload = codec.encode(rows)
+    assert codec.decode(payload) == rows
+    assert payload.count(b'DELIVERED') == 1
+
+
+@pytest.mark.parametrize('payload', [b'', b'XX\x01', codec.encode('DALLAS')[:-1], codec.encode(1) + b'\x00'])
+def test_corrupt_messages_raise(payload):
+    with pytest.raises(codec.CodecError):
+        codec.decode(payload)
+
+
+def test_newer_format_versions_are_refused():
+    payload = bytearray(codec.encode(1))
+    payload[len(codec.MAGIC)] = codec.FORMAT_VERSION + 1
+    with pytest.raises(codec.CodecError):
+        codec.decode(bytes(payload))
+
+
+def test_unknown_values_pass_through_unchanged():
+    payload = codec.encode([ShipmentClasses.CLASS_50])
+    members = codec._ENUM_MEMBERS[4]
+    codec._ENUM_MEMBERS[4] = []
+    try:
+        decoded = codec.decode(payload)
+    finally:
+        codec._ENUM_MEMBERS[4] = members
+    assert isinstance(decoded[0], codec.UnknownValue)
+    assert codec.encode(decoded) == payload
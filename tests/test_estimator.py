@@ -0,0 +1,17 @@
+import xmltodict
+
+from benchmarks import fixtures
+from quote.estimator import find_charge
+
+
+def test_total_charge_is_read_from_the_response_root():
+    assert find_charge(xmltodict.parse(fixtures.quote_response_xml())) == 270.93
+    assert find_charge({'ABF': {'CHARGE': '$1,204.50'}}) == 1204.5
+    assert find_charge(99) == 99.0
+
+
+def test_nested_charges_are_not_taken_for_the_total():
+    assert find_charge({'ABF': {'ITEMIZEDCHARGES': {'ITEM': {'CHARGE': '29.00'}}}}) is None
+    assert find_charge({'ABF': {'CHARGE': {'AMOUNT': '29.00'}}}) is None
+    assert find_charge({'TOTALCHARGE': '270.93'}) is None
+    assert find_charge(None) is None
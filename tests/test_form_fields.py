@@ -0,0 +1,28 @@
+from cassette import fingerprint
+from request_templates import encode_fields
+from transport import form_fields
+
+
+def test_repeated_keys_read_back_as_lists():
+    fields = {'Wgt1': 400, 'Compat1': ['B', 'C', 'D'], 'ShipCity': 'DALLAS'}
+    assert encode_fields(fields) == b'Wgt1=400&Compat1=B&Compat1=C&Compat1=D&ShipCity=DALLAS'
+    assert form_fields(encode_fields(fields)) == {'Wgt1': '400', 'Compat1': ['B', 'C', 'D'], 'ShipCity': 'DALLAS'}
+
+
+def test_round_trip_quotes_and_drops_none():
+    fields = {'ShipName': 'A & B Co.', 'Note': 'a=b c/d', 'Blank': '', 'Missing': None, 'Pieces': ['1', None, '2']}
+    assert form_fields(encode_fields(fields)) == {'ShipName': 'A & B Co.', 'Note': 'a=b c/d', 'Blank': '',
+                                                  'Pieces': ['1', '2']}
+
+
+def test_dict_bodies_pass_through():
+    fields = {'Compat1': ['B', 'C']}
+    assert form_fields(fields) is fields
+
+
+def test_bytes_and_dict_bodies_fingerprint_alike():
+    fields = {'ID': 'secret', 'Wgt1': 400, 'Compat1': ['B', 'C', 'D'], 'Compat2': ['E'], 'Compat3': [],
+              'HazMat': None, 'ShipCity': 'DALLAS'}
+    assert fingerprint('quote', encode_fields(fields)) == fingerprint('quote', fields)
+    changed = encode_fields({**fields, 'Compat1': ['B', 'C']})
+    assert fingerprint('quote', changed) != fingerprint('quote', fields)
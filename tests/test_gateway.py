@@ -0,0 +1,62 @@
+import http.client
+import io
+import json
+import threading
+
+import pytest
+
+from gateway import ENDPOINTS, Gateway, make_server
+from transport import TransportResponse
+
+
+class FakeUpstream:
+    def __init__(self):
+        self.calls = []
+
+    def post(self, kind, url, params, data, policy, deadline=None):
+        self.calls.append((kind, url, params, data))
+        payload = f'<response>{url}</response>'.encode('utf-8')
+        return TransportResponse(200, io.BytesIO(payload), len(payload))
+
+
+@pytest.fixture
+def served():
+    upstream = FakeUpstream()
+    server = make_server(Gateway(api_key='gateway-key', upstream=upstream), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, upstream
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, payload: dict) -> http.client.HTTPResponse:
+    connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+    connection.request('POST', '/post', body=json.dumps(payload).encode('utf-8'),
+                       headers={'Content-Type': 'application/json'})
+    return connection.getresponse()
+
+
+def test_client_url_is_ignored(served):
+    server, upstream = served
+    response = post(server, {'kind': 'quote', 'url': 'http://attacker.example/steal', 'body': {'Wgt1': '400'}})
+    assert response.status == 200
+    assert b'attacker' not in response.read()
+    assert [(kind, url) for kind, url, _, _ in upstream.calls] == [('quote', ENDPOINTS['quote'])]
+    assert upstream.calls[0][2] == {'api_key': 'gateway-key'}
+
+
+def test_cached_response_is_from_the_fixed_endpoint(served):
+    server, upstream = served
+    post(server, {'kind': 'quote', 'url': 'http://attacker.example/', 'body': {'Wgt1': '400'}}).read()
+    response = post(server, {'kind': 'quote', 'body': {'Wgt1': '400'}})
+    assert response.read() == f'<response>{ENDPOINTS["quote"]}</response>'.encode('utf-8')
+    assert len(upstream.calls) == 1
+
+
+def test_every_kind_has_an_arcbest_endpoint():
+    gateway = Gateway(api_key='gateway-key', upstream=FakeUpstream())
+    for kind in ('quote', 'bol', 'tracking'):
+        gateway.handle(kind, {'ID': 'client-key'})
+    assert all(url.startswith('https://www.abfs.com/') for _, url, _, _ in gateway.upstream.calls)
+    assert all(data['ID'] == 'gateway-key' for _, _, _, data in gateway.upstream.calls)
@@ -0,0 +1,66 @@
+from cache import TTLCache
+from quote.optimizer import optimize_consolidation, partitions
+from quote.quote import Commodity
+
+
+def optimize(lines, quote_group, **kwargs):
+    return optimize_consolidation(lines, quote_group, lane='DALLAS-TULSA', cache=TTLCache(ttl=60), **kwargs)
+
+
+def test_partitions_are_every_set_partition():
+    found = list(partitions(['a', 'b', 'c']))
+    assert len(found) == 5
+    assert sorted(sorted(map(sorted, partition)) for partition in found) == [
+        [['a'], ['b'], ['c']],
+        [['a'], ['b', 'c']],
+        [['a', 'b'], ['c']],
+        [['a', 'b', 'c']],
+        [['a', 'c'], ['b']],
+    ]
+
+
+def test_partitions_respect_max_groups():
+    found = list(partitions(['a', 'b', 'c', 'd'], max_groups=2))
+    assert found and all(len(partition) <= 2 for partition in found)
+    assert len(found) == 8
+
+
+def test_consolidates_when_one_shipment_is_cheaper():
+    lines = [Commodity(100), Commodity(200), Commodity(300)]
+    plan = optimize(lines, lambda group: 100.0 + 10 * len(group))
+    assert plan.shipments == [lines]
+    assert plan.total_charge == 130.0
+
+
+def test_splits_when_separate_shipments_are_cheaper():
+    lines = [Commodity(100), Commodity(200), Commodity(300)]
+    plan = optimize(lines, lambda group: 50.0 * len(group) ** 2)
+    assert sorted(map(len, plan.shipments)) == [1, 1, 1]
+    assert plan.total_charge == 150.0
+
+
+def test_duplicate_lines_each_ship_once():
+    a, b = Commodity(100), Commodity(100)
+    plan = optimize([a, b], lambda group: 50.0 * len(group) ** 2)
+    assert len(plan.shipments) == 2
+    shipped = [line for shipment in plan.shipments for line in shipment]
+    assert len(shipped) == 2
+    assert shipped[0] is not shipped[1]
+    assert {id(line) for line in shipped} == {id(a), id(b)}
+
+
+def test_duplicate_lines_are_quoted_once():
+    quoted = []
+
+    def quote_group(group):
+        quoted.append(len(group))
+        return 50.0 * len(group) ** 2
+
+    lines = [Commodity(100), Commodity(100), Commodity(100)]
+    plan = optimize(lines, quote_group)
+    assert sorted(quoted) == [1, 2, 3]
+    assert sorted(id(line) for shipment in plan.shipments for line in shipment) == sorted(map(id, lines))
+
+
+def test_no_plan_when_nothing_can_be_quoted():
+    assert optimize([Commodity(100), Commodity(200)], lambda group: None) is None
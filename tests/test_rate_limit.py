@@ -0,0 +1,18 @@
+import pytest
+
+from rate_limit import TokenBucket
+
+
+def test_acquire_more_than_the_burst_raises():
+    bucket = TokenBucket(rate=10, burst=2)
+    with pytest.raises(ValueError):
+        bucket.acquire(3)
+    with pytest.raises(ValueError):
+        bucket.acquire(3, timeout=0.01)
+
+
+def test_acquire_up_to_the_burst():
+    bucket = TokenBucket(rate=1000, burst=2)
+    assert bucket.acquire(2)
+    assert bucket.acquire(2, timeout=1.0)
+    assert not bucket.try_acquire(2)
@@ -0,0 +1,37 @@
+from tracking.reconcile import Reconciler, SubmissionRecord
+
+
+class ListWriter:
+    def __init__(self):
+        self.rows = []
+
+    def write(self, row: dict):
+        self.rows.append(row)
+
+
+def shipment(pro: str, bol: str) -> dict:
+    return {'pro': pro, 'bols': [bol], 'status_code': 'DL', 'status': 'Delivered', 'weight': None, 'pieces': None}
+
+
+def test_duplicates_are_reported_by_value():
+    writer = ListWriter()
+    reconciler = Reconciler(writer)
+    reconciler.check(0, SubmissionRecord('BOL1', '100'), [shipment('100', 'BOL1')])
+    reconciler.check(1, SubmissionRecord('BOL2', '200'), [shipment('200', 'BOL2')])
+    reconciler.check(2, SubmissionRecord(' bol1 ', '300'), [shipment('300', 'BOL1')])
+    reconciler.check(3, SubmissionRecord('BOL4', '200'), [shipment('200', 'BOL4')])
+    assert [(row['bol_number'], row['kind'], row['detail']) for row in writer.rows] == [
+        ('BOL1', 'duplicate-bol', 'BOL number also on record 1'),
+        ('BOL4', 'duplicate-pro', 'PRO also on record 2'),
+    ]
+    assert reconciler.summary() == {'records': 4, 'ok': 2,
+                                    'discrepancies': {'duplicate-bol': 1, 'duplicate-pro': 1}}
+
+
+def test_unparseable_numbers_are_reported():
+    writer = ListWriter()
+    reconciler = Reconciler(writer)
+    record = SubmissionRecord('BOL1', '100', weight='1,200', pieces='n/a')
+    assert record.weight == 1200.0
+    reconciler.check(0, record, [shipment('100', 'BOL1')])
+    assert [(row['kind'], row['actual']) for row in writer.rows] == [('invalid-record', 'n/a')]
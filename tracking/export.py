@@ -0,0 +1,153 @@
+"""
+Stream normalized tracking rows to CSV, JSONL or Parquet.
+
+Rows are buffered in chunks of chunk_size and flushed, so memory stays bounded however many
+responses are exported.  Parquet needs pyarrow; it is optional and only imported when used.
+
+    results = ((ref, TrackingRefereceTypes.ArcBestPro, get_tracking_data(ref, ...)) for ref in refs)
+    export_tracking(results, 'status.parquet', 'events.parquet')
+"""
+import csv
+import json
+import os
+from abc import ABC, abstractmethod
+
+from tracking.normalize import EVENT_COLUMNS, STATUS_COLUMNS, normalize
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class RowWriter(ABC):
+    def __init__(self, path: str, columns: tuple, chunk_size: int = 10000):
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be at least 1')
+        self.path = path
+        self.columns = columns
+        self.chunk_size = chunk_size
+        self.rows_written = 0
+        self._chunk = []
+
+    def write(self, row: dict):
+        self._chunk.append(row)
+        if len(self._chunk) >= self.chunk_size:
+            self.flush()
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        if self._chunk:
+            self._write_chunk(self._chunk)
+            self.rows_written += len(self._chunk)
+            self._chunk = []
+
+    @abstractmethod
+    def _write_chunk(self, rows: list[dict]):
+        """
+        Write one chunk of rows to the file.
+        """
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class CsvRowWriter(RowWriter):
+    def __init__(self, path: str, columns: tuple, chunk_size: int = 10000):
+        super().__init__(path, columns, chunk_size)
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=columns, extrasaction='ignore')
+        self._writer.writeheader()
+
+    def _write_chunk(self, rows: list[dict]):
+        self._writer.writerows(rows)
+
+    def close(self):
+        super().close()
+        self._file.close()
+
+
+class JsonlRowWriter(RowWriter):
+    def __init__(self, path: str, columns: tuple, chunk_size: int = 10000):
+        super().__init__(path, columns, chunk_size)
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def _write_chunk(self, rows: list[dict]):
+        self._file.write(''.join(json.dumps({column: row.get(column) for column in self.columns},
+                                            separators=(',', ':')) + '\n' for row in rows))
+
+    def close(self):
+        super().close()
+        self._file.close()
+
+
+class ParquetRowWriter(RowWriter):
+    def __init__(self, path: str, columns: tuple, chunk_size: int = 10000):
+        if pyarrow is None:
+            raise ImportError('Parquet export needs pyarrow; install it or export to csv/jsonl')
+        super().__init__(path, columns, chunk_size)
+        fields = [pyarrow.field(column, pyarrow.int64() if column == 'sequence' else pyarrow.string())
+                  for column in columns]
+        self._schema = pyarrow.schema(fields)
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+
+    def _write_chunk(self, rows: list[dict]):
+        arrays = {column: [row.get(column) for row in rows] for column in self.columns}
+        self._writer.write_table(pyarrow.Table.from_pydict(arrays, schema=self._schema))
+
+    def close(self):
+        super().close()
+        self._writer.close()
+
+
+WRITERS = {
+    'csv'    : CsvRowWriter,
+    'jsonl'  : JsonlRowWriter,
+    'parquet': ParquetRowWriter,
+}
+
+
+def format_for(path: str, export_format: str | None = None) -> str:
+    if export_format is None:
+        export_format = os.path.splitext(path)[1].lstrip('.').lower()
+    if export_format not in FORMATS:
+        raise ValueError(f'Unsupported export format {export_format!r}; expected one of {FORMATS}')
+    return export_format
+
+
+def export_tracking(results,
+                    status_path: str,
+                    events_path: str | None = None,
+                    export_format: str | None = None,
+                    chunk_size: int = 10000) -> dict:
+    """
+    Export (reference, reference_type, response_dict) triples; returns the row counts written.
+    """
+    status_writer = WRITERS[format_for(status_path, export_format)](status_path, STATUS_COLUMNS, chunk_size)
+    event_writer = None
+    try:
+        if events_path is not None:
+            event_writer = WRITERS[format_for(events_path, export_format)](events_path, EVENT_COLUMNS, chunk_size)
+        for reference, reference_type, response_dict in results:
+            statuses, events = normalize(response_dict, reference, reference_type)
+            status_writer.write_many(statuses)
+            if event_writer is not None:
+                event_writer.write_many(events)
+    finally:
+        status_writer.close()
+        if event_writer is not None:
+            event_writer.close()
+    return {'status_rows': status_writer.rows_written,
+            'event_rows' : event_writer.rows_written if event_writer is not None else 0}
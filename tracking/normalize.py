@@ -0,0 +1,258 @@
+"""
+Flatten get_tracking_data responses into fixed-schema status and event rows.
+
+The tracking XML is looked up through FIELD_ALIASES, a table of the element names each column may
+appear under, so a renamed element only needs a new alias here.  Shipments are the SHIPMENT
+elements found anywhere in the document; events are the EVENT/HISTORY entries inside a shipment.
+"""
+from datetime import datetime
+from enum import Enum
+from typing import IO
+from xml.parsers import expat
+
+STATUS_COLUMNS = ('reference', 'reference_type', 'pro', 'status_code', 'status', 'timestamp',
+                  'expected_delivery', 'terminal', 'city', 'state', 'country', 'weight', 'pieces')
+EVENT_COLUMNS = ('reference', 'reference_type', 'pro', 'sequence', 'status_code', 'status', 'timestamp',
+                 'terminal', 'city', 'state', 'country')
+
+FIELD_ALIASES = {
+    'pro'               : ('PRO', 'PRONUMBER', 'PRONUM', 'ProNumber'),
+    'bol'               : ('BOL', 'BOLNUMBER', 'BOLNUM', 'BolNumber'),
+    'po'                : ('PO', 'PONUMBER', 'PONUM', 'PurchaseOrder'),
+    'customer_reference': ('CUSTREF', 'CRN', 'CUSTOMERREFERENCE', 'CustomerReference'),
+    'status_code'       : ('STATUSCODE', 'SHIPMENTSTATUSCODE', 'CODE', 'StatusCode'),
+    'status'            : ('SHIPMENTSTATUS', 'STATUS', 'STATUSDESCRIPTION', 'DESCRIPTION', 'Status'),
+    'date'              : ('STATUSDATE', 'EVENTDATE', 'DATE', 'Date'),
+    'time'              : ('STATUSTIME', 'EVENTTIME', 'TIME', 'Time'),
+    'expected_delivery' : ('EXPECTEDDELIVERYDATE', 'DUEDATE', 'ESTIMATEDDELIVERYDATE', 'DELIVERYDATE'),
+    'terminal'          : ('TERMINAL', 'TERMINALNAME', 'CURRENTTERMINAL', 'Terminal'),
+    'city'              : ('CITY', 'STATUSCITY', 'EVENTCITY', 'City'),
+    'state'             : ('STATE', 'STATUSSTATE', 'EVENTSTATE', 'State'),
+    'country'           : ('COUNTRY', 'STATUSCOUNTRY', 'Country'),
+    'weight'            : ('WEIGHT', 'TOTALWEIGHT', 'Weight'),
+    'pieces'            : ('PIECES', 'TOTALPIECES', 'Pieces'),
+}
+SHIPMENT_TAGS = ('SHIPMENT', 'Shipment')
+EVENT_CONTAINER_TAGS = ('EVENTS', 'HISTORY', 'SHIPMENTHISTORY', 'Events')
+EVENT_TAGS = ('EVENT', 'HISTORYITEM', 'Event')
+HISTORY_TAGS = EVENT_CONTAINER_TAGS + EVENT_TAGS
+
+DATE_FORMATS = ('%m/%d/%Y', '%m/%d/%y', '%Y-%m-%d', '%Y%m%d')
+TIME_FORMATS = ('%H:%M', '%H:%M:%S', '%I:%M %p', '%I:%M%p', '%H%M')
+
+
+def text(value) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        value = value.get('#text')
+        if value is None:
+            return None
+    value = str(value).strip()
+    return value or None
+
+
+def field(node: dict, name: str) -> str | None:
+    for alias in FIELD_ALIASES[name]:
+        if alias in node:
+            return text(node[alias])
+    return None
+
+
+def field_values(node: dict, name: str) -> list[str]:
+    # every value of a field that may repeat, such as the PO numbers of a shipment
+    for alias in FIELD_ALIASES[name]:
+        if alias in node:
+            return [value for value in map(text, as_list(node[alias])) if value is not None]
+    return []
+
+
+def as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def parse_timestamp(date_text: str | None, time_text: str | None = None) -> str | None:
+    """
+    ISO 8601 string for a tracking date and optional time, or the raw text when it cannot be parsed.
+    """
+    if date_text is None:
+        return None
+    for date_format in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(date_text, date_format)
+            break
+        except ValueError:
+            continue
+    else:
+        return date_text
+    if time_text:
+        for time_format in TIME_FORMATS:
+            try:
+                clock = datetime.strptime(time_text.upper(), time_format)
+                parsed = parsed.replace(hour=clock.hour, minute=clock.minute, second=clock.second)
+                break
+            except ValueError:
+                continue
+    return parsed.isoformat()
+
+
+def find_shipments(node) -> list[dict]:
+    found = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, list):
+            stack.extend(reversed(current))
+        elif isinstance(current, dict):
+            for key, value in current.items():
+                if key in SHIPMENT_TAGS:
+                    found.extend(item for item in as_list(value) if isinstance(item, dict))
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
+    return found
+
+
+def find_events(shipment: dict) -> list[dict]:
+    for container_tag in EVENT_CONTAINER_TAGS:
+        container = shipment.get(container_tag)
+        if isinstance(container, dict):
+            for event_tag in EVENT_TAGS:
+                if event_tag in container:
+                    return [event for event in as_list(container[event_tag]) if isinstance(event, dict)]
+    for event_tag in EVENT_TAGS:
+        if event_tag in shipment:
+            return [event for event in as_list(shipment[event_tag]) if isinstance(event, dict)]
+    return []
+
+
+def reference_type_name(reference_type: Enum | str | None) -> str | None:
+    # a TrackingRefereceTypes member; not imported, so tracking.tracking can depend on this module
+    if isinstance(reference_type, Enum):
+        return reference_type.name
+    return reference_type
+
+
+def status_row(reference: str, reference_type, shipment: dict) -> dict:
+    return {
+        'reference'        : reference,
+        'reference_type'   : reference_type_name(reference_type),
+        'pro'              : field(shipment, 'pro'),
+        'status_code'      : field(shipment, 'status_code'),
+        'status'           : field(shipment, 'status'),
+        'timestamp'        : parse_timestamp(field(shipment, 'date'), field(shipment, 'time')),
+        'expected_delivery': parse_timestamp(field(shipment, 'expected_delivery')),
+        'terminal'         : field(shipment, 'terminal'),
+        'city'             : field(shipment, 'city'),
+        'state'            : field(shipment, 'state'),
+        'country'          : field(shipment, 'country'),
+        'weight'           : field(shipment, 'weight'),
+        'pieces'           : field(shipment, 'pieces'),
+    }
+
+
+def event_rows(reference: str, reference_type, shipment: dict, pro: str | None = None):
+    pro = pro if pro is not None else field(shipment, 'pro')
+    reference_type = reference_type_name(reference_type)
+    for sequence, event in enumerate(find_events(shipment), start=1):
+        yield {
+            'reference'     : reference,
+            'reference_type': reference_type,
+            'pro'           : pro,
+            'sequence'      : sequence,
+            'status_code'   : field(event, 'status_code'),
+            'status'        : field(event, 'status'),
+            'timestamp'     : parse_timestamp(field(event, 'date'), field(event, 'time')),
+            'terminal'      : field(event, 'terminal'),
+            'city'          : field(event, 'city'),
+            'state'         : field(event, 'state'),
+            'country'       : field(event, 'country'),
+        }
+
+
+def normalize(response_dict: dict | None, reference: str, reference_type) -> tuple[list[dict], list[dict]]:
+    """
+    (status rows, event rows) for one tracking response.
+    """
+    statuses = []
+    events = []
+    for shipment in find_shipments(response_dict):
+        row = status_row(reference, reference_type, shipment)
+        statuses.append(row)
+        events.extend(event_rows(reference, reference_type, shipment, row['pro']))
+    return statuses, events
+
+
+def check_fields(fields):
+    unknown = [name for name in fields if name not in FIELD_ALIASES]
+    if unknown:
+        raise ValueError(f'Unknown tracking fields: {", ".join(unknown)} (known: {", ".join(FIELD_ALIASES)})')
+
+
+class _ProjectionDone(Exception):
+    pass
+
+
+def project(stream: IO[bytes], fields: list[str]) -> dict:
+    """
+    The given fields of the first shipment in a tracking response, read with a streaming expat
+    scan that builds no elements and stops as soon as the fields are found, so the event history
+    is neither parsed into dicts nor, usually, read at all.
+
+    Fields are FIELD_ALIASES names and values are the element text, as field() returns it.  The scan
+    stops at the first alias of every field, or at the event history once each field has some alias,
+    taking the shipment's own fields to come before its history.
+    """
+    names = tuple(dict.fromkeys(fields))
+    check_fields(names)
+    wanted = {}
+    for name in names:
+        for priority, alias in enumerate(FIELD_ALIASES[name]):
+            wanted.setdefault(alias, []).append((name, priority))
+    found = {}
+    # depth of the current element, depth of the first SHIPMENT, and the text of a wanted field
+    state = {'depth': 0, 'shipment': None, 'capture': None}
+    chunks = []
+
+    def start(tag, attributes):
+        state['depth'] += 1
+        shipment = state['shipment']
+        if shipment is None:
+            if tag in SHIPMENT_TAGS:
+                state['shipment'] = state['depth']
+        elif state['depth'] == shipment + 1:
+            if tag in HISTORY_TAGS and len(found) == len(names):
+                raise _ProjectionDone
+            if tag in wanted:
+                state['capture'] = tag
+                chunks.clear()
+
+    def characters(data):
+        if state['capture'] is not None and state['depth'] == state['shipment'] + 1:
+            chunks.append(data)
+
+    def end(tag):
+        if state['shipment'] is not None:
+            if state['depth'] == state['shipment']:
+                raise _ProjectionDone
+            if state['capture'] is not None and state['depth'] == state['shipment'] + 1:
+                value = text(''.join(chunks))
+                state['capture'] = None
+                if value is not None:
+                    for name, priority in wanted[tag]:
+                        if name not in found or priority < found[name][0]:
+                            found[name] = (priority, value)
+                    if all(found.get(name, (1,))[0] == 0 for name in names):
+                        raise _ProjectionDone
+        state['depth'] -= 1
+
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = characters
+    try:
+        parser.ParseFile(stream)
+    except _ProjectionDone:
+        pass
+    return {name: found[name][1] if name in found else None for name in names}
@@ -0,0 +1,251 @@
+"""
+Reconcile submitted BOLs against ArcBest tracking.
+
+Reads a stream of BOL submission records (the ReferenceNumbers.bol_number sent with get_bol and the
+PRO that came back), looks every one up concurrently with get_tracking_data (by PRO when the record
+has one, by BillOfLading otherwise) and writes a row for every discrepancy found:
+
+    not-found         ArcBest has no shipment for the PRO / BOL
+    lookup-failed     the tracking call raised or got a non-200 answer
+    not-picked-up     the shipment exists but has no status yet, or a pending status code
+    pro-mismatch      the tracked shipment has a different PRO than the one recorded
+    bol-mismatch      tracking by PRO found a shipment without the recorded BOL number
+    multiple-shipments tracking by BOL found more than one shipment
+    duplicate-bol     the BOL number was submitted more than once
+    duplicate-pro     two submissions share a PRO
+    weight-mismatch   the tracked weight differs from the submitted weight by more than weight_tolerance
+    pieces-mismatch   the tracked piece count differs from the submitted one
+    invalid-record    the record's weight or pieces is not a number
+
+Records are pulled lazily and results joined as they complete, so memory is bounded by the calls in
+flight and the writer's chunk, plus one entry per distinct BOL and PRO for duplicate detection.
+
+    python -m tracking.reconcile submissions.csv discrepancies.csv -p 16
+
+The records file is CSV or JSONL with bol_number, pro and optional weight and pieces columns.
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+
+from bulk import run_bulk
+from tracking.export import WRITERS, format_for
+from tracking.normalize import field, field_values, find_shipments
+from tracking.reference_index import _pro_node, clean
+from tracking.tracking import TrackingRefereceTypes, get_tracking_data
+
+DISCREPANCY_COLUMNS = ('bol_number', 'pro', 'kind', 'detail', 'expected', 'actual')
+# status codes of shipments that are booked but not picked up yet
+PENDING_STATUS_CODES = ('BK', 'NS', 'PE', 'SC')
+DEFAULT_WEIGHT_TOLERANCE = 0.02
+
+
+def _number(value) -> float | None:
+    try:
+        return float(str(value).replace(',', ''))
+    except (TypeError, ValueError):
+        return None
+
+
+class SubmissionRecord:
+    def __init__(self, bol_number: str | None, pro: str | None = None, weight: float | None = None,
+                 pieces: int | None = None):
+        self.bol_number = clean(bol_number)
+        self.pro = clean(pro)
+        # (field, raw value) for values that are not numbers; reported, not raised, so one bad
+        # cell does not stop a reconciliation run
+        self.invalid = []
+        self.weight = self._parse('weight', weight)
+        pieces = self._parse('pieces', pieces)
+        self.pieces = int(pieces) if pieces is not None else None
+
+    def _parse(self, name: str, value) -> float | None:
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return None
+        number = _number(value)
+        if number is None:
+            self.invalid.append((name, value))
+        return number
+
+    def as_dict(self):
+        return {
+            'bol_number': self.bol_number,
+            'pro'       : self.pro,
+            'weight'    : self.weight,
+            'pieces'    : self.pieces,
+        }
+
+
+def submission_record(reference_numbers, response_dict: dict | None, commodity_lines=None) -> SubmissionRecord:
+    """
+    The record of one get_bol call: its ReferenceNumbers (one or a list), the parsed response and
+    optionally the commodity lines, whose weights and handling units are summed.
+    """
+    numbers = reference_numbers[0] if isinstance(reference_numbers, list) else reference_numbers
+    node = _pro_node(response_dict)
+    weight = pieces = None
+    if commodity_lines:
+        weight = sum(line.total_weight or 0 for line in commodity_lines)
+        pieces = sum(line.number_of_handling_units or 0 for line in commodity_lines)
+    return SubmissionRecord(numbers.bol_number if numbers is not None else None,
+                            field(node, 'pro') if node is not None else None, weight, pieces)
+
+
+def read_records(path: str):
+    """
+    SubmissionRecords from a CSV or JSONL file, read lazily.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        rows = (json.loads(line) for line in f if line.strip()) if path.endswith('.jsonl') else csv.DictReader(f)
+        for row in rows:
+            yield SubmissionRecord(row.get('bol_number'), row.get('pro'), row.get('weight'), row.get('pieces'))
+
+
+def _shipment(shipment: dict) -> dict:
+    # the few fields reconciliation needs, so a worker does not hand back the whole response
+    return {
+        'pro'        : clean(field(shipment, 'pro')),
+        'bols'       : [clean(value) for value in field_values(shipment, 'bol')],
+        'status_code': field(shipment, 'status_code'),
+        'status'     : field(shipment, 'status'),
+        'weight'     : _number(field(shipment, 'weight')),
+        'pieces'     : _number(field(shipment, 'pieces')),
+    }
+
+
+def lookup(record: SubmissionRecord, **tracking_kwargs) -> list[dict] | None:
+    """
+    The shipments ArcBest tracks for a record, or None when the call got a non-200 answer.
+    """
+    if record.pro is not None:
+        response = get_tracking_data(record.pro, TrackingRefereceTypes.ArcBestPro, **tracking_kwargs)
+    else:
+        response = get_tracking_data(record.bol_number, TrackingRefereceTypes.BillOfLading, **tracking_kwargs)
+    if response is None:
+        return None
+    return [_shipment(shipment) for shipment in find_shipments(response)]
+
+
+class Reconciler:
+    def __init__(self, writer, weight_tolerance: float = DEFAULT_WEIGHT_TOLERANCE):
+        self.writer = writer
+        self.weight_tolerance = weight_tolerance
+        self.records = 0
+        self.ok = 0
+        self.counts = {}
+        # BOL number / PRO -> the first record it was seen on
+        self._bols = {}
+        self._pros = {}
+
+    def report(self, record: SubmissionRecord, kind: str, detail: str, expected=None, actual=None, pro=None):
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        self.writer.write({'bol_number': record.bol_number, 'pro': pro or record.pro, 'kind': kind,
+                           'detail': detail, 'expected': expected, 'actual': actual})
+
+    def _seen(self, seen: dict, value: str | None, number: int) -> int | None:
+        # the earlier record carrying the same value, if any
+        if value is None:
+            return None
+        first = seen.setdefault(value, number)
+        return first if first != number else None
+
+    def check(self, number: int, record: SubmissionRecord, shipments: list[dict] | None, error=None) -> int:
+        """
+        Report the discrepancies of one record (its position in the input, its lookup result); returns
+        how many were found.
+        """
+        reported = sum(self.counts.values())
+        self.records += 1
+        first = self._seen(self._bols, record.bol_number, number)
+        if first is not None:
+            self.report(record, 'duplicate-bol', f'BOL number also on record {first + 1}')
+        for name, value in record.invalid:
+            self.report(record, 'invalid-record', f'{name} is not a number; not compared', actual=value)
+        if error is not None or shipments is None:
+            detail = f'{type(error).__name__}: {error}' if error is not None else 'tracking call failed'
+            self.report(record, 'lookup-failed', detail)
+        elif not shipments:
+            self.report(record, 'not-found', 'ArcBest has no shipment for this '
+                        + ('PRO' if record.pro is not None else 'BOL number'))
+        else:
+            self._check_shipments(number, record, shipments)
+        if sum(self.counts.values()) == reported:
+            self.ok += 1
+        return sum(self.counts.values()) - reported
+
+    def _check_shipments(self, number: int, record: SubmissionRecord, shipments: list[dict]):
+        if len(shipments) > 1:
+            self.report(record, 'multiple-shipments', f'{len(shipments)} shipments found for the BOL number',
+                        actual=','.join(shipment['pro'] or '' for shipment in shipments))
+        shipment = shipments[0]
+        pro = record.pro or shipment['pro']
+        if record.pro is not None and shipment['pro'] is not None and shipment['pro'] != record.pro:
+            self.report(record, 'pro-mismatch', 'tracked PRO differs from the recorded PRO',
+                        record.pro, shipment['pro'])
+        if record.pro is not None and record.bol_number is not None and shipment['bols'] \
+                and record.bol_number not in shipment['bols']:
+            self.report(record, 'bol-mismatch', 'the tracked shipment does not carry this BOL number',
+                        record.bol_number, ','.join(shipment['bols']))
+        first = self._seen(self._pros, pro, number)
+        if first is not None:
+            self.report(record, 'duplicate-pro', f'PRO also on record {first + 1}', pro=pro)
+        if (shipment['status_code'] is None and shipment['status'] is None) \
+                or shipment['status_code'] in PENDING_STATUS_CODES:
+            self.report(record, 'not-picked-up', f'status {shipment["status_code"] or shipment["status"]}', pro=pro)
+        if record.weight and shipment['weight'] is not None \
+                and abs(shipment['weight'] - record.weight) > record.weight * self.weight_tolerance:
+            self.report(record, 'weight-mismatch', f'tracked weight differs by more than {self.weight_tolerance:.0%}',
+                        record.weight, shipment['weight'], pro=pro)
+        if record.pieces is not None and shipment['pieces'] is not None and shipment['pieces'] != record.pieces:
+            self.report(record, 'pieces-mismatch', 'tracked piece count differs', record.pieces,
+                        int(shipment['pieces']), pro=pro)
+
+    def summary(self) -> dict:
+        return {'records': self.records, 'ok': self.ok, 'discrepancies': dict(sorted(self.counts.items()))}
+
+
+def reconcile(records, output_path: str, parallel: int = 8, weight_tolerance: float = DEFAULT_WEIGHT_TOLERANCE,
+              export_format: str | None = None, **tracking_kwargs) -> dict:
+    """
+    Reconcile SubmissionRecords, writing discrepancy rows to output_path (csv, jsonl or parquet);
+    tracking_kwargs (arcbest_api_key, timeout, ...) go to get_tracking_data.  Returns a summary.
+    """
+    writer = WRITERS[format_for(output_path, export_format)](output_path, DISCREPANCY_COLUMNS)
+    reconciler = Reconciler(writer, weight_tolerance)
+    try:
+        for result in run_bulk(lambda record: lookup(record, **tracking_kwargs), records, parallel=parallel):
+            reconciler.check(result.index, result.item, result.result, result.error)
+    finally:
+        writer.close()
+    return reconciler.summary()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m tracking.reconcile',
+                                     description='Reconcile submitted BOLs against ArcBest tracking')
+    parser.add_argument('records', help='CSV or JSONL with bol_number, pro and optional weight and pieces')
+    parser.add_argument('output', help='discrepancy file (.csv, .jsonl or .parquet)')
+    parser.add_argument('-p', '--parallel', type=int, default=8, help='lookups in flight (default: 8)')
+    parser.add_argument('--weight-tolerance', type=float, default=DEFAULT_WEIGHT_TOLERANCE,
+                        help=f'allowed weight difference as a fraction (default: {DEFAULT_WEIGHT_TOLERANCE})')
+    parser.add_argument('--timeout', type=float, help='total seconds per lookup, retries included')
+    parser.add_argument('--verbose', action='store_true', help='show the SDK request/response logging')
+    args = parser.parse_args(argv)
+
+    chatter = sys.stderr if args.verbose else open(os.devnull, 'w')
+    try:
+        with contextlib.redirect_stdout(chatter):
+            summary = reconcile(read_records(args.records), args.output, parallel=args.parallel,
+                                weight_tolerance=args.weight_tolerance, timeout=args.timeout)
+    finally:
+        if chatter is not sys.stderr:
+            chatter.close()
+    print(json.dumps(summary), file=sys.stderr)
+    return 1 if summary['discrepancies'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""
+Persistent index from PO, BOL and customer reference numbers to ArcBest PRO numbers.
+
+Tracking by PRO is the fast, unambiguous lookup, but customers mostly hand us their own references.
+The index learns reference -> PRO pairs from every tracking response (the BOL, PO and customer
+reference fields of each shipment, and the reference that was looked up) and from every get_bol
+response (the ReferenceNumbers that were submitted, against the PRO that came back).  Once a
+reference maps to exactly one PRO, get_tracking_data looks it up by PRO instead; a reference that
+maps to several PROs is left to ArcBest to resolve.
+
+    reference_index.set_reference_index(ReferenceIndex('references.sqlite'))
+
+The index is a SQLite file, so it survives restarts and can be shared by processes on one host.
+"""
+import sqlite3
+import threading
+import time
+from enum import Enum
+
+from tracking.normalize import FIELD_ALIASES, SHIPMENT_TAGS, field, field_values, find_shipments
+
+# TrackingRefereceTypes values, which tracking.tracking owns
+BOL_TYPE = 'B'
+PO_TYPE = 'P'
+CUSTOMER_REFERENCE_TYPE = 'C'
+ROUTED_TYPES = (BOL_TYPE, PO_TYPE, CUSTOMER_REFERENCE_TYPE)
+# response field -> reference type learned from it
+REFERENCE_FIELDS = (('bol', BOL_TYPE), ('po', PO_TYPE), ('customer_reference', CUSTOMER_REFERENCE_TYPE))
+# references are reused (a customer's PO numbering wraps, a BOL number is retyped), so old
+# mappings stop being trusted after this many seconds
+DEFAULT_MAX_AGE = 180 * 24 * 3600
+
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reference_pro (
+    reference_type TEXT NOT NULL,
+    reference      TEXT NOT NULL,
+    pro            TEXT NOT NULL,
+    source         TEXT NOT NULL,
+    first_seen     REAL NOT NULL,
+    last_seen      REAL NOT NULL,
+    PRIMARY KEY (reference_type, reference, pro)
+) WITHOUT ROWID
+"""
+UPSERT = """
+INSERT INTO reference_pro (reference_type, reference, pro, source, first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (reference_type, reference, pro) DO UPDATE SET source = excluded.source, last_seen = excluded.last_seen
+"""
+# merging exported rows keeps the earliest first_seen and the latest last_seen
+MERGE = """
+INSERT INTO reference_pro (reference_type, reference, pro, source, first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (reference_type, reference, pro) DO UPDATE SET
+    first_seen = min(first_seen, excluded.first_seen),
+    last_seen  = max(last_seen, excluded.last_seen)
+"""
+
+
+def type_code(reference_type: Enum | str) -> str:
+    return reference_type.value if isinstance(reference_type, Enum) else str(reference_type)
+
+
+def clean(reference) -> str | None:
+    if reference is None:
+        return None
+    reference = str(reference).strip().upper()
+    return reference or None
+
+
+def _pro_node(node) -> dict | None:
+    # the dict carrying the PRO in a BOL response, outside of any tracking SHIPMENT element
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, list):
+            stack.extend(reversed(current))
+        elif isinstance(current, dict):
+            if any(alias in current for alias in FIELD_ALIASES['pro']):
+                return current
+            stack.extend(value for key, value in current.items()
+                         if key not in SHIPMENT_TAGS and isinstance(value, (dict, list)))
+    return None
+
+
+class ReferenceIndex:
+    def __init__(self, path: str = ':memory:', max_age: float | None = DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            version = self._connection.execute('PRAGMA user_version').fetchone()[0]
+            if version not in (0, SCHEMA_VERSION):
+                raise ValueError(f'Unsupported reference index version {version} in {path}')
+            if path != ':memory:':
+                self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(SCHEMA)
+            self._connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self.lookups = 0
+        self.hits = 0
+        self.ambiguous = 0
+        self.stale = 0
+        self.learned = 0
+
+    def learn(self, pairs, source: str) -> int:
+        """
+        Store (reference type, reference, PRO) triples; returns how many were usable.
+        """
+        now = time.time()
+        rows = []
+        for reference_type, reference, pro in pairs:
+            reference_type, reference, pro = type_code(reference_type), clean(reference), clean(pro)
+            if reference_type in ROUTED_TYPES and reference and pro:
+                rows.append((reference_type, reference, pro, source, now, now))
+        if rows:
+            with self._lock, self._connection:
+                self._connection.executemany(UPSERT, rows)
+                self.learned += len(rows)
+        return len(rows)
+
+    def learn_tracking(self, response_dict: dict | None, reference: str | None = None,
+                       reference_type: Enum | str | None = None) -> int:
+        """
+        Learn from a get_tracking_data response, including the reference it was looked up by.
+        """
+        pairs = []
+        for shipment in find_shipments(response_dict):
+            pro = field(shipment, 'pro')
+            if pro is None:
+                continue
+            for name, code in REFERENCE_FIELDS:
+                pairs.extend((code, value, pro) for value in field_values(shipment, name))
+            if reference is not None and reference_type is not None:
+                pairs.append((reference_type, reference, pro))
+        return self.learn(pairs, 'tracking')
+
+    def learn_bol(self, response_dict: dict | None, reference_numbers: list | None = None) -> int:
+        """
+        Learn from a get_bol response and the ReferenceNumbers submitted with it.
+        """
+        node = _pro_node(response_dict)
+        pro = field(node, 'pro') if node is not None else None
+        if pro is None:
+            return 0
+        pairs = [(BOL_TYPE, value, pro) for value in field_values(node, 'bol')]
+        for numbers in reference_numbers or ():
+            pairs.extend(((BOL_TYPE, numbers.bol_number, pro),
+                          (PO_TYPE, numbers.actual_po_number, pro),
+                          (CUSTOMER_REFERENCE_TYPE, numbers.customer_reference_number, pro)))
+        return self.learn(pairs, 'bol')
+
+    def pros(self, reference: str, reference_type: Enum | str) -> list[str]:
+        query = 'SELECT pro FROM reference_pro WHERE reference_type = ? AND reference = ?'
+        parameters = [type_code(reference_type), clean(reference)]
+        if self.max_age is not None:
+            query += ' AND last_seen >= ?'
+            parameters.append(time.time() - self.max_age)
+        with self._lock:
+            return [row[0] for row in self._connection.execute(query + ' ORDER BY last_seen DESC', parameters)]
+
+    def resolve(self, reference: str, reference_type: Enum | str) -> str | None:
+        """
+        The PRO to track this reference by, or None when it is unknown or maps to several PROs.
+        """
+        if type_code(reference_type) not in ROUTED_TYPES:
+            return None
+        pros = self.pros(reference, reference_type)
+        with self._lock:
+            self.lookups += 1
+            if len(pros) == 1:
+                self.hits += 1
+                return pros[0]
+            if pros:
+                self.ambiguous += 1
+        return None
+
+    def forget(self, reference: str, reference_type: Enum | str, pro: str):
+        """
+        Drop a mapping that routed a lookup to a PRO ArcBest no longer finds.
+        """
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM reference_pro WHERE reference_type = ? AND reference = ? AND pro = ?',
+                                     (type_code(reference_type), clean(reference), clean(pro)))
+            self.stale += 1
+
+    def export_rows(self) -> list[tuple]:
+        """
+        Every mapping still young enough to be trusted, as (reference type, reference, PRO, source,
+        first seen, last seen) rows.
+        """
+        query = 'SELECT reference_type, reference, pro, source, first_seen, last_seen FROM reference_pro'
+        parameters = []
+        if self.max_age is not None:
+            query += ' WHERE last_seen >= ?'
+            parameters.append(time.time() - self.max_age)
+        with self._lock:
+            return [tuple(row) for row in self._connection.execute(query, parameters)]
+
+    def import_rows(self, rows) -> int:
+        rows = [tuple(row) for row in rows]
+        if self.max_age is not None:
+            cutoff = time.time() - self.max_age
+            rows = [row for row in rows if row[5] >= cutoff]
+        if rows:
+            with self._lock, self._connection:
+                self._connection.executemany(MERGE, rows)
+        return len(rows)
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM reference_pro').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def stats(self) -> dict:
+        entries = len(self)
+        return {
+            'entries'  : entries,
+            'learned'  : self.learned,
+            'lookups'  : self.lookups,
+            'hits'     : self.hits,
+            'misses'   : self.lookups - self.hits,
+            'ambiguous': self.ambiguous,
+            'stale'    : self.stale,
+            'hit_rate' : self.hits / self.lookups if self.lookups else 0.0,
+        }
+
+
+_reference_index = None
+
+
+def get_reference_index() -> ReferenceIndex | None:
+    return _reference_index
+
+
+def set_reference_index(index: ReferenceIndex | None) -> None:
+    global _reference_index
+    _reference_index = index
@@ -0,0 +1,340 @@
+"""
+Compact in-memory store for bulk tracking results.
+
+Keeping normalized rows (or xmltodict results) for hundreds of thousands of shipments costs a dict
+and a string object per field, although most values repeat: a handful of status codes, a few
+hundred terminals and cities, fifty states.  The store keeps the rows of normalize() in columns:
+
+- repeated strings (status, terminal, city, state, weight, ...) are dictionary-encoded, each
+  distinct value stored once and every row holding a 2-byte (or 4-byte) code;
+- all-digit PRO and reference numbers are stored as 8-byte integers;
+- timestamps are stored as integer seconds;
+- column names are shared by all rows instead of repeated in a dict per row.
+
+    store = TrackingStore()
+    store.add(response_dict, reference, TrackingRefereceTypes.ArcBestPro)
+    shipment = store.latest('123456789')
+    shipment.status, shipment.timestamp, shipment.events()
+
+Rows read back equal the rows normalize() produced.  Adding a shipment whose PRO is already stored
+updates its row in place, so a status cache refreshed on a schedule stays the size of the set of
+shipments it tracks.  The refreshed shipment's old events are left behind in the event columns and
+reclaimed by compact(), which runs on its own once they outnumber the live events.
+"""
+import calendar
+from array import array
+from datetime import datetime, timedelta
+
+from tracking.normalize import STATUS_COLUMNS, event_rows, find_shipments, status_row
+
+EPOCH = datetime(1970, 1, 1)
+# columns stored as integer seconds; the others that are not numbers are dictionary-encoded
+TIMESTAMP_COLUMNS = ('timestamp', 'expected_delivery')
+NUMBER_COLUMNS = ('reference', 'pro')
+EVENT_VALUE_COLUMNS = ('status_code', 'status', 'timestamp', 'terminal', 'city', 'state', 'country')
+# dead events tolerated before compact() runs on its own
+COMPACT_MIN_DEAD_EVENTS = 65536
+
+
+class StringDictionary:
+    """
+    Distinct strings of a column, each stored once; code 0 is None.
+    """
+    def __init__(self):
+        self.values = [None]
+        self.codes = {None: 0}
+
+    def code(self, value: str | None) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self):
+        return len(self.values) - 1
+
+
+class StringColumn:
+    def __init__(self, dictionary: StringDictionary):
+        self.dictionary = dictionary
+        self.codes = array('H')
+
+    def _code(self, value: str | None) -> int:
+        code = self.dictionary.code(value)
+        if code > 0xffff and self.codes.typecode == 'H':
+            self.codes = array('I', self.codes)
+        return code
+
+    def append(self, value: str | None):
+        self.codes.append(self._code(value))
+
+    def __setitem__(self, row: int, value: str | None):
+        self.codes[row] = self._code(value)
+
+    def __getitem__(self, row: int) -> str | None:
+        return self.dictionary.values[self.codes[row]]
+
+
+class NumberColumn:
+    """
+    Identifiers that are usually all digits (PROs, references), as unsigned 64-bit integers; any
+    other value is kept as a string on the side.
+    """
+    NONE = 0xffffffffffffffff
+    OTHER = 0xfffffffffffffffe
+
+    def __init__(self):
+        self.numbers = array('Q')
+        self.other = {}
+
+    def _number(self, row: int, value: str | None) -> int:
+        self.other.pop(row, None)
+        if value is None:
+            return self.NONE
+        if value.isdigit() and value.isascii() and len(value) < 19 and (value[0] != '0' or value == '0'):
+            return int(value)
+        self.other[row] = value
+        return self.OTHER
+
+    def append(self, value: str | None):
+        self.numbers.append(self._number(len(self.numbers), value))
+
+    def __setitem__(self, row: int, value: str | None):
+        self.numbers[row] = self._number(row, value)
+
+    def __getitem__(self, row: int) -> str | None:
+        number = self.numbers[row]
+        if number == self.NONE:
+            return None
+        if number == self.OTHER:
+            return self.other[row]
+        return str(number)
+
+
+class TimestampColumn:
+    """
+    ISO 8601 timestamps as integer seconds; text that is not a timestamp is kept on the side.
+    """
+    NONE = -0x8000000000000000
+    OTHER = -0x7fffffffffffffff
+
+    def __init__(self):
+        self.seconds = array('q')
+        self.other = {}
+
+    def _seconds(self, row: int, value: str | None) -> int:
+        self.other.pop(row, None)
+        if value is None:
+            return self.NONE
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            parsed = None
+        if parsed is None or parsed.tzinfo is not None or parsed.microsecond or parsed.isoformat() != value:
+            self.other[row] = value
+            return self.OTHER
+        return calendar.timegm(parsed.timetuple())
+
+    def append(self, value: str | None):
+        self.seconds.append(self._seconds(len(self.seconds), value))
+
+    def __setitem__(self, row: int, value: str | None):
+        self.seconds[row] = self._seconds(row, value)
+
+    def __getitem__(self, row: int) -> str | None:
+        seconds = self.seconds[row]
+        if seconds == self.NONE:
+            return None
+        if seconds == self.OTHER:
+            return self.other[row]
+        return (EPOCH + timedelta(seconds=seconds)).isoformat()
+
+    def epoch(self, row: int) -> int | None:
+        seconds = self.seconds[row]
+        return None if seconds in (self.NONE, self.OTHER) else seconds
+
+
+class ShipmentView:
+    """
+    One shipment of a TrackingStore; columns read as attributes (shipment.status).
+    """
+    __slots__ = ('store', 'row')
+
+    def __init__(self, store: 'TrackingStore', row: int):
+        self.store = store
+        self.row = row
+
+    def __getattr__(self, name: str):
+        column = self.store.columns.get(name)
+        if column is None:
+            raise AttributeError(name)
+        return column[self.row]
+
+    def epoch(self, name: str = 'timestamp') -> int | None:
+        """
+        A timestamp column as seconds since the epoch (the tracking times carry no time zone).
+        """
+        return self.store.columns[name].epoch(self.row)
+
+    def as_dict(self) -> dict:
+        return {name: self.store.columns[name][self.row] for name in STATUS_COLUMNS}
+
+    def events(self) -> list[dict]:
+        store = self.store
+        start, end = store.event_starts[self.row], store.event_ends[self.row]
+        reference, reference_type, pro = self.reference, self.reference_type, self.pro
+        return [{'reference'     : reference,
+                 'reference_type': reference_type,
+                 'pro'           : pro,
+                 'sequence'      : event - start + 1,
+                 **{name: store.event_columns[name][event] for name in EVENT_VALUE_COLUMNS}}
+                for event in range(start, end)]
+
+    def __repr__(self):
+        return f'ShipmentView(pro={self.pro!r}, status={self.status!r})'
+
+
+class TrackingStore:
+    def __init__(self, events: bool = True):
+        self.keep_events = events
+        # one dictionary per column name, shared by the status and event columns
+        self.dictionaries = {}
+        self.columns = {}
+        for name in STATUS_COLUMNS:
+            self.columns[name] = self._column(name)
+        self.event_columns = {name: self._column(name) for name in EVENT_VALUE_COLUMNS}
+        # shipment row -> its span of the event columns
+        self.event_starts = array('I')
+        self.event_ends = array('I')
+        self.events_stored = 0
+        # events of refreshed shipments, still in the event columns until compact()
+        self.dead_events = 0
+        self.compactions = 0
+        # PRO -> row
+        self._rows = {}
+
+    def _column(self, name: str):
+        if name in TIMESTAMP_COLUMNS:
+            return TimestampColumn()
+        if name in NUMBER_COLUMNS:
+            return NumberColumn()
+        return StringColumn(self.dictionaries.setdefault(name, StringDictionary()))
+
+    def _append_events(self, events) -> tuple[int, int]:
+        start = self.events_stored
+        if self.keep_events:
+            for event in events:
+                for name in EVENT_VALUE_COLUMNS:
+                    self.event_columns[name].append(event.get(name))
+                self.events_stored += 1
+        return start, self.events_stored
+
+    def add_row(self, status: dict, events=()) -> int:
+        """
+        Store one normalize() status row and its event rows; returns the shipment's row number.  A
+        PRO that is already stored has its row and events replaced.
+        """
+        pro = status.get('pro')
+        row = self._rows.get(pro) if pro is not None else None
+        start, end = self._append_events(events)
+        if row is None:
+            row = len(self)
+            for name in STATUS_COLUMNS:
+                self.columns[name].append(status.get(name))
+            self.event_starts.append(start)
+            self.event_ends.append(end)
+            if pro is not None:
+                self._rows[pro] = row
+        else:
+            for name in STATUS_COLUMNS:
+                self.columns[name][row] = status.get(name)
+            self.dead_events += self.event_ends[row] - self.event_starts[row]
+            self.event_starts[row] = start
+            self.event_ends[row] = end
+            if self.dead_events > max(COMPACT_MIN_DEAD_EVENTS, self.events_stored - self.dead_events):
+                self.compact()
+        return row
+
+    def compact(self):
+        """
+        Drop the events of refreshed shipments and the dictionary values no row uses any more.
+        """
+        columns = {name: self.columns[name] for name in STATUS_COLUMNS}
+        event_columns = self.event_columns
+        event_starts, event_ends = self.event_starts, self.event_ends
+        self.dictionaries = {}
+        self.columns = {name: self._column(name) for name in STATUS_COLUMNS}
+        self.event_columns = {name: self._column(name) for name in EVENT_VALUE_COLUMNS}
+        self.event_starts = array('I')
+        self.event_ends = array('I')
+        self.events_stored = 0
+        for row in range(len(event_starts)):
+            for name in STATUS_COLUMNS:
+                self.columns[name].append(columns[name][row])
+            self.event_starts.append(self.events_stored)
+            for event in range(event_starts[row], event_ends[row]):
+                for name in EVENT_VALUE_COLUMNS:
+                    self.event_columns[name].append(event_columns[name][event])
+                self.events_stored += 1
+            self.event_ends.append(self.events_stored)
+        self.dead_events = 0
+        self.compactions += 1
+
+    def add(self, response_dict: dict | None, reference: str, reference_type) -> int:
+        """
+        Store the shipments of a get_tracking_data response; returns how many there were.
+        """
+        shipments = find_shipments(response_dict)
+        for shipment in shipments:
+            status = status_row(reference, reference_type, shipment)
+            events = event_rows(reference, reference_type, shipment, status['pro']) if self.keep_events else ()
+            self.add_row(status, events)
+        return len(shipments)
+
+    def extend(self, results) -> int:
+        """
+        Store (reference, reference_type, response_dict) triples, as export_tracking takes them.
+        """
+        return sum(self.add(response_dict, reference, reference_type)
+                   for reference, reference_type, response_dict in results)
+
+    def __len__(self):
+        return len(self.event_starts)
+
+    def __getitem__(self, row: int) -> ShipmentView:
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return ShipmentView(self, row)
+
+    def __iter__(self):
+        return (ShipmentView(self, row) for row in range(len(self)))
+
+    def latest(self, pro: str) -> ShipmentView | None:
+        """
+        The stored shipment for a PRO, as last added.
+        """
+        row = self._rows.get(pro)
+        return ShipmentView(self, row) if row is not None else None
+
+    def __contains__(self, pro: str) -> bool:
+        return pro in self._rows
+
+    def rows(self):
+        """
+        The status rows as dicts, in the order the shipments were first added (for
+        export_tracking's writers).
+        """
+        return (view.as_dict() for view in self)
+
+    def stats(self) -> dict:
+        return {
+            'shipments'   : len(self),
+            'events'      : self.events_stored - self.dead_events,
+            'dead_events' : self.dead_events,
+            'compactions' : self.compactions,
+            'pros'        : len(self._rows),
+            'dictionaries': {name: len(dictionary) for name, dictionary in self.dictionaries.items()},
+        }
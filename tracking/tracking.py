@@ -1,9 +1,12 @@
 import os
 from enum import Enum
 
-import requests
-import xmltodict
-
+import transport
+from key_pool import resolve_api_key
+from profiling import profile_call
+from tracking.normalize import check_fields, project
+from tracking.reference_index import get_reference_index
+from transport import ResponsePolicy
 from utils import pp
 
 class TrackingRefereceTypes(Enum):
@@ -15,23 +18,86 @@ class TrackingRefereceTypes(Enum):
 
 
 def get_tracking_data(tracking_number: str,
-                      reference_type: TrackingRefereceTypes, arcbest_api_key: str,
-                      arcbest_tracking_api_endpoint: str = "https://www.abfs.com/xml/tracexml.asp") -> dict | None:
+                      reference_type: TrackingRefereceTypes, arcbest_api_key: str | None = None,
+                      arcbest_tracking_api_endpoint: str = "https://www.abfs.com/xml/tracexml.asp",
+                      response_policy: ResponsePolicy | None = None,
+                      timeout: float | None = None,
+                      hedge: bool = False,
+                      fields: list[str] | None = None) -> dict | None:
+    """
+    With fields (tracking.normalize FIELD_ALIASES names such as 'status' and 'expected_delivery'),
+    only those fields of the first shipment are read from the response and returned as a flat dict.
+    """
+    if fields is not None:
+        check_fields(fields)
+    index = get_reference_index()
+    # the index learns from the PRO, so a projection has to read it too
+    scan_fields = fields if fields is None or index is None or 'pro' in fields else [*fields, 'pro']
+    lookup_arguments = dict(arcbest_api_key=arcbest_api_key, endpoint=arcbest_tracking_api_endpoint,
+                            response_policy=response_policy, timeout=timeout, hedge=hedge, fields=scan_fields)
+    if index is not None:
+        pro = index.resolve(tracking_number, reference_type)
+        if pro is not None:
+            print(f'Tracking {reference_type.name} {tracking_number} by PRO {pro} from the reference index')
+            response_dict = _lookup(pro, TrackingRefereceTypes.ArcBestPro, **lookup_arguments)
+            if response_dict is None or _learn(index, response_dict, tracking_number, reference_type, scan_fields):
+                return _without_extra_fields(response_dict, fields, scan_fields)
+            index.forget(tracking_number, reference_type, pro)
+
+    response_dict = _lookup(tracking_number, reference_type, **lookup_arguments)
+    if index is not None and response_dict is not None:
+        _learn(index, response_dict, tracking_number, reference_type, scan_fields)
+    return _without_extra_fields(response_dict, fields, scan_fields)
+
+
+def _learn(index, response_dict: dict, reference: str, reference_type: TrackingRefereceTypes,
+           fields: list[str] | None) -> int:
+    if fields is None:
+        return index.learn_tracking(response_dict, reference, reference_type)
+    return index.learn([(reference_type, reference, response_dict.get('pro'))], 'tracking')
+
+
+def _without_extra_fields(response_dict: dict | None, fields: list[str] | None, scan_fields: list[str] | None):
+    if response_dict is not None and scan_fields is not fields:
+        response_dict.pop('pro', None)
+    return response_dict
+
+
+def _lookup(tracking_number: str,
+            reference_type: TrackingRefereceTypes,
+            arcbest_api_key: str | None,
+            endpoint: str,
+            response_policy: ResponsePolicy | None,
+            timeout: float | None,
+            hedge: bool,
+            fields: list[str] | None) -> dict | None:
 
     response_dict = None
 
-    post_body = {
-        'ID': arcbest_api_key,
-        'RefNum': tracking_number,
-        'RefType': reference_type.value
-    }
-    print(f"Arcbest API request: {post_body}")
-    response = requests.post(url=arcbest_tracking_api_endpoint, params={'api_key': arcbest_api_key}, data=post_body)
-    if response.status_code == 200:
-        response_dict = xmltodict.parse(response.text)
-        print(f'Arcbest API response dict: {pp.pprint(response_dict)}')
-    else:
-        print(f'Arcbest API request failed with status code: {response.status_code}')
+    with profile_call('tracking') as profile:
+        with profile.phase('build'):
+            arcbest_api_key = resolve_api_key(arcbest_api_key)
+            post_body = {
+                'ID': arcbest_api_key,
+                'RefNum': tracking_number,
+                'RefType': reference_type.value
+            }
+        print(f"Arcbest API request: {post_body}")
+        with profile.phase('network'):
+            response = transport.post('tracking', endpoint, arcbest_api_key, post_body,
+                                      response_policy, timeout=timeout, hedge=hedge)
+        with response:
+            profile.annotate(status_code=response.status_code, response_bytes=response.size)
+            if response.status_code == 200:
+                with profile.phase('parse'):
+                    if fields is not None:
+                        response.body.seek(0)
+                        response_dict = project(response.body, fields)
+                    else:
+                        response_dict = transport.parse_xml(response)
+                print(f'Arcbest API response dict: {pp.pformat(response_dict)}')
+            else:
+                print(f'Arcbest API request failed with status code: {response.status_code}')
 
     return response_dict
 
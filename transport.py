@@ -0,0 +1,469 @@
+"""
+HTTP transport shared by get_quote, get_bol and get_tracking_data.
+
+Response bodies are streamed into a SpooledTemporaryFile instead of being read into response.text:
+bodies up to the spool threshold stay in memory, larger ones are written to a temporary file, and
+anything past the policy maximum is refused with ResponseTooLarge.  The XML is then parsed
+incrementally from the spool, so the raw document is never held in memory as one string.
+
+Every call runs against a Deadline: one time budget (DEFAULT_TIMEOUT unless the caller passes
+timeout=) that covers connecting, reading the body and any retries.  Transports receive it as
+post(..., deadline=) and give up with DeadlineExceeded once it has run out.
+
+Quote and tracking lookups are idempotent, so they can be hedged: with hedge=True a second request
+is sent once the first has been outstanding longer than the observed p95 for that endpoint, the
+first answer wins and the other request is cancelled.
+
+With a Scheduler installed (set_scheduler), every request first waits for a slot in the shared
+budget, in priority order across BOL, quote and tracking work.
+"""
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import IO
+from urllib.parse import parse_qsl, quote_plus
+
+import requests
+import xmltodict
+
+import key_pool
+from metrics import LatencyStats
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_CONNECT_TIMEOUT = 5.0
+# quote and tracking lookups can safely be sent twice; a BOL submission creates a shipment
+IDEMPOTENT_KINDS = ('quote', 'tracking')
+# post bodies are a dict of fields, or the same fields already form-encoded (request_templates)
+FORM_CONTENT_TYPE = 'application/x-www-form-urlencoded'
+ID_FIELD = re.compile(rb'(?:^|(?<=&))ID=[^&]*')
+
+
+class ResponseTooLarge(Exception):
+    def __init__(self, url: str, max_bytes: int, size: int | None = None):
+        self.url = url
+        self.max_bytes = max_bytes
+        self.size = size
+        detail = f'{size} bytes' if size is not None else 'body'
+        super().__init__(f'ArcBest response from {url} ({detail}) exceeds the {max_bytes} byte limit')
+
+
+class DeadlineExceeded(TimeoutError):
+    def __init__(self, url: str, budget: float):
+        self.url = url
+        self.budget = budget
+        super().__init__(f'ArcBest call to {url} did not finish within its {budget:g}s budget')
+
+
+class RequestCancelled(Exception):
+    def __init__(self, url: str):
+        self.url = url
+        super().__init__(f'ArcBest call to {url} was cancelled')
+
+
+class Deadline:
+    def __init__(self, budget: float, expires: float | None = None):
+        if budget <= 0:
+            raise ValueError('budget must be greater than 0')
+        self.budget = budget
+        self.expires = time.monotonic() + budget if expires is None else expires
+        self._cancelled = threading.Event()
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def child(self) -> 'Deadline':
+        # same expiry, but can be cancelled without cancelling the parent
+        return Deadline(self.budget, self.expires)
+
+    def check(self, url: str):
+        if self._cancelled.is_set():
+            raise RequestCancelled(url)
+        if self.expired:
+            raise DeadlineExceeded(url, self.budget)
+
+    def sleep(self, seconds: float, url: str):
+        self._cancelled.wait(min(seconds, self.remaining()))
+        self.check(url)
+
+    def timeouts(self, connect: float = DEFAULT_CONNECT_TIMEOUT) -> tuple[float, float]:
+        remaining = self.remaining()
+        return min(connect, remaining), remaining
+
+
+class RetryPolicy:
+    """
+    Retries for failed attempts, bounded by the call's deadline.  Idempotent kinds are retried on
+    connection errors, timeouts and the retry statuses; other kinds only when the connection could
+    not be opened, since the request has then certainly not reached ArcBest.
+    """
+    def __init__(self,
+                 attempts: int = 3,
+                 backoff: float = 0.25,
+                 max_backoff: float = 2.0,
+                 statuses: tuple = (502, 503, 504)):
+        if attempts < 1:
+            raise ValueError('attempts must be at least 1')
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = statuses
+
+    def delay(self, attempt: int) -> float:
+        return min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+
+    def retry_error(self, kind: str, attempt: int, error: Exception) -> bool:
+        if attempt >= self.attempts:
+            return False
+        if kind in IDEMPOTENT_KINDS:
+            return isinstance(error, (requests.ConnectionError, requests.Timeout))
+        return isinstance(error, requests.ConnectTimeout)
+
+    def retry_status(self, kind: str, attempt: int, status_code: int) -> bool:
+        return attempt < self.attempts and kind in IDEMPOTENT_KINDS and status_code in self.statuses
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+class HedgePolicy:
+    """
+    When to send the second request of a hedged call: after the given percentile of recent
+    latencies for the endpoint, or after initial_delay until min_samples calls have been timed.
+    """
+    def __init__(self,
+                 percentile: float = 95.0,
+                 min_samples: int = 20,
+                 initial_delay: float = 1.0,
+                 min_delay: float = 0.05):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+
+    def delay(self, stats: LatencyStats) -> float:
+        if stats.timed < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, stats.percentile(self.percentile))
+
+
+DEFAULT_HEDGE_POLICY = HedgePolicy()
+
+
+class ResponsePolicy:
+    def __init__(self,
+                 max_bytes: int = 50 * 1024 * 1024,
+                 spool_threshold: int = 1024 * 1024,
+                 chunk_size: int = 64 * 1024):
+        if spool_threshold > max_bytes:
+            raise ValueError('spool_threshold must not be larger than max_bytes')
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be greater than 0')
+        self.max_bytes = max_bytes
+        self.spool_threshold = spool_threshold
+        self.chunk_size = chunk_size
+
+
+DEFAULT_RESPONSE_POLICY = ResponsePolicy()
+
+
+class TransportResponse:
+    def __init__(self, status_code: int, body: IO[bytes], size: int):
+        self.status_code = status_code
+        self.body = body
+        self.size = size
+
+    def read(self) -> bytes:
+        self.body.seek(0)
+        return self.body.read()
+
+    def close(self):
+        self.body.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def form_fields(data: dict | bytes) -> dict:
+    """
+    The fields of a post body; a key repeated in form bytes (a list value in the dict) becomes a list.
+    """
+    if not isinstance(data, bytes):
+        return data
+    fields = {}
+    for key, value in parse_qsl(data.decode('ascii'), keep_blank_values=True):
+        if key not in fields:
+            fields[key] = value
+        elif isinstance(fields[key], list):
+            fields[key].append(value)
+        else:
+            fields[key] = [fields[key], value]
+    return fields
+
+
+def with_api_key(data: dict | bytes, api_key: str) -> dict | bytes:
+    if not isinstance(data, bytes):
+        return {**data, 'ID': api_key}
+    field = b'ID=' + quote_plus(api_key).encode('ascii')
+    replaced, count = ID_FIELD.subn(lambda match: field, data, count=1)
+    return replaced if count else (data + b'&' + field if data else field)
+
+
+def spool_chunks(url: str, chunks, policy: ResponsePolicy, deadline: Deadline | None = None) -> tuple[IO[bytes], int]:
+    spool = tempfile.SpooledTemporaryFile(max_size=policy.spool_threshold)
+    size = 0
+    try:
+        for chunk in chunks:
+            if deadline is not None:
+                deadline.check(url)
+            size += len(chunk)
+            if size > policy.max_bytes:
+                raise ResponseTooLarge(url, policy.max_bytes)
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, size
+
+
+class HttpTransport:
+    def __init__(self, session: requests.Session | None = None, retry: RetryPolicy | None = None):
+        self.session = session if session is not None else requests.Session()
+        self.retry = retry or DEFAULT_RETRY_POLICY
+
+    def post(self,
+             kind: str,
+             url: str,
+             params: dict,
+             data: dict,
+             policy: ResponsePolicy,
+             deadline: Deadline | None = None) -> TransportResponse:
+        deadline = deadline or Deadline(DEFAULT_TIMEOUT)
+        attempt = 0
+        while True:
+            attempt += 1
+            deadline.check(url)
+            try:
+                response = self._attempt(url, params, data, policy, deadline)
+            except requests.RequestException as e:
+                if deadline.expired:
+                    raise DeadlineExceeded(url, deadline.budget) from e
+                if not self.retry.retry_error(kind, attempt, e):
+                    raise
+            else:
+                if not self.retry.retry_status(kind, attempt, response.status_code):
+                    return response
+                if self.retry.delay(attempt) >= deadline.remaining():
+                    # no time left for another try; the caller gets the error response
+                    return response
+                response.close()
+            deadline.sleep(self.retry.delay(attempt), url)
+
+    def _attempt(self, url: str, params: dict, data: dict, policy: ResponsePolicy, deadline: Deadline) -> TransportResponse:
+        # requests' read timeout applies per socket read, so the body loop also checks the deadline
+        headers = {'Content-Type': FORM_CONTENT_TYPE} if isinstance(data, bytes) else None
+        with self.session.post(url=url, params=params, data=data, headers=headers, stream=True,
+                               timeout=deadline.timeouts()) as response:
+            declared_size = response.headers.get('Content-Length')
+            if declared_size is not None and declared_size.isdigit() and int(declared_size) > policy.max_bytes:
+                raise ResponseTooLarge(url, policy.max_bytes, int(declared_size))
+            body, size = spool_chunks(url, response.iter_content(chunk_size=policy.chunk_size), policy, deadline)
+            return TransportResponse(response.status_code, body, size)
+
+
+_transport = None
+_scheduler = None
+_hedge_executor = None
+_hedge_lock = threading.Lock()
+
+# per-endpoint latency of single transport calls, which sets the hedging delay
+LATENCY = {kind: LatencyStats() for kind in ('quote', 'bol', 'tracking')}
+HEDGE_COUNTS = {kind: {'hedged': 0, 'hedge_won': 0} for kind in IDEMPOTENT_KINDS}
+
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        _transport = HttpTransport()
+    return _transport
+
+
+def set_transport(transport) -> None:
+    global _transport
+    _transport = transport
+
+
+def get_scheduler():
+    return _scheduler
+
+
+def set_scheduler(scheduler) -> None:
+    global _scheduler
+    _scheduler = scheduler
+
+
+def post(kind: str,
+         url: str,
+         api_key: str | None,
+         post_body: dict | bytes,
+         policy: ResponsePolicy | None = None,
+         timeout: float | None = None,
+         hedge: bool | HedgePolicy = False) -> TransportResponse:
+    policy = policy or DEFAULT_RESPONSE_POLICY
+    deadline = Deadline(timeout if timeout is not None else DEFAULT_TIMEOUT)
+    pool = key_pool.get_key_pool()
+    if api_key is None and pool is not None:
+        return _pooled_post(pool, kind, url, post_body, policy, deadline, hedge)
+    return _send(kind, url, {'api_key': api_key}, post_body, policy, deadline, hedge)
+
+
+def _send(kind: str,
+          url: str,
+          params: dict,
+          data: dict,
+          policy: ResponsePolicy,
+          deadline: Deadline,
+          hedge: bool | HedgePolicy) -> TransportResponse:
+    if hedge and kind in IDEMPOTENT_KINDS:
+        hedge_policy = hedge if isinstance(hedge, HedgePolicy) else DEFAULT_HEDGE_POLICY
+        return _hedged_post(kind, url, params, data, policy, deadline, hedge_policy)
+    return _timed_post(kind, url, params, data, policy, deadline)
+
+
+def _pooled_post(pool,
+                 kind: str,
+                 url: str,
+                 post_body: dict | bytes,
+                 policy: ResponsePolicy,
+                 deadline: Deadline,
+                 hedge: bool | HedgePolicy) -> TransportResponse:
+    routing_fields = form_fields(post_body)
+    tried = set()
+    while True:
+        lease = pool.acquire(kind, routing_fields, timeout=deadline.remaining(), exclude=tried)
+        tried.add(lease.key)
+        try:
+            response = _send(kind, url, {'api_key': lease.key}, with_api_key(post_body, lease.key), policy, deadline,
+                             hedge)
+        except (DeadlineExceeded, RequestCancelled):
+            lease.release()
+            raise
+        except BaseException:
+            lease.release(error=True)
+            raise
+        lease.release(response.status_code)
+        if response.status_code not in key_pool.THROTTLED_STATUSES or not pool.has_alternative(kind, routing_fields, tried):
+            return response
+        # throttled: the key is cooling down now, so try the request on another one
+        response.close()
+
+
+def _timed_post(kind: str, url: str, params: dict, data: dict, policy: ResponsePolicy, deadline: Deadline) -> TransportResponse:
+    scheduler = _scheduler
+    slot = None
+    if scheduler is not None:
+        slot = scheduler.acquire(kind, timeout=deadline.remaining())
+        if slot is None:
+            raise DeadlineExceeded(url, deadline.budget)
+    stats = LATENCY.get(kind)
+    start = time.perf_counter()
+    try:
+        response = get_transport().post(kind, url, params, data, policy, deadline=deadline)
+    except RequestCancelled:
+        raise
+    except BaseException:
+        if stats is not None:
+            stats.record_error()
+        raise
+    finally:
+        if slot is not None:
+            scheduler.release(slot)
+    if stats is not None:
+        stats.record(time.perf_counter() - start, error=response.status_code != 200)
+    return response
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _hedge_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix='arcbest-hedge')
+        return _hedge_executor
+
+
+def _discard(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _hedged_post(kind: str,
+                 url: str,
+                 params: dict,
+                 data: dict,
+                 policy: ResponsePolicy,
+                 deadline: Deadline,
+                 hedge: HedgePolicy) -> TransportResponse:
+    executor = _get_hedge_executor()
+    attempts = {}
+
+    def launch():
+        attempt = deadline.child()
+        attempts[executor.submit(_timed_post, kind, url, params, data, policy, attempt)] = attempt
+
+    launch()
+    done, _ = wait(list(attempts), timeout=min(hedge.delay(LATENCY[kind]), deadline.remaining()))
+    if not done and not deadline.expired:
+        with _hedge_lock:
+            HEDGE_COUNTS[kind]['hedged'] += 1
+        launch()
+
+    pending = set(attempts)
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            if future.exception() is not None:
+                error = future.exception()
+                continue
+            for loser in pending | (done - {future}):
+                attempts[loser].cancel()
+                loser.add_done_callback(_discard)
+            if len(attempts) > 1 and future is not next(iter(attempts)):
+                with _hedge_lock:
+                    HEDGE_COUNTS[kind]['hedge_won'] += 1
+            return future.result()
+    for future in pending:
+        attempts[future].cancel()
+        future.add_done_callback(_discard)
+    if error is not None:
+        raise error
+    raise DeadlineExceeded(url, deadline.budget)
+
+
+def hedge_stats() -> dict:
+    with _hedge_lock:
+        return {kind: dict(counts) for kind, counts in HEDGE_COUNTS.items()}
+
+
+def parse_xml(response: TransportResponse, **kwargs) -> dict:
+    # xmltodict hands file objects to expat's ParseFile, which reads them in chunks
+    response.body.seek(0)
+    return xmltodict.parse(response.body, **kwargs)
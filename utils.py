@@ -1,5 +1,6 @@
 import logging.config
 import pprint
+import re
 from datetime import datetime
 
 logger = logging.getLogger("arcbest_api")
@@ -47,3 +48,14 @@ def bool_to_str(x: bool | None) -> str:
 def get_current_date_as_tuple() -> tuple:
     now = datetime.now()
     return (now.day, now.month, now.year)
+
+
+def is_valid_time(time_str: str) -> bool:
+    # Define the regex pattern to match the format HH:MM
+    pattern = r"^(09|1[0-7]):(00|15|30|45)$"
+
+    # Check if the input string matches the pattern
+    if re.match(pattern, time_str):
+        return True
+    else:
+        return False
@@ -0,0 +1,372 @@
+"""
+Offline ZIP code index for checking and normalizing the city, state and country of shipping parties.
+
+The index is a single binary file built from a CSV of (zip, city, state[, country][, primary]) rows:
+
+    python zip_index.py build zips.csv zips.idx
+    python zip_index.py check parties.csv -o checked.csv --index zips.idx
+
+The file holds sorted parallel arrays (ZIP, city id, state, country) and a city string table, and
+is memory-mapped, so opening it costs nothing and a lookup is a binary search over the mapped ZIP
+array.  A ZIP may have several rows, one per city name the postal service accepts for it; the
+primary city comes first.  Only 5-digit numeric ZIPs are indexed; other postal codes are
+reported as unknown rather than wrong.
+
+    zip_index.set_zip_index(ZipIndex('zips.idx'))    # or ARCBEST_ZIP_INDEX=zips.idx
+    check = zip_index.get_zip_index().normalize_party(shipper)
+    check.ok, check.problems, check.corrected
+
+With an index installed, pre-flight validation also rejects quotes and BOLs whose state does not
+match the ZIP or whose city is not one the ZIP serves.
+"""
+import argparse
+import array
+import csv
+import difflib
+import mmap
+import os
+import re
+import struct
+import sys
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+
+MAGIC = b'ABZIP\x00'
+VERSION = 1
+HEADER = struct.Struct('<6sHII')    # magic, version, rows, cities
+COUNTRY_ALIASES = {'USA': 'US', 'UNITED STATES': 'US', 'CAN': 'CA', 'CANADA': 'CA', 'MEX': 'MX', 'MEXICO': 'MX'}
+# abbreviations expanded before city names are compared
+CITY_WORDS = {'ST': 'SAINT', 'STE': 'SAINTE', 'FT': 'FORT', 'MT': 'MOUNT', 'PT': 'POINT', 'N': 'NORTH',
+              'S': 'SOUTH', 'E': 'EAST', 'W': 'WEST'}
+CITY_MATCH_CUTOFF = 0.8
+ZIP_PATTERN = re.compile(r'^\s*(\d{5})(?:-?\d{4})?\s*$')
+
+
+@lru_cache(maxsize=65536)
+def normalize_city(city: str) -> str:
+    words = re.sub(r"[^A-Z0-9 ]+", ' ', city.upper().replace("'", '')).split()
+    return ' '.join(CITY_WORDS.get(word, word) for word in words)
+
+
+def normalize_country(country: str | None) -> str | None:
+    if country is None:
+        return None
+    country = country.strip().upper()
+    return COUNTRY_ALIASES.get(country, country) or None
+
+
+def zip5(zip_code) -> int | None:
+    match = ZIP_PATTERN.match(str(zip_code)) if zip_code is not None else None
+    return int(match.group(1)) if match else None
+
+
+class ZipEntry:
+    def __init__(self, zip_code: str, city: str, state: str, country: str, primary: bool):
+        self.zip_code = zip_code
+        self.city = city
+        self.state = state
+        self.country = country
+        self.primary = primary
+
+    def as_dict(self):
+        return {
+            'zip_code': self.zip_code,
+            'city'    : self.city,
+            'state'   : self.state,
+            'country' : self.country,
+            'primary' : self.primary,
+        }
+
+    def __repr__(self):
+        return f'ZipEntry({self.zip_code!r}, {self.city!r}, {self.state!r}, {self.country!r})'
+
+
+class AddressCheck:
+    def __init__(self, zip_code, city: str | None, state: str | None, country: str | None,
+                 known: bool, problems: list[str], corrected: dict):
+        self.zip_code = zip_code
+        self.city = city
+        self.state = state
+        self.country = country
+        # False when the ZIP is not in the index, so nothing could be checked
+        self.known = known
+        self.problems = problems
+        # field -> normalized value, for the fields that differ from the input
+        self.corrected = corrected
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+    def as_dict(self):
+        return {
+            'zip_code' : self.zip_code,
+            'city'     : self.city,
+            'state'    : self.state,
+            'country'  : self.country,
+            'known'    : self.known,
+            'problems' : self.problems,
+            'corrected': self.corrected,
+        }
+
+
+def _u32_array(buffer, offset: int, count: int):
+    view = memoryview(buffer)[offset:offset + 4 * count]
+    if sys.byteorder == 'little':
+        return view.cast('I')
+    values = array.array('I', view)
+    values.byteswap()
+    return values
+
+
+class ZipIndex:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, rows, cities = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a ZIP index')
+        if version != VERSION:
+            raise ValueError(f'Unsupported ZIP index version {version} in {path}')
+        self.rows = rows
+        offset = HEADER.size
+        self._zips = _u32_array(self._map, offset, rows)
+        offset += 4 * rows
+        # city id, with the top bit set for a ZIP's primary city
+        self._cities = _u32_array(self._map, offset, rows)
+        offset += 4 * rows
+        self._states = offset
+        offset += 2 * rows
+        self._countries = offset
+        offset += 2 * rows
+        self._city_offsets = _u32_array(self._map, offset, cities + 1)
+        self._city_bytes = offset + 4 * (cities + 1)
+
+    def __len__(self):
+        return self.rows
+
+    def close(self):
+        for view in (self._zips, self._cities, self._city_offsets):
+            if isinstance(view, memoryview):
+                view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _city(self, city_id: int) -> str:
+        start, end = self._city_offsets[city_id], self._city_offsets[city_id + 1]
+        return self._map[self._city_bytes + start:self._city_bytes + end].decode('utf-8')
+
+    def _entry(self, row: int) -> ZipEntry:
+        city_id = self._cities[row]
+        state = self._map[self._states + 2 * row:self._states + 2 * row + 2].decode('ascii')
+        country = self._map[self._countries + 2 * row:self._countries + 2 * row + 2].decode('ascii')
+        return ZipEntry(f'{self._zips[row]:05d}', self._city(city_id & 0x7fffffff), state, country,
+                        bool(city_id & 0x80000000))
+
+    def lookup(self, zip_code) -> list[ZipEntry]:
+        """
+        Every city accepted for a ZIP (5 digits or ZIP+4), primary first; empty if it is unknown.
+        """
+        number = zip5(zip_code)
+        if number is None:
+            return []
+        start = bisect_left(self._zips, number)
+        end = bisect_right(self._zips, number, start)
+        return [self._entry(row) for row in range(start, end)]
+
+    def states_for_zip3(self, zip3) -> set[str]:
+        prefix = int(str(zip3)[:3])
+        start = bisect_left(self._zips, prefix * 100)
+        end = bisect_left(self._zips, (prefix + 1) * 100, start)
+        return {self._map[self._states + 2 * row:self._states + 2 * row + 2].decode('ascii')
+                for row in range(start, end)}
+
+    def check(self, city: str | None, state: str | None, zip_code, country: str | None = None) -> AddressCheck:
+        """
+        Check a city/state/ZIP/country against the index; `corrected` holds the normalized spelling
+        of each field that differs, which is only a guess where `problems` mentions the field.
+        """
+        country_code = normalize_country(country)
+        state_code = state.strip().upper() if state else None
+        entries = self.lookup(zip_code)
+        corrected = {}
+        if country_code != country and country_code is not None:
+            corrected['country'] = country_code
+        if state_code != state and state_code is not None:
+            corrected['state'] = state_code
+        if not entries:
+            problems = [] if zip5(zip_code) is None else [f'ZIP {zip_code} is not in the ZIP index']
+            return AddressCheck(zip_code, city, state_code, country_code, False, problems, corrected)
+
+        problems = []
+        primary = entries[0]
+        if country_code is None or country_code != primary.country:
+            if country_code is not None:
+                problems.append(f'country {country} does not match ZIP {zip_code} ({primary.country})')
+            corrected['country'] = country_code = primary.country
+        states = {entry.state for entry in entries}
+        if state_code not in states:
+            problems.append(f'state {state} does not match ZIP {zip_code} ({primary.state})')
+            corrected['state'] = state_code = primary.state
+
+        by_name = {normalize_city(entry.city): entry.city for entry in entries}
+        matched = by_name.get(normalize_city(city)) if city else None
+        if matched is None:
+            close = difflib.get_close_matches(normalize_city(city), list(by_name), n=1,
+                                              cutoff=CITY_MATCH_CUTOFF) if city else []
+            suggestion = by_name[close[0]] if close else primary.city
+            problems.append(f'city {city} is not served by ZIP {zip_code} (did you mean {suggestion}?)'
+                            if city else f'city is missing (ZIP {zip_code} is {primary.city})')
+            matched = suggestion
+        if matched != city:
+            corrected['city'] = matched
+        return AddressCheck(zip_code, matched, state_code, country_code, True, problems, corrected)
+
+    def normalize_party(self, party, fix: bool = True) -> AddressCheck:
+        """
+        Check a quote or BOL ShippingParty; with fix, write the corrected fields back to it.
+        """
+        result = self.check(party.city, party.state, party.zip, party.country)
+        if fix:
+            for name, value in result.corrected.items():
+                setattr(party, name, value)
+        return result
+
+    def check_rows(self, rows, city: str = 'city', state: str = 'state', zip_code: str = 'zip',
+                   country: str = 'country'):
+        """
+        Check dict rows (such as csv.DictReader rows) lazily, yielding (row, AddressCheck).
+        """
+        for row in rows:
+            yield row, self.check(row.get(city), row.get(state), row.get(zip_code), row.get(country))
+
+
+def build_zip_index(rows, path: str) -> int:
+    """
+    Write an index from (zip, city, state, country, primary) tuples; returns the number of rows.
+    Rows with a ZIP that is not 5 digits are skipped.
+    """
+    cities = {}
+    records = []
+    for zip_code, city, state, country, primary in rows:
+        number = zip5(zip_code)
+        state = (state or '').strip().upper()
+        country = normalize_country(country) or 'US'
+        if number is None or not city or len(state) != 2 or len(country) != 2:
+            continue
+        city_id = cities.setdefault(city.strip(), len(cities))
+        records.append((number, not primary, city_id, state, country))
+    records.sort()
+    unique = []
+    for record in records:
+        if not unique or unique[-1][0] != record[0] or unique[-1][2] != record[2]:
+            unique.append(record)
+    city_bytes = [city.encode('utf-8') for city in cities]
+    offsets = [0]
+    for data in city_bytes:
+        offsets.append(offsets[-1] + len(data))
+
+    def u32(values) -> bytes:
+        packed = array.array('I', values)
+        if sys.byteorder != 'little':
+            packed.byteswap()
+        return packed.tobytes()
+
+    previous = None
+    flagged = []
+    for number, _, city_id, _, _ in unique:
+        # the first row of each ZIP is its primary city
+        flagged.append(city_id | (0x80000000 if number != previous else 0))
+        previous = number
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(unique), len(cities)))
+        f.write(u32(record[0] for record in unique))
+        f.write(u32(flagged))
+        f.write(''.join(record[3] for record in unique).encode('ascii'))
+        f.write(''.join(record[4] for record in unique).encode('ascii'))
+        f.write(u32(offsets))
+        f.write(b''.join(city_bytes))
+    os.replace(temporary, path)
+    return len(unique)
+
+
+def rows_from_csv(path: str):
+    """
+    (zip, city, state, country, primary) rows from a CSV with zip/zip_code, city, state and optional
+    country and primary (Y/1/true/P) columns.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            row = {key.strip().lower(): value for key, value in row.items() if key}
+            primary = (row.get('primary') or 'Y').strip().upper() in ('Y', 'YES', '1', 'TRUE', 'P')
+            yield (row.get('zip') or row.get('zip_code') or row.get('zipcode'), row.get('city'),
+                   row.get('state'), row.get('country'), primary)
+
+
+_zip_index = None
+
+
+def get_zip_index() -> ZipIndex | None:
+    """
+    The installed index, opening ARCBEST_ZIP_INDEX on first use when none was set.
+    """
+    global _zip_index
+    if _zip_index is None and os.environ.get('ARCBEST_ZIP_INDEX'):
+        _zip_index = ZipIndex(os.environ['ARCBEST_ZIP_INDEX'])
+    return _zip_index
+
+
+def set_zip_index(index: ZipIndex | None) -> None:
+    global _zip_index
+    _zip_index = index
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='zip_index', description='Build or apply an offline ZIP index')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    build = subcommands.add_parser('build', help='build an index file from a ZIP CSV')
+    build.add_argument('csv')
+    build.add_argument('index')
+    check = subcommands.add_parser('check', help='check the city/state/zip/country columns of a CSV')
+    check.add_argument('csv')
+    check.add_argument('-o', '--output', help='output CSV (default: stdout)')
+    check.add_argument('--index', default=os.environ.get('ARCBEST_ZIP_INDEX'), help='index file')
+    check.add_argument('--fix', action='store_true', help='write the corrected values into the output rows')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        print(f'{build_zip_index(rows_from_csv(args.csv), args.index)} rows written to {args.index}')
+        return 0
+
+    if not args.index:
+        parser.error('check needs --index or ARCBEST_ZIP_INDEX')
+    failed = 0
+    with ZipIndex(args.index) as index, open(args.csv, newline='', encoding='utf-8-sig') as source:
+        reader = csv.DictReader(source)
+        output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+        try:
+            writer = csv.DictWriter(output, [*reader.fieldnames, 'address_ok', 'address_problems'])
+            writer.writeheader()
+            for row, result in index.check_rows(reader):
+                if args.fix:
+                    row.update((name, value) for name, value in result.corrected.items() if name in row)
+                row['address_ok'] = 'Y' if result.ok else 'N'
+                row['address_problems'] = '; '.join(result.problems)
+                failed += not result.ok
+                writer.writerow(row)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+    print(f'{failed} row(s) with address problems', file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())